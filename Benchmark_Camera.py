@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Camera transport benchmarks over loopback.
+
+Usage: python Benchmark_Camera.py [protocol|ring|bus|fanout|decode] [frames ...]
+
+protocol: throughput (fps, MB/s) of the old pickled, length-prefixed
+stream against Frame_Protocol, with and without decoding the JPEGs.
+ring: camera-to-consumer latency at 30 fps between two processes, JPEG
+over TCP against the shared-memory Frame_Ring.
+bus: frame age per consumer with a slow display next to a fast analysis
+consumer, all on the receive thread against separate Frame_Bus slots.
+fanout: CPU per captured frame with three consumers converting frames
+themselves against Camera_Service's once-per-frame shared conversions.
+decode: CPU per received frame decoding every JPEG in full against
+publishing them encoded and decoding lazily, gray or at reduced scale.
+"""
+from __future__ import division, print_function
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from Camera_Service import CameraService
+from Frame_Bus import FrameBus
+from Frame_Protocol import CODEC_JPEG, FrameHeader, FrameReceiver, FrameSender, VERSION, decode
+from Frame_Ring import FrameRing
+
+COUNTS = [300]
+
+
+def synthetic_frame(width=640, height=480, seed=0):
+    """
+    BGR test image that compresses like a camera frame: smooth shading
+    plus sensor noise.
+    """
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.dstack(((x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))))
+    noise = rng.normal(0, 6, (height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def _loopback():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(server.getsockname())
+    conn, _ = server.accept()
+    server.close()
+    return client, conn
+
+
+def _legacy_send(sock, encoded, count):
+    for _ in range(count):
+        data = pickle.dumps(encoded)
+        sock.sendall(struct.pack("!L", len(data)) + data)
+    sock.close()
+
+
+def _legacy_receive(conn, count, decode_frames):
+    # The receive loop PCCameraReceiver used before Frame_Protocol
+    data = b""
+    payload_size = struct.calcsize("!L")
+    received = 0
+    while received < count:
+        while len(data) < payload_size:
+            data += conn.recv(4096)
+        msg_size = struct.unpack("!L", data[:payload_size])[0]
+        data = data[payload_size:]
+        while len(data) < msg_size:
+            data += conn.recv(4096)
+        frame_data = data[:msg_size]
+        data = data[msg_size:]
+        buffer = pickle.loads(frame_data)
+        if decode_frames:
+            cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        received += 1
+    return received
+
+
+def _binary_send(sock, encoded, count):
+    sender = FrameSender(sock)
+    for _ in range(count):
+        sender.send(encoded, width=640, height=480, channels=3)
+    sock.close()
+
+
+def _binary_receive(conn, count, decode_frames):
+    receiver = FrameReceiver(conn)
+    received = 0
+    while received < count:
+        header, payload = receiver.receive()
+        if decode_frames:
+            decode(header, payload)
+        received += 1
+    return received
+
+
+def bench_protocol(counts=COUNTS):
+    """
+    Frames per second and payload MB/s through a loopback TCP connection.
+    """
+    frame = synthetic_frame()
+    encoded = cv2.imencode(".jpg", frame)[1]
+    print("JPEG frame: %d bytes" % encoded.nbytes)
+    print("%-8s %-8s %8s %10s %10s" % ("stream", "decode", "frames", "fps", "MB/s"))
+    transports = [("pickle", _legacy_send, _legacy_receive), ("binary", _binary_send, _binary_receive)]
+    for count in counts:
+        for decode_frames in (False, True):
+            for name, send, receive in transports:
+                client, conn = _loopback()
+                sender = threading.Thread(target=send, args=(client, encoded, count))
+                t0 = time.time()
+                sender.start()
+                receive(conn, count, decode_frames)
+                elapsed = time.time() - t0
+                sender.join()
+                conn.close()
+                print("%-8s %-8s %8d %10.1f %10.1f" % (
+                    name, "yes" if decode_frames else "no", count,
+                    count / elapsed, count * encoded.nbytes / elapsed / 1e6))
+
+
+def _camera_tcp(address, count, rate):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect(address)
+    sender = FrameSender(sock)
+    frame = synthetic_frame()
+    for i in range(count):
+        t0 = time.time()
+        sender.send_image(frame, timestamp=t0)
+        time.sleep(max(0.0, 1.0 / rate - (time.time() - t0)))
+    sock.close()
+
+
+def _camera_ring(path, count, rate):
+    frame = synthetic_frame()
+    ring = FrameRing.create(path, frame.nbytes)
+    for i in range(count):
+        t0 = time.time()
+        ring.write(frame, timestamp=t0)
+        time.sleep(max(0.0, 1.0 / rate - (time.time() - t0)))
+    ring.close()
+
+
+def _latency_row(name, ages, rate, count):
+    ages = 1000 * np.array(ages)
+    print("%-8s %8d %10.2f %10.2f %10.2f %10.1f" % (
+        name, count, np.median(ages), np.percentile(ages, 99), ages.max(), 1000.0 / rate))
+
+
+def bench_ring(counts=COUNTS, rate=30.0):
+    """
+    Age of each frame when the consumer has it as a decoded image: a
+    camera process sending JPEG over loopback TCP against the same
+    process writing raw frames into a shared-memory ring.
+    """
+    print("%-8s %8s %10s %10s %10s %10s" % ("path", "frames", "median ms", "p99 ms", "max ms", "frame ms"))
+    for count in counts:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        camera = multiprocessing.Process(target=_camera_tcp, args=(server.getsockname(), count, rate))
+        camera.start()
+        conn, _ = server.accept()
+        server.close()
+        receiver = FrameReceiver(conn)
+        ages = []
+        while True:
+            received = receiver.receive()
+            if received is None:
+                break
+            header, payload = received
+            decode(header, payload)
+            ages.append(time.time() - header.timestamp)
+        conn.close()
+        camera.join()
+        _latency_row("tcp+jpeg", ages, rate, len(ages))
+
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, "frames.ring")
+            camera = multiprocessing.Process(target=_camera_ring, args=(path, count, rate))
+            camera.start()
+            ring = FrameRing.attach(path, timeout=10.0, poll=0.001)
+            seq = 0
+            ages = []
+            while seq < count:
+                got = ring.wait(seq, timeout=1.0)
+                if got is None:
+                    break
+                seq, timestamp, frame = got
+                ages.append(time.time() - timestamp)
+            ring.close()
+            camera.join()
+        finally:
+            shutil.rmtree(folder)
+        _latency_row("ring", ages, rate, len(ages))
+
+
+def _serve_camera(count, rate):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    camera = multiprocessing.Process(target=_camera_tcp, args=(server.getsockname(), count, rate))
+    camera.start()
+    conn, _ = server.accept()
+    server.close()
+    return camera, conn
+
+
+def _age_row(mode, consumer, delivered, dropped, median, worst):
+    print("%-10s %-10s %10d %8d %10.1f %10.1f" % (mode, consumer, delivered, dropped, median, worst))
+
+
+def bench_bus(counts=COUNTS, rate=30.0, slow=0.1):
+    """
+    A 30 fps stream feeding an analysis consumer (fast) and a display
+    consumer that takes slow seconds per frame. Handled in line on the
+    receive thread, the display backs up the socket and every frame
+    ages; through a FrameBus the display skips frames instead.
+    """
+    print("%-10s %-10s %10s %8s %10s %10s" % ("mode", "consumer", "delivered", "dropped", "median ms", "max ms"))
+    for count in counts:
+        camera, conn = _serve_camera(count, rate)
+        receiver = FrameReceiver(conn)
+        ages = []
+        while True:
+            received = receiver.receive()
+            if received is None:
+                break
+            header, payload = received
+            decode(header, payload)
+            ages.append(time.time() - header.timestamp)
+            time.sleep(slow)
+        conn.close()
+        camera.join()
+        ages = 1000 * np.array(ages)
+        for consumer in ("analysis", "display"):
+            _age_row("in line", consumer, len(ages), 0, np.median(ages), ages.max())
+
+        camera, conn = _serve_camera(count, rate)
+        packets = FrameBus()
+        frames = FrameBus()
+        packets.subscribe("decode", lambda packet: frames.publish(
+            decode(*packet), packet[0].timestamp, packet[0].seq))
+        analysis = frames.subscribe("analysis", lambda frame: None)
+        display = frames.subscribe("display", lambda frame: time.sleep(slow))
+        receiver = FrameReceiver(conn)
+        while True:
+            received = receiver.receive()
+            if received is None:
+                break
+            header, payload = received
+            packets.publish((header, payload.copy()), header.timestamp, header.seq)
+        conn.close()
+        camera.join()
+        time.sleep(slow)
+        for subscription in (analysis, display):
+            stats = subscription.stats()
+            _age_row("bus", stats["name"], stats["delivered"], stats["dropped"],
+                     stats["age_ms"], stats["age_max_ms"])
+        packets.close()
+        frames.close()
+
+
+class _SyntheticCamera(object):
+    """
+    Stands in for cv2.VideoCapture: count frames at rate per second.
+    """
+
+    def __init__(self, count, rate):
+        self.frame = synthetic_frame()
+        self.count = count
+        self.period = 1.0 / rate
+        self.next = time.time()
+
+    def read(self):
+        if self.count <= 0:
+            return False, None
+        self.count -= 1
+        self.next += self.period
+        time.sleep(max(0.0, self.next - time.time()))
+        return True, self.frame.copy()
+
+
+def bench_fanout(counts=COUNTS, rate=30.0):
+    """
+    CPU time per captured frame for face detection (gray), expression
+    recognition (gray at half size) and streaming (as captured), each
+    at the full camera rate.
+    """
+    consumers = [("face", None, True), ("expression", (320, 240), True), ("stream", None, False)]
+    print("%-10s %8s %14s %12s" % ("mode", "frames", "cpu ms/frame", "delivered"))
+    for count in counts:
+        for mode in ("own", "shared"):
+            camera = CameraService(_SyntheticCamera(count, rate))
+            subscriptions = []
+            for name, size, gray in consumers:
+                if mode == "shared":
+                    subscriptions.append(camera.subscribe(name, lambda image: None, size=size, gray=gray))
+                    continue
+
+                def convert(image, size=size, gray=gray):
+                    if gray:
+                        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                    if size is not None:
+                        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                subscriptions.append(camera.subscribe(name, convert))
+            t0 = sum(os.times()[:2])
+            camera.start()
+            while camera.published < count:
+                time.sleep(0.05)
+            time.sleep(0.1)
+            cpu = sum(os.times()[:2]) - t0
+            camera.close()
+            delivered = sum(s.stats()["delivered"] for s in subscriptions)
+            print("%-10s %8d %14.2f %12d" % (mode, count, 1000 * cpu / count, delivered))
+
+
+def bench_decode(counts=COUNTS, rate=30.0):
+    """
+    A 30 fps JPEG stream with face detection taking gray frames at 10 fps
+    and a 320x240 display at 15 fps: decoding each frame on arrival
+    against handing the consumers encoded frames.
+    """
+    frame = synthetic_frame()
+    encoded = cv2.imencode(".jpg", frame)[1]
+    height, width = frame.shape[:2]
+    consumers = [("face", 10, None, True), ("display", 15, (320, 240), False)]
+    print("%-8s %8s %14s %10s" % ("decode", "frames", "cpu ms/frame", "decodes"))
+    for count in counts:
+        for mode in ("eager", "lazy"):
+            camera = CameraService()
+            subscriptions = [camera.subscribe(name, lambda image: None, rate=fps, size=size, gray=gray)
+                             for name, fps, size, gray in consumers]
+            frames = []
+            t0 = sum(os.times()[:2])
+            start = time.time()
+            for seq in range(1, count + 1):
+                header = FrameHeader(VERSION, CODEC_JPEG, 3, width, height, encoded.nbytes, seq, time.time())
+                if mode == "eager":
+                    camera.publish(decode(header, encoded), header.timestamp, seq)
+                else:
+                    frames.append(camera.publish_encoded(header, encoded))
+                time.sleep(max(0.0, start + seq / rate - time.time()))
+            time.sleep(0.1)
+            cpu = sum(os.times()[:2]) - t0
+            for subscription in subscriptions:
+                subscription.close()
+            decodes = count if mode == "eager" else sum(f.decodes for f in frames)
+            print("%-8s %8d %14.2f %10d" % (mode, count, 1000 * cpu / count, decodes))
+
+
+BENCHMARKS = {
+    "protocol": bench_protocol,
+    "ring": bench_ring,
+    "bus": bench_bus,
+    "fanout": bench_fanout,
+    "decode": bench_decode,
+}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    names = [arg for arg in args if arg in BENCHMARKS] or sorted(BENCHMARKS)
+    counts = [int(arg) for arg in args if arg.isdigit()] or COUNTS
+    for name in names:
+        print("== %s ==" % name)
+        BENCHMARKS[name](counts)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Local fleet simulation: patients delivered per hour with several robots
+sharing the corridors, planned jointly (cooperative) or each on its own
+(independent, which is what one dijkstra per robot amounts to).
+
+Usage: python Benchmark_Fleet.py [robots ...]
+"""
+from __future__ import division, print_function
+from collections import deque
+import random
+import sys
+import time
+from Fleet_Planner import FleetPlanner, ReservationTable
+from Floor_Map import default_map
+from Hospital_Layout import generate_hospital, random_open_cells
+from Time_Planner import TimeModel
+
+ROBOTS = [1, 2, 4, 10, 20, 40]
+
+
+def count_conflicts(trips, dwell):
+    """
+    Vertex and head-on conflicts between the executed (robot, depart, path)
+    trips.
+    """
+    cells = {}
+    moves = {}
+    conflicts = 0
+    for robot, depart, path in trips:
+        holds = list(path) + [path[-1]] * dwell
+        for k, cell in enumerate(holds):
+            other = cells.setdefault((depart + k, cell), robot)
+            if other != robot:
+                conflicts += 1
+        for k in range(1, len(path)):
+            a, b = path[k - 1], path[k]
+            moves[(depart + k - 1, a, b)] = robot
+            other = moves.get((depart + k - 1, b, a))
+            if other is not None and other != robot:
+                conflicts += 1
+    return conflicts
+
+
+def simulate(maze, departments, robots, hours=2.0, per_hour=600, cooperative=True, seed=0):
+    """
+    Patients arrive at random departments and ask to be taken to another
+    one. The nearest idle robot walks to the patient and then to the
+    destination. Returns (patients per hour, conflicts, ms per plan,
+    longest queue).
+    """
+    model = TimeModel()
+    steps = int(hours * 3600 / model.step_time)
+    rng = random.Random(seed)
+    planner = FleetPlanner(maze)
+    fleet = dict((r, [departments[r % len(departments)], 0]) for r in range(robots))
+
+    queue = deque()
+    next_arrival = rng.expovariate(per_hour / 3600.0) / model.step_time
+    delivered = 0
+    trips = []
+    plan_time = 0.0
+    plans = 0
+    longest = 0
+
+    for t in range(steps):
+        while next_arrival <= t:
+            pickup, dropoff = rng.sample(departments, 2)
+            queue.append((pickup, dropoff))
+            next_arrival += rng.expovariate(per_hour / 3600.0) / model.step_time
+        longest = max(longest, len(queue))
+
+        waiting = deque()
+        while queue:
+            pickup, dropoff = queue.popleft()
+            idle = [r for r, (at, free) in fleet.items() if free <= t]
+            if not idle:
+                waiting.append((pickup, dropoff))
+                continue
+            robot = min(idle, key=lambda r: planner.steps_between(fleet[r][0], pickup))
+
+            t0 = time.time()
+            if not cooperative:
+                planner.table = ReservationTable()
+            leg1 = planner.submit(robot, fleet[robot][0], pickup, t)
+            leg2 = None
+            if leg1 is not None:
+                depart, path = leg1
+                if not cooperative:
+                    planner.table = ReservationTable()
+                leg2 = planner.submit(robot, pickup, dropoff, depart + len(path) - 1 + planner.dwell)
+            plan_time += time.time() - t0
+            plans += 1
+            if leg2 is None:
+                waiting.append((pickup, dropoff))
+                continue
+
+            trips.append((robot, leg1[0], leg1[1]))
+            trips.append((robot, leg2[0], leg2[1]))
+            finish = leg2[0] + len(leg2[1]) - 1 + planner.dwell
+            fleet[robot] = [dropoff, finish]
+            if finish < steps:
+                delivered += 1
+        queue = waiting
+        if t % 100 == 0:
+            planner.table.prune(t - 1)
+
+    return delivered / hours, count_conflicts(trips, planner.dwell), plan_time * 1000 / max(plans, 1), longest
+
+
+def bench_fleet(robot_counts=ROBOTS):
+    maze = generate_hospital(60, 60, block=12)
+    departments = sorted(set(random_open_cells(maze, 20, seed=7)))
+    floor = default_map()
+    layouts = [("default 8x8", floor.grid, [cell for name, cell in floor.labels()]),
+               ("hospital 60x60", maze, departments)]
+    print("%-15s %7s %-12s %14s %10s %10s %8s" % (
+        "map", "robots", "planning", "patients/hour", "conflicts", "ms/plan", "queue"))
+    for name, grid, depts in layouts:
+        for robots in robot_counts:
+            if name.startswith("default") and robots > 4:
+                continue
+            for cooperative in (True, False):
+                rate, conflicts, ms, longest = simulate(grid, depts, robots, cooperative=cooperative)
+                print("%-15s %7d %-12s %14.1f %10d %10.2f %8d" % (
+                    name, robots, "cooperative" if cooperative else "independent",
+                    rate, conflicts, ms, longest))
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or ROBOTS
+    bench_fleet(counts)
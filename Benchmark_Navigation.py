@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Delivery-time benchmarks of the motion strategies on the simulated NAO.
+
+Usage: python Benchmark_Navigation.py [strategies|obstacles|drift|transient] [routes] [size]
+
+"strategies" walks clear routes with every strategy; "obstacles" puts
+an obstacle halfway along each route and lets the sonar check and the
+incremental planner find a way round it; "drift" walks with odometry
+error, with and without the pose tracker correcting it; "transient"
+has people stepping into the route for a moment and compares the fixed
+3 s obstacle wait with the sonar monitor.
+"""
+from __future__ import division, print_function
+import os
+import sys
+import time
+import Motion
+from Incremental_Planner import IncrementalPlanner
+from Nao_Simulator import SimRobot
+from Hospital_Layout import generate_hospital, random_open_cells
+from Path_Calculation import dijkstra
+from Path_Follower import path_points
+from Pose_Tracker import PoseTracker
+from Sonar_Monitor import SonarMonitor
+
+
+class _StaticRoute(object):
+    """
+    Planner that never changes the route; passing it selects the
+    cell-by-cell loop of move_robot_along_path.
+    """
+    pending = False
+
+    def block(self, cell):
+        pass
+
+
+STRATEGIES = {
+    "step": dict(planner=_StaticRoute()),
+    "compiled": dict(),
+    "pose list": dict(pose_list=True),
+    "follow": dict(follow=True),
+}
+
+
+def sample_routes(size=60, count=20, seed=0):
+    """
+    Returns (maze, [path, ...]) of random reachable routes on a generated
+    hospital floor.
+    """
+    maze = generate_hospital(size, size, block=8)
+    starts = random_open_cells(maze, count, seed=seed + 1)
+    ends = random_open_cells(maze, count, seed=seed + 2)
+    routes = []
+    for start, end in zip(starts, ends):
+        distance, path = dijkstra(maze, start, end)
+        if distance != -1 and len(path) > 1:
+            routes.append(path)
+    return maze, routes
+
+
+def run_route(path, robot=None, **options):
+    """
+    Walks one route on a simulated robot (a fresh one with a virtual clock
+    by default). Returns (simulated seconds, NAOqi commands, final pose).
+    The world frame is the robot's start frame, so the pose can be
+    compared with Path_Follower.path_points(path).
+    """
+    robot = robot or SimRobot(speed=None)
+    Motion.use_proxies(robot.motion, robot.posture, robot.memory, robot.clock)
+    Motion.move_robot_along_path(path, **options)
+    return robot.clock.time(), robot.motion.commands, robot.motion.getRobotPosition(True)
+
+
+class _Quiet(object):
+    # Silences the per-step prints of Motion and Obstacle
+    def __enter__(self):
+        self.devnull = open(os.devnull, "w")
+        self.stdout, sys.stdout = sys.stdout, self.devnull
+
+    def __exit__(self, *exc):
+        sys.stdout = self.stdout
+        self.devnull.close()
+
+
+def bench_strategies(maze, routes, strategies=STRATEGIES):
+    cells = sum(len(path) - 1 for path in routes)
+    print("%d routes, %.1f cells on average" % (len(routes), cells / len(routes)))
+    print("%-10s %14s %12s %12s" % ("strategy", "sim s/route", "commands", "wall ms"))
+    for name in sorted(strategies):
+        sim_time = commands = 0
+        t0 = time.time()
+        with _Quiet():
+            for path in routes:
+                seconds, count, pose = run_route(path, **strategies[name])
+                sim_time += seconds
+                commands += count
+        print("%-10s %14.1f %12.1f %12.1f" % (
+            name, sim_time / len(routes), commands / len(routes),
+            (time.time() - t0) * 1000 / len(routes)))
+
+
+def bench_obstacles(maze, routes, tolerance=0.05):
+    """
+    Blocks the middle cell of each route with an obstacle the sonar sees
+    and walks the route with the cell-by-cell loop and an
+    IncrementalPlanner repairing it.
+    """
+    reached = replans = 0
+    sim_time = 0.0
+    t0 = time.time()
+    for path in routes:
+        if len(path) < 5:
+            continue
+        robot = SimRobot(speed=None)
+        points = path_points(path)
+        ox, oy = points[len(path) // 2]
+        robot.memory.add_obstacle(ox, oy)
+        planner = IncrementalPlanner(maze, path[0], path[-1])
+        with _Quiet():
+            seconds, count, (x, y, theta) = run_route(path, robot, planner=planner)
+        sim_time += seconds
+        if (planner.grid.costs == 0).sum() > (maze == 0).sum():
+            replans += 1
+        gx, gy = points[-1]
+        if abs(x - gx) < tolerance and abs(y - gy) < tolerance:
+            reached += 1
+    count = len([path for path in routes if len(path) >= 5])
+    print("%d routes with an obstacle, %d rerouted" % (count, replans))
+    print("reached goal %d/%d, %.1f sim s/route, %.1f wall ms/route" % (
+        reached, count, sim_time / max(1, count), (time.time() - t0) * 1000 / max(1, count)))
+
+
+def bench_drift(maze, routes, walk_error=0.05, turn_error=0.03, speed=None):
+    """
+    Final position error of compiled plans with simulated slip, without and
+    with a PoseTracker. The tracker samples on its own thread, in lockstep
+    with the walk on the virtual clock (speed=None, see SimClock).
+    """
+    routes = routes[:10]
+    print("%d routes, walk error %.0f%%, turn error %.0f%%" % (
+        len(routes), walk_error * 100, turn_error * 100))
+    print("%-10s %12s %12s %14s %12s" % ("tracker", "mean err m", "max err m", "sim s/route", "corrections"))
+    for tracked in (False, True):
+        errors = []
+        sim_time = corrections = 0
+        checks = []
+        for k, path in enumerate(routes):
+            robot = SimRobot(speed=speed, walk_error=walk_error, turn_error=turn_error, seed=k)
+            tracker = None
+            if tracked:
+                tracker = PoseTracker(robot.motion, robot.clock)
+                tracker.start()
+            with _Quiet():
+                t0 = robot.clock.time()
+                seconds, count, (x, y, theta) = run_route(path, robot, tracker=tracker)
+            sim_time += seconds - t0
+            gx, gy = path_points(path)[-1]
+            errors.append(((x - gx) ** 2 + (y - gy) ** 2) ** 0.5)
+            if tracker is not None:
+                tracker.stop()
+                stats = tracker.stats()
+                corrections += stats.get("corrections", 0)
+                checks.append(stats)
+        print("%-10s %12.3f %12.3f %14.1f %12.1f" % (
+            "on" if tracked else "off", sum(errors) / len(errors), max(errors),
+            sim_time / len(routes), corrections / len(routes)))
+    errors = [stats["rms_error"] for stats in checks if stats["checks"]]
+    if errors:
+        print("tracked pose error before correction: rms %.3f m, max %.3f m" % (
+            sum(errors) / len(errors), max(stats["max_error"] for stats in checks if stats["checks"])))
+
+
+def bench_transient(maze, routes, speed=None, seed=0):
+    """
+    A person steps into each route halfway and leaves 0.5-2.5 s after the
+    robot notices them. Compares the per-step sonar reads with the fixed
+    3 s wait against a SonarMonitor, which samples on its own thread in
+    lockstep with the walk (virtual clock). Reports the whole route time,
+    the part of it stopped for the obstacle and the rest (walking, turning
+    and starting up again), and the sonar reads made by the motion loop.
+    The monitor only shortens the stop (the robot goes on once the way is
+    clear instead of after a fixed 3 s); the walk is unchanged, so the
+    total gain per route is the stop time saved and no more.
+    """
+    import random
+    rng = random.Random(seed)
+    routes = [path for path in routes if len(path) >= 5][:10]
+    lingers = [rng.uniform(0.5, 2.5) for path in routes]
+    print("%d routes, obstacle leaves after %.1f s on average" % (len(routes), sum(lingers) / len(routes)))
+    print("%-10s %14s %12s %12s %12s %12s" % (
+        "sonar", "sim s/route", "stopped s", "moving s", "rerouted", "loop reads"))
+    check = Motion.avoid_obstacles_after_step
+    totals = {}
+    for monitored in (False, True):
+        sim_time = stopped = rerouted = reads = 0
+        for path, linger in zip(routes, lingers):
+            robot = SimRobot(speed=speed)
+            ox, oy = path_points(path)[len(path) // 2]
+            robot.memory.add_obstacle(ox, oy, linger=linger)
+            planner = IncrementalPlanner(maze, path[0], path[-1])
+            monitor = None
+            if monitored:
+                monitor = SonarMonitor(robot.memory, robot.clock)
+                monitor.start()
+            waits = []
+
+            def timed_check(*args, **kwargs):
+                t = robot.clock.time()
+                found = check(*args, **kwargs)
+                if found:
+                    waits.append(robot.clock.time() - t)
+                return found
+            Motion.avoid_obstacles_after_step = timed_check
+            try:
+                with _Quiet():
+                    t0 = robot.clock.time()
+                    seconds, count, pose = run_route(path, robot, planner=planner, monitor=monitor)
+            finally:
+                Motion.avoid_obstacles_after_step = check
+            reads += robot.memory.reads
+            if monitor is not None:
+                monitor.stop()
+                reads -= monitor.samples
+            sim_time += seconds - t0
+            stopped += sum(waits)
+            if (planner.grid.costs == 0).sum() > (maze == 0).sum():
+                rerouted += 1
+        totals[monitored] = (sim_time / len(routes), stopped / len(routes))
+        print("%-10s %14.1f %12.2f %12.1f %12d %12.1f" % (
+            "monitor" if monitored else "per step", sim_time / len(routes), stopped / len(routes),
+            (sim_time - stopped) / len(routes), rerouted, reads / len(routes)))
+    print("monitor vs per step: %+.2f s per route in total, %+.2f s of it stopped" % (
+        totals[True][0] - totals[False][0], totals[True][1] - totals[False][1]))
+
+
+BENCHMARKS = {
+    "strategies": bench_strategies,
+    "obstacles": bench_obstacles,
+    "drift": bench_drift,
+    "transient": bench_transient,
+}
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    names = [arg for arg in args if arg in BENCHMARKS] or sorted(BENCHMARKS)
+    numbers = [int(arg) for arg in args if arg.isdigit()]
+    count = numbers[0] if numbers else 20
+    size = numbers[1] if len(numbers) > 1 else 60
+    maze, routes = sample_routes(size, count)
+    for name in names:
+        print("== %s ==" % name)
+        BENCHMARKS[name](maze, routes)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Planner benchmarks on generated hospital floor plans.
+
+Usage: python Benchmark_Planner.py [latency|replan|turns|hierarchical|batch|costmap|floormap] [size ...]
+"""
+from __future__ import division, print_function
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import Floor_Map
+from Costmap import Costmap
+from Grid_Planner import GridPlanner
+from Hierarchical_Map import HierarchicalMap
+from Incremental_Planner import IncrementalPlanner
+from Time_Planner import TimeModel, TurnAwarePlanner
+from Hospital_Layout import generate_hospital, random_open_cells
+from Path_Calculation import batch_dijkstra, dijkstra
+
+SIZES = [100, 250, 500, 1000, 2000]
+
+
+def bench_query_latency(sizes=SIZES, queries=5):
+    """
+    Average latency and node expansions of one start/end query per map size.
+    """
+    print("%-10s %10s %-9s %12s %12s" % ("map", "build ms", "mode", "query ms", "expanded"))
+    for size in sizes:
+        maze = generate_hospital(size, size)
+        t0 = time.time()
+        planner = GridPlanner(maze)
+        build_ms = (time.time() - t0) * 1000
+
+        starts = random_open_cells(maze, queries, seed=1)
+        ends = random_open_cells(maze, queries, seed=2)
+        for mode in ("dijkstra", "astar", "jps"):
+            search = getattr(planner, mode)
+            elapsed = 0.0
+            expanded = 0
+            for start, end in zip(starts, ends):
+                t0 = time.time()
+                search(start, end)
+                elapsed += time.time() - t0
+                expanded += planner.expanded
+            print("%-10s %10.1f %-9s %12.1f %12d" % (
+                "%dx%d" % (size, size), build_ms, mode,
+                elapsed * 1000 / queries, expanded // queries))
+
+
+def bench_replanning(sizes=SIZES, queries=5):
+    """
+    Cost of repairing a route after the cell ahead of the robot gets
+    blocked: incremental repair versus a fresh Dijkstra from the same cell.
+    """
+    print("%-10s %-12s %12s %12s" % ("map", "mode", "repair ms", "expanded"))
+    for size in sizes:
+        maze = generate_hospital(size, size)
+        starts = random_open_cells(maze, queries, seed=1)
+        ends = random_open_cells(maze, queries, seed=2)
+        totals = {"incremental": [0.0, 0], "dijkstra": [0.0, 0]}
+        for start, end in zip(starts, ends):
+            planner = IncrementalPlanner(maze, start, end)
+            distance, path = planner.replan(start)
+            if len(path) < 4:
+                continue
+            # Walk a third of the way, then find the next cell blocked
+            current = path[len(path) // 3]
+            blocked = path[len(path) // 3 + 1]
+            planner.block(blocked)
+            t0 = time.time()
+            planner.replan(current)
+            totals["incremental"][0] += time.time() - t0
+            totals["incremental"][1] += planner.expanded
+
+            grid = GridPlanner(maze)
+            grid.set_cost(blocked, 0)
+            t0 = time.time()
+            grid.dijkstra(current, end)
+            totals["dijkstra"][0] += time.time() - t0
+            totals["dijkstra"][1] += grid.expanded
+        for mode in ("incremental", "dijkstra"):
+            elapsed, expanded = totals[mode]
+            print("%-10s %-12s %12.1f %12d" % (
+                "%dx%d" % (size, size), mode, elapsed * 1000 / queries, expanded // queries))
+
+
+def count_turns(path):
+    turns = 0
+    for a, b, c in zip(path, path[1:], path[2:]):
+        if (b[0] - a[0], b[1] - a[1]) != (c[0] - b[0], c[1] - b[1]):
+            turns += 1
+    return turns
+
+
+def bench_turn_aware(sizes=SIZES, queries=20):
+    """
+    Predicted walking time of the dijkstra route versus the turn-aware
+    route under the default TimeModel.
+    """
+    model = TimeModel()
+    print("%-10s %-11s %12s %8s %10s" % ("map", "planner", "walk time s", "turns", "query ms"))
+    for size in sizes:
+        maze = generate_hospital(size, size)
+        planner = TurnAwarePlanner(maze, model)
+        starts = random_open_cells(maze, queries, seed=3)
+        ends = random_open_cells(maze, queries, seed=4)
+        totals = {"dijkstra": [0.0, 0, 0.0], "turn-aware": [0.0, 0, 0.0]}
+        for start, end in zip(starts, ends):
+            t0 = time.time()
+            distance, path = planner.dijkstra(start, end)
+            elapsed = time.time() - t0
+            totals["dijkstra"][0] += model.route_time(maze, path)
+            totals["dijkstra"][1] += count_turns(path)
+            totals["dijkstra"][2] += elapsed
+
+            t0 = time.time()
+            seconds, path = planner.fastest(start, end)
+            elapsed = time.time() - t0
+            totals["turn-aware"][0] += seconds
+            totals["turn-aware"][1] += count_turns(path)
+            totals["turn-aware"][2] += elapsed
+        for mode in ("dijkstra", "turn-aware"):
+            seconds, turns, elapsed = totals[mode]
+            print("%-10s %-11s %12.1f %8.1f %10.1f" % (
+                "%dx%d" % (size, size), mode, seconds / queries,
+                turns / queries, elapsed * 1000 / queries))
+
+
+def bench_hierarchical(sizes=SIZES, queries=20, floors=3):
+    """
+    Build time and query latency of the hierarchical map on a multi-floor
+    plan joined by elevators, plus its extra cost on same-floor routes
+    compared with a flat Dijkstra.
+    """
+    print("%-14s %10s %14s %14s %12s %10s" % (
+        "plan", "build s", "cross-floor ms", "same-floor ms", "dijkstra ms", "extra %"))
+    for size in sizes:
+        plans = [generate_hospital(size, size, seed=f) for f in range(floors)]
+        # Elevators at two corridor crossings, shared by every floor
+        shafts = [(0, 0), (size // 24 * 12, size // 24 * 12)]
+        connectors = [((f, r, c), (f + 1, r, c), 20)
+                      for f in range(floors - 1) for r, c in shafts]
+        t0 = time.time()
+        hmap = HierarchicalMap(plans, connectors, cluster_size=32)
+        build = time.time() - t0
+
+        starts = random_open_cells(plans[0], queries, seed=5)
+        ends = random_open_cells(plans[-1], queries, seed=6)
+        t0 = time.time()
+        for start, end in zip(starts, ends):
+            hmap.dijkstra((0,) + start, (floors - 1,) + end)
+        cross = (time.time() - t0) * 1000 / queries
+
+        ends = random_open_cells(plans[0], queries, seed=6)
+        grid = GridPlanner(plans[0])
+        same = flat = 0.0
+        extra = optimal = 0.0
+        for start, end in zip(starts, ends):
+            t0 = time.time()
+            distance, path = hmap.dijkstra((0,) + start, (0,) + end)
+            same += time.time() - t0
+            t0 = time.time()
+            best, path = grid.dijkstra(start, end)
+            flat += time.time() - t0
+            extra += distance - best
+            optimal += best
+        print("%-14s %10.2f %14.1f %14.1f %12.1f %10.2f" % (
+            "%dx%dx%d" % (floors, size, size), build, cross,
+            same * 1000 / queries, flat * 1000 / queries, 100 * extra / max(optimal, 1)))
+
+
+def bench_batch(sizes=SIZES, wards=40, departments=10, processes=4):
+    """
+    Ward-cell to department distance matrix: one dijkstra call per pair
+    against batch_dijkstra in-process and over a process pool.
+    """
+    print("%-10s %8s %14s %12s %14s" % ("map", "pairs", "per-pair s", "batch s", "batch x%d s" % processes))
+    for size in sizes:
+        maze = generate_hospital(size, size)
+        sources = random_open_cells(maze, wards, seed=7)
+        targets = random_open_cells(maze, departments, seed=8)
+
+        # The pair loop is slow, so time a slice of it and scale up
+        sample = sources[:max(1, wards // 10)]
+        t0 = time.time()
+        for source in sample:
+            for target in targets:
+                dijkstra(maze, source, target)
+        per_pair = (time.time() - t0) * len(sources) / len(sample)
+
+        t0 = time.time()
+        batch_dijkstra(maze, sources, targets)
+        serial = time.time() - t0
+        t0 = time.time()
+        batch_dijkstra(maze, sources, targets, processes=processes)
+        pooled = time.time() - t0
+        print("%-10s %8d %14.2f %12.2f %14.2f" % (
+            "%dx%d" % (size, size), wards * departments, per_pair, serial, pooled))
+
+
+def bench_costmap(sizes=SIZES, hits=2000):
+    """
+    Cost of feeding sonar hits through a Costmap into a listening planner,
+    per hit and per decay pass, against the map size.
+    """
+    print("%-10s %12s %14s %12s" % ("map", "us/hit", "us/decay cell", "active"))
+    for size in sizes:
+        maze = generate_hospital(size, size)
+        costmap = Costmap(maze, half_life=5.0)
+        costmap.listeners.append(GridPlanner(maze))
+        cells = random_open_cells(maze, hits, seed=9)
+        # Let the planner's big lists age out of the young GC generations
+        # first, or the first collections scanning them get timed too
+        gc.collect()
+        t0 = time.time()
+        for cell in cells:
+            costmap.add(cell)
+        per_hit = (time.time() - t0) * 1e6 / hits
+        active = len(costmap)
+        t0 = time.time()
+        costmap.decay(costmap.clock.time() + 10.0)
+        per_cell = (time.time() - t0) * 1e6 / max(1, active)
+        print("%-10s %12.1f %14.1f %12d" % ("%dx%d" % (size, size), per_hit, per_cell, active))
+
+
+def bench_floor_map(sizes=SIZES, repeat=5):
+    """
+    Time to load a saved floor plan: memory-mapped .npy, PGM and raw grid
+    files against reading the whole .npy into memory.
+    """
+    print("%-10s %10s %10s %10s %12s" % ("map", "npy ms", "pgm ms", "raw ms", "read npy ms"))
+    folder = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            maze = generate_hospital(size, size).astype(np.uint8)
+            floor = Floor_Map.FloorMap(maze, Floor_Map.DEFAULT_DEPARTMENTS)
+            npy = os.path.join(folder, "map.npy")
+            floor.save(npy)
+            pgm = os.path.join(folder, "map.pgm")
+            with open(pgm, "wb") as f:
+                f.write(("P5\n%d %d\n255\n" % (size, size)).encode("ascii"))
+                f.write(maze.tobytes())
+            raw = os.path.join(folder, "map.grid")
+            maze.tofile(raw)
+
+            loaders = [
+                lambda: Floor_Map.load(npy),
+                lambda: Floor_Map.load(pgm),
+                lambda: Floor_Map.load(raw, shape=maze.shape),
+                lambda: np.load(npy),
+            ]
+            times = []
+            for loader in loaders:
+                t0 = time.time()
+                for _ in range(repeat):
+                    loader()
+                times.append((time.time() - t0) * 1000 / repeat)
+            print("%-10s %10.2f %10.2f %10.2f %12.2f" % (("%dx%d" % (size, size),) + tuple(times)))
+    finally:
+        shutil.rmtree(folder)
+
+
+BENCHMARKS = {
+    "latency": bench_query_latency,
+    "replan": bench_replanning,
+    "turns": bench_turn_aware,
+    "hierarchical": bench_hierarchical,
+    "batch": bench_batch,
+    "costmap": bench_costmap,
+    "floormap": bench_floor_map,
+}
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    names = [arg for arg in args if arg in BENCHMARKS] or sorted(BENCHMARKS)
+    sizes = [int(arg) for arg in args if arg.isdigit()] or SIZES
+    for name in names:
+        print("== %s ==" % name)
+        BENCHMARKS[name](sizes)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Replays sonar traces through the obstacle decision and reports false
+stops and detection latency, raw threshold versus Sonar_Filter.
+
+Usage: python Benchmark_Sonar.py [trace.csv ...] [minutes]
+
+A trace CSV has a header and columns time, left, right and optionally
+truth (1 while an obstacle really is within the threshold). Without
+files, synthetic traces are generated: echo artefacts (short false
+echoes and dropouts to max range) on top of people walking up to the
+robot and leaving again.
+"""
+from __future__ import division, print_function
+import sys
+import numpy as np
+from Sonar_Filter import SonarFilter
+
+THRESHOLD = 0.5
+
+
+def synthetic_trace(minutes=10, rate=10.0, artefacts=0.02, noise=0.01, seed=0):
+    """
+    Returns (rows, truth): an (n, 3) array of time, left, right and the
+    true blocked flag per row.
+    """
+    rng = np.random.RandomState(seed)
+    n = int(minutes * 60 * rate)
+    t = np.arange(n) / rate
+    distance = np.full(n, 2.55)
+    start = 0
+    while True:
+        start += int(rng.uniform(10, 40) * rate)
+        if start >= n:
+            break
+        speed = rng.uniform(0.1, 0.6)
+        closest = rng.uniform(0.15, 0.45)
+        stay = int(rng.uniform(0.5, 4.0) * rate)
+        approach = np.arange(2.0, closest, -speed / rate)
+        leave = approach[::-1]
+        event = np.concatenate((approach, np.full(stay, closest), leave))
+        end = min(n, start + len(event))
+        distance[start:end] = np.minimum(distance[start:end], event[:end - start])
+        start = end
+    truth = distance < THRESHOLD
+
+    sensors = []
+    for side in range(2):
+        values = distance + rng.normal(0.0, noise, n)
+        hit = rng.rand(n) < artefacts
+        short = hit & (rng.rand(n) < 0.5)
+        values[short] = rng.uniform(0.2, THRESHOLD, short.sum())
+        values[hit & ~short] = 2.55
+        sensors.append(np.clip(values, 0.0, 2.55))
+    return np.column_stack((t, sensors[0], sensors[1])), truth
+
+
+def load_trace(path):
+    data = np.genfromtxt(path, delimiter=",", names=True)
+    rows = np.column_stack((data["time"], data["left"], data["right"]))
+    truth = data["truth"] > 0 if "truth" in data.dtype.names else None
+    return rows, truth
+
+
+def raw_detect(rows, threshold=THRESHOLD):
+    return np.minimum(rows[:, 1], rows[:, 2]) < threshold
+
+
+def score(rows, detected, truth, slack=0.5):
+    """
+    False stops per minute (detections starting while the path is clear and
+    not within slack seconds of a real obstacle) and detection latencies (s)
+    of the real obstacles.
+    """
+    t = rows[:, 0]
+    minutes = (t[-1] - t[0]) / 60 if len(t) > 1 else 0.0
+    onsets = np.nonzero(detected & ~np.concatenate(([False], detected[:-1])))[0]
+    if truth is None:
+        return len(onsets) / minutes if minutes else 0.0, None
+    near = np.zeros(len(t), dtype=bool)
+    truth_idx = np.nonzero(truth)[0]
+    if len(truth_idx):
+        pos = np.searchsorted(t[truth_idx], t)
+        before = t[truth_idx[np.maximum(pos - 1, 0)]]
+        after = t[truth_idx[np.minimum(pos, len(truth_idx) - 1)]]
+        near = (np.abs(t - before) <= slack) | (np.abs(after - t) <= slack)
+    false_stops = (~near[onsets]).sum()
+
+    latencies = []
+    events = np.nonzero(truth & ~np.concatenate(([False], truth[:-1])))[0]
+    for start in events:
+        hits = np.nonzero(detected[start:])[0]
+        if len(hits):
+            latencies.append(t[start + hits[0]] - t[start])
+    return false_stops / minutes if minutes else 0.0, latencies
+
+
+def bench(traces, sonar_filter=None):
+    sonar_filter = sonar_filter or SonarFilter(threshold=THRESHOLD)
+    print("%-10s %18s %14s %14s" % ("decision", "false stops/min", "latency ms", "max ms"))
+    for name in ("raw", "filtered"):
+        rates, latencies = [], []
+        for rows, truth in traces:
+            detected = raw_detect(rows) if name == "raw" else sonar_filter.detect(rows)
+            rate, found = score(rows, detected, truth)
+            rates.append(rate)
+            latencies.extend(found or [])
+        mean = 1000 * np.mean(latencies) if latencies else float("nan")
+        worst = 1000 * np.max(latencies) if latencies else float("nan")
+        print("%-10s %18.2f %14.0f %14.0f" % (name, np.mean(rates), mean, worst))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    files = [arg for arg in args if not arg.isdigit()]
+    if files:
+        traces = [load_trace(path) for path in files]
+    else:
+        minutes = int(([arg for arg in args if arg.isdigit()] or [30])[0])
+        traces = [synthetic_trace(minutes, seed=seed) for seed in range(5)]
+    bench(traces)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import sys
+import threading
+import time
+import numpy as np
+from Frame_Bus import Subscription
+from Frame_Protocol import CODEC_RAW, DECODE_INTO, decode, decode_flags, decoded_shape
+
+try:
+    import cv2
+except ImportError:   # frames can still be fed in and passed on as they are
+    cv2 = None
+
+
+class BufferPool(object):
+    """
+    Reusable output arrays for frame conversions and copies, up to depth
+    per shape. An array is only handed out again once nothing but the
+    pool refers to it, neither directly nor through a view: a consumer
+    may keep a frame as long as it likes, and when every pooled array of
+    a shape is still held, get() returns a fresh one instead.
+    """
+
+    def __init__(self, depth=8):
+        self.depth = depth
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            buffers = self._buffers.setdefault(key, [])
+            for buffer in buffers:
+                if sys.getrefcount(buffer) <= _UNUSED:
+                    return buffer
+            buffer = np.empty(shape, dtype=dtype)
+            if len(buffers) < self.depth:
+                buffers.append(buffer)
+        return buffer
+
+
+def _unused_refcount():
+    # References to a pooled array nobody holds, as BufferPool.get counts them
+    buffers = [np.empty(1)]
+    for buffer in buffers:
+        return sys.getrefcount(buffer)
+
+
+_UNUSED = _unused_refcount()
+
+
+class SharedFrame(object):
+    """
+    One captured BGR image shared by every consumer. Conversions are
+    computed on first request and memoized, so a gray or resized version
+    is made once per frame however many consumers ask for it. With a
+    BufferPool they are written into pooled arrays.
+    """
+
+    def __init__(self, image, seq, timestamp, pool=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.pool = pool
+        self._views = {} if image is None else {(None, False): image}
+        self._lock = threading.Lock()
+
+    @property
+    def image(self):
+        return self.view()
+
+    def view(self, size=None, gray=False):
+        """
+        The image, gray and/or resized to size = (width, height).
+        """
+        image = self._views.get((size, gray))
+        if image is not None:
+            return image
+        with self._lock:
+            return self._view(size, gray)
+
+    def _view(self, size, gray):
+        image = self._views.get((size, gray))
+        if image is None:
+            image = self._convert(size, gray)
+            self._views[(size, gray)] = image
+        return image
+
+    def _convert(self, size, gray):
+        if size is not None:
+            return self._resize(self._view(None, gray), size)
+        image = self._view(None, False)
+        if image.ndim == 2:
+            return image
+        out = self.pool.get(image.shape[:2]) if self.pool is not None else None
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
+
+    def _resize(self, image, size):
+        if image.shape[1] == size[0] and image.shape[0] == size[1]:
+            return image
+        out = self.pool.get((size[1], size[0]) + image.shape[2:]) if self.pool is not None else None
+        return cv2.resize(image, size, dst=out, interpolation=cv2.INTER_AREA)
+
+
+class EncodedFrame(SharedFrame):
+    """
+    A received frame that stays compressed until a consumer asks for it.
+    Each view is decoded the cheapest way: gray straight from the JPEG
+    (IMREAD_GRAYSCALE) and smaller sizes at reduced scale
+    (IMREAD_REDUCED_*), so frames nobody takes are never decoded. Raw
+    frames are viewed as they are and converted like a SharedFrame.
+    """
+
+    def __init__(self, header, payload, seq, timestamp, pool=None):
+        SharedFrame.__init__(self, None, seq, timestamp, pool)
+        self.header = header
+        self.payload = payload
+        self.decodes = 0
+
+    def _convert(self, size, gray):
+        if self.header.codec == CODEC_RAW:
+            if size is None and not gray:
+                return decode(self.header, self.payload)
+            # Raw pixels have no cheaper decode: convert the full image
+            return SharedFrame._convert(self, size, gray)
+        if gray and size is None and (None, False) in self._views:
+            # Already decoded in colour: converting is cheaper than decoding
+            return SharedFrame._convert(self, size, gray)
+        flags, factor = decode_flags(self.header, size, gray)
+        shape = decoded_shape(self.header, factor, gray)
+        # Only a decoder that fills out takes a pooled array; otherwise one
+        # would be handed out and never written
+        out = self.pool.get(shape) if DECODE_INTO and self.pool is not None and shape is not None else None
+        image = decode(self.header, self.payload, flags, out)
+        self.decodes += 1
+        if image is None:
+            raise ValueError("Frame %d could not be decoded" % self.seq)
+        if size is not None:
+            return self._resize(image, size)
+        return image
+
+
+class CameraConsumer(object):
+    """
+    A consumer of a CameraService: at most rate frames per second (all
+    of them with None), each as view(size, gray). With a callback the
+    frames are handed over on the consumer's own thread; otherwise call
+    get(). Either way the consumer has a latest-wins Frame_Bus slot.
+    """
+
+    def __init__(self, name, callback=None, rate=None, size=None, gray=False):
+        self.name = name
+        self.period = 1.0 / rate if rate else 0.0
+        self.size = size
+        self.gray = gray
+        self.callback = callback
+        self._next = 0.0
+        self.subscription = Subscription(name, self._deliver if callback is not None else None)
+
+    def offer(self, frame, now):
+        if now < self._next:
+            return
+        # Keep to the rate on average; after a gap start counting afresh
+        if self._next and now - self._next < self.period:
+            self._next += self.period
+        else:
+            self._next = now + self.period
+        self.subscription.put((frame.seq, frame.timestamp, frame))
+
+    def get(self, timeout=None):
+        """
+        (seq, timestamp, image) of the newest frame, None on timeout.
+        """
+        item = self.subscription.get(timeout)
+        if item is None:
+            return None
+        seq, timestamp, frame = item
+        return seq, timestamp, frame.view(self.size, self.gray)
+
+    def stats(self):
+        return self.subscription.stats()
+
+    def close(self):
+        self.subscription.close()
+
+    def _deliver(self, frame):
+        self.callback(frame.view(self.size, self.gray))
+
+
+class CameraService(object):
+    """
+    The one owner of a camera. A capture thread reads frames at the
+    camera's own rate and offers each to every consumer, which takes it
+    at its own rate and resolution; see CameraConsumer and SharedFrame.
+
+    source is a device index or URL for cv2.VideoCapture (api selects
+    the backend), an object with read() like VideoCapture, or None for a
+    service that is fed with publish() instead, e.g. from
+    PCCameraReceiver. publish/subscribe/stats/close match Frame_Bus, so it
+    can stand in for a FrameBus. Conversions go into pooled arrays (pool,
+    a BufferPool by default); consumers own the images they get and may
+    keep them, the pool does not reuse an array anybody still holds.
+    failed counts the camera reads that failed, failing the ones since
+    the last good frame.
+    """
+
+    def __init__(self, source=None, api=None, clock=time, pool=None):
+        self.source = source
+        self.api = api
+        self.clock = clock
+        self.pool = pool if pool is not None else BufferPool()
+        self.published = 0
+        self.failed = 0
+        self.failing = 0
+        self.latest = None
+        self._consumers = []
+        self._lock = threading.Lock()
+        self._capture = None
+        self._running = False
+        self._thread = None
+
+    def subscribe(self, name, callback=None, rate=None, size=None, gray=False):
+        consumer = CameraConsumer(name, callback, rate, size, gray)
+        with self._lock:
+            self._consumers = self._consumers + [consumer]
+        return consumer
+
+    def unsubscribe(self, consumer):
+        with self._lock:
+            self._consumers = [c for c in self._consumers if c is not consumer]
+        consumer.close()
+
+    def publish(self, image, timestamp=None, seq=None):
+        """
+        Offers one BGR image to every consumer. Returns its SharedFrame.
+        """
+        now = self.clock.time()
+        self.published += 1
+        frame = SharedFrame(image, self.published if seq is None else seq,
+                            now if timestamp is None else timestamp, self.pool)
+        return self._offer(frame, now)
+
+    def publish_encoded(self, header, payload):
+        """
+        Offers one Frame_Protocol frame, still encoded, to every consumer;
+        it is decoded only as far as the consumers that take it need. The
+        payload must not be reused afterwards.
+        """
+        self.published += 1
+        frame = EncodedFrame(header, payload, header.seq, header.timestamp, self.pool)
+        return self._offer(frame, self.clock.time())
+
+    def _offer(self, frame, now):
+        self.latest = frame
+        for consumer in self._consumers:
+            consumer.offer(frame, now)
+        return frame
+
+    def stats(self):
+        return [consumer.stats() for consumer in self._consumers]
+
+    # ---------------- Capture ----------------
+
+    def start(self):
+        """
+        Opens the camera and starts capturing; nothing to do for a fed
+        service or one already running.
+        """
+        if self.source is None or self._thread is not None:
+            return self
+        if hasattr(self.source, "read"):
+            self._capture = self.source
+        elif self.api is None:
+            self._capture = cv2.VideoCapture(self.source)
+        else:
+            self._capture = cv2.VideoCapture(self.source, self.api)
+        if hasattr(self._capture, "isOpened") and not self._capture.isOpened():
+            raise IOError("Cannot open camera %r" % (self.source,))
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._capture is not None and self._capture is not self.source:
+            self._capture.release()
+        self._capture = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            consumers, self._consumers = self._consumers, []
+        for consumer in consumers:
+            consumer.close()
+
+    def _capture_loop(self):
+        while self._running:
+            ok, image = self._capture.read()
+            if not ok:
+                self.failed += 1
+                self.failing += 1
+                self.clock.sleep(0.01)
+                continue
+            self.failing = 0
+            self.publish(image)
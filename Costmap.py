@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import math
+import threading
+import time
+import numpy as np
+
+
+class Costmap(object):
+    """
+    Static maze plus a decaying dynamic layer from what the sonar sees.
+
+    costs is the combined map the planners should use: static weight plus
+    the rounded dynamic cost of each open cell (walls stay walls). It is
+    updated in place, one cell at a time, and every changed cell is
+    passed on to the listeners' set_cost(cell, weight) — GridPlanner,
+    IncrementalPlanner, RouteTable, DistanceFields and RouteCache all
+    have one — so nothing copies or rescans the whole map per update.
+
+    Dynamic costs halve every half_life seconds. Only cells that carry a
+    dynamic cost are kept and decayed, so updates cost time in the number
+    of touched cells, not the map size. A corridor that keeps producing
+    hits keeps its cost up and gets routed around.
+
+    Updates may come from several threads (the motion executor observing,
+    a speech callback decaying); they are serialized by a lock, which is
+    also held while the listeners are told.
+    """
+
+    def __init__(self, maze, half_life=60.0, hit_cost=4.0, max_cost=20.0, clear_factor=0.5, clock=time):
+        self.static = np.array(maze)
+        self.costs = self.static.copy()
+        self.half_life = half_life
+        self.hit_cost = hit_cost
+        self.max_cost = max_cost
+        self.clear_factor = clear_factor
+        self.clock = clock
+        self.listeners = []
+        self._active = {}   # cell -> (dynamic cost, clock time it was set)
+        self._lock = threading.RLock()
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._active)
+
+    def dynamic(self, cell, now=None):
+        """
+        Current dynamic cost of a cell.
+        """
+        entry = self._active.get(cell)
+        if entry is None:
+            return 0.0
+        value, stamp = entry
+        now = self.clock.time() if now is None else now
+        return value * 0.5 ** ((now - stamp) / self.half_life)
+
+    # ---------------- Updates ----------------
+
+    def add(self, cell, cost=None, now=None):
+        """
+        Adds cost (hit_cost by default) to a cell's dynamic layer.
+        """
+        cell = (int(cell[0]), int(cell[1]))
+        if not (0 <= cell[0] < self.static.shape[0] and 0 <= cell[1] < self.static.shape[1]):
+            return
+        with self._lock:
+            now = self.clock.time() if now is None else now
+            value = min(self.max_cost, self.dynamic(cell, now) + (self.hit_cost if cost is None else cost))
+            self._active[cell] = (value, now)
+            self._apply(cell, value)
+
+    def clear(self, cell, now=None):
+        """
+        Lowers a cell's dynamic cost by clear_factor: the sonar saw through it.
+        """
+        with self._lock:
+            entry = self._active.get(cell)
+            if entry is None:
+                return
+            now = self.clock.time() if now is None else now
+            value = self.dynamic(cell, now) * self.clear_factor
+            self._set(cell, value, now)
+
+    def decay(self, now=None):
+        """
+        Applies decay to every cell with a dynamic cost and drops the ones
+        that no longer change the combined weight.
+        """
+        with self._lock:
+            now = self.clock.time() if now is None else now
+            for cell in list(self._active):
+                self._set(cell, self.dynamic(cell, now), now)
+
+    def set_static(self, maze):
+        """
+        Takes new static weights (e.g. from GUI.get_updated_maze), passing
+        on only the cells that changed.
+        """
+        with self._lock:
+            maze = np.asarray(maze)
+            for x, y in np.argwhere(maze != self.static):
+                cell = (int(x), int(y))
+                self.static[cell] = maze[cell]
+                self._apply(cell, self.dynamic(cell))
+
+    def observe(self, frame, pose, left, right, max_range=2.5, offset=math.radians(25)):
+        """
+        Projects one pair of filtered sonar distances (see
+        Sonar_Monitor.SonarMonitor.latest) taken at odometry pose into the
+        grid: the cell at the echo gets hit_cost, the cells the sound
+        crossed get cleared. Raw readings would mark a cell for every echo
+        artefact. frame is the Pose_Tracker.GridFrame of the current route.
+        """
+        with self._lock:
+            now = self.clock.time()
+            x, y, theta = pose
+            robot = frame.cell_of(x, y)
+            step = frame.cell_size / 2
+            for distance, direction in ((left, offset), (right, -offset)):
+                angle = theta + direction
+                c, s = math.cos(angle), math.sin(angle)
+                seen = set([robot])
+                along = step
+                while along < min(distance, max_range):
+                    cell = frame.cell_of(x + c * along, y + s * along)
+                    if cell not in seen:
+                        seen.add(cell)
+                        self.clear(cell, now)
+                    along += step
+                if distance < max_range:
+                    self.add(frame.cell_of(x + c * distance, y + s * distance), now=now)
+
+    # ---------------- Internals ----------------
+
+    def _set(self, cell, value, now):
+        if value < 0.5:
+            del self._active[cell]
+            value = 0.0
+        else:
+            self._active[cell] = (value, now)
+        self._apply(cell, value)
+
+    def _apply(self, cell, value):
+        base = self.static[cell]
+        weight = base + int(round(value)) if base != 0 else base
+        if weight != self.costs[cell]:
+            self.costs[cell] = weight
+            self.updates += 1
+            for listener in self.listeners:
+                listener.set_cost(cell, weight)
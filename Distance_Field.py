@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import heapq
+import numpy as np
+from Grid_Planner import INF, directions
+
+
+class DistanceFields(object):
+    """
+    Cost-to-go fields towards each department.
+
+    field(dest)[cell] is the cost of the cheapest route from cell to dest
+    (the same value Path_Calculation.dijkstra returns), and the matching
+    next-step table gives the first move of that route, so replanning from
+    any cell is a lookup. Fields are built on first use, each with one
+    Dijkstra run outwards from its department.
+
+    A weight change only marks a field dirty when it can alter it: a cell
+    that got more expensive must be on some cell's next step, a cell that
+    got cheaper must offer a neighbour a cheaper route. Otherwise the cell
+    is patched in place. Dirty fields are rebuilt on their next lookup.
+    """
+
+    def __init__(self, maze, departments):
+        self.maze = np.array(maze)
+        self.rows, self.cols = self.maze.shape
+        self.coords = [coord for num, (name, coord) in sorted(departments.items())]
+
+        # Cost of entering each cell, inf for walls and the padding border
+        self._step = np.full((self.rows + 2, self.cols + 2), INF)
+        costs = self.maze.astype(np.float64)
+        costs[costs == 0] = INF
+        self._step[1:-1, 1:-1] = costs
+
+        self._values = {}   # dest -> padded cost-to-go array
+        self._next = {}     # dest -> index into directions, -1 if none
+        self._dirty = set(self.coords)
+        self.rebuilt = 0
+
+    def __contains__(self, dest):
+        return dest in self.coords
+
+    # ---------------- Lookups ----------------
+
+    def field(self, dest):
+        """
+        Cost-to-go array towards dest, inf where dest cannot be reached.
+        """
+        self._ensure(dest)
+        return self._values[dest][1:-1, 1:-1]
+
+    def next_step(self, cell, dest):
+        """
+        Neighbour of cell on a cheapest route to dest, or None if cell is
+        dest or cannot reach it.
+        """
+        self._ensure(dest)
+        d = self._next[dest][cell]
+        if d < 0:
+            return None
+        dx, dy = directions[d]
+        return (cell[0] + dx, cell[1] + dy)
+
+    def path_to(self, cell, dest):
+        """
+        Returns (distance, path) from cell to dest like Path_Calculation.dijkstra.
+        As there, a wall start cell is only left, never entered, so the
+        robot can get off a cell that was walled up under it.
+        """
+        self._ensure(dest)
+        values = self._values[dest]
+        x, y = cell[0] + 1, cell[1] + 1
+        distance = values[x, y]
+        path = [cell]
+        if distance == INF and self._step[x, y] == INF:
+            options = [values[x + dx, y + dy] + self._step[x + dx, y + dy] for dx, dy in directions]
+            best = int(np.argmin(options))
+            distance = options[best]
+            if distance < INF:
+                dx, dy = directions[best]
+                path.append((cell[0] + dx, cell[1] + dy))
+        if distance == INF:
+            return -1, [dest]
+        nxt = self._next[dest]
+        while path[-1] != dest:
+            x, y = path[-1]
+            dx, dy = directions[nxt[x, y]]
+            path.append((x + dx, y + dy))
+        if self.maze.dtype.kind in 'iub':
+            distance = int(distance)
+        return distance, path
+
+    # ---------------- Updates ----------------
+
+    def sync(self, maze):
+        """
+        Applies every cell that differs between maze and the fields' copy.
+        """
+        maze = np.asarray(maze)
+        if maze.shape != self.maze.shape:
+            raise ValueError("maze shape changed from %s to %s" % (self.maze.shape, maze.shape))
+        for x, y in np.argwhere(maze != self.maze):
+            self.set_cost((int(x), int(y)), maze[x, y])
+
+    def set_cost(self, cell, weight):
+        """
+        Changes one cell weight (0 = wall) and dirties the fields it affects.
+        """
+        old = self.maze[cell]
+        if old == weight:
+            return
+        self.maze[cell] = weight
+        x, y = cell[0] + 1, cell[1] + 1
+        self._step[x, y] = weight if weight != 0 else INF
+
+        worse = weight == 0 or (old != 0 and weight > old)
+        for dest in self.coords:
+            if dest in self._dirty:
+                continue
+            if worse:
+                affected = self._is_used(dest, x, y)
+                if not affected and weight == 0:
+                    self._values[dest][x, y] = INF
+                    self._next[dest][cell] = -1
+            else:
+                affected = self._patch_cheaper(dest, x, y)
+            if affected:
+                self._dirty.add(dest)
+
+    def _is_used(self, dest, x, y):
+        nxt = self._next[dest]
+        for d, (dx, dy) in enumerate(directions):
+            # The neighbour at (x - dx, y - dy) steps by (dx, dy) into the cell
+            nx, ny = x - dx - 1, y - dy - 1
+            if 0 <= nx < self.rows and 0 <= ny < self.cols and nxt[nx, ny] == d:
+                return True
+        return False
+
+    def _patch_cheaper(self, dest, x, y):
+        values, step = self._values[dest], self._step
+        if (x - 1, y - 1) == dest:
+            reach, best = 0.0, -1
+        else:
+            options = [values[x + dx, y + dy] + step[x + dx, y + dy] for dx, dy in directions]
+            best = int(np.argmin(options))
+            reach = options[best]
+            if reach == INF:
+                best = -1
+        via = reach + step[x, y]
+        for dx, dy in directions:
+            if step[x + dx, y + dy] < INF and via < values[x + dx, y + dy]:
+                return True
+        values[x, y] = reach
+        self._next[dest][x - 1, y - 1] = best
+        return False
+
+    # ---------------- Building ----------------
+
+    def _ensure(self, dest):
+        if dest in self._dirty:
+            self._build(dest)
+            self._dirty.discard(dest)
+            self.rebuilt += 1
+
+    def _build(self, dest):
+        # Dijkstra outwards from dest over the padded step array: leaving a
+        # settled cell u towards a neighbour v costs step[u], the price of
+        # entering u on the way from v to dest.
+        step = self._step
+        flat = step.ravel().tolist()
+        width = self.cols + 2
+        offsets = (-width, width, -1, 1)
+        values = [INF] * len(flat)
+        source = (dest[0] + 1) * width + dest[1] + 1
+        values[source] = 0.0
+        heap = [(0.0, source)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heap:
+            g, i = heappop(heap)
+            if g > values[i]:
+                continue
+            nd = g + flat[i]
+            if nd == INF:
+                continue
+            for off in offsets:
+                j = i + off
+                if flat[j] < INF and nd < values[j]:
+                    values[j] = nd
+                    heappush(heap, (nd, j))
+        values = np.array(values).reshape(step.shape)
+
+        options = np.array([values[1 + dx:self.rows + 1 + dx, 1 + dy:self.cols + 1 + dy] +
+                            step[1 + dx:self.rows + 1 + dx, 1 + dy:self.cols + 1 + dy]
+                            for dx, dy in directions])
+        nxt = options.argmin(axis=0).astype(np.int8)
+        nxt[~np.isfinite(values[1:-1, 1:-1])] = -1
+        nxt[dest] = -1
+
+        self._values[dest] = values
+        self._next[dest] = nxt
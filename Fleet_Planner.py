@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+from collections import deque
+import heapq
+from Grid_Planner import GridPlanner, INF
+
+
+class ReservationTable(object):
+    """
+    Space-time reservations shared by all robots.
+
+    A cell is held by one robot per time step, and a move a -> b during
+    step t blocks the opposite move b -> a in the same step, so two robots
+    can never swap places head-on in a one-cell corridor.
+    """
+
+    def __init__(self):
+        self._cells = {}   # (t, cell) -> robot
+        self._moves = {}   # (t, from, to) -> robot
+
+    def cell_free(self, cell, t, robot):
+        return self._cells.get((t, cell), robot) == robot
+
+    def move_free(self, a, b, t, robot):
+        return self._moves.get((t, b, a), robot) == robot
+
+    def reserve(self, robot, path, t0, dwell=0):
+        """
+        Reserves path[k] at step t0 + k, then the last cell for dwell more
+        steps. Cells can be any hashable id; FleetPlanner uses flat indices.
+        """
+        for k, cell in enumerate(path):
+            self._cells[(t0 + k, cell)] = robot
+            if k:
+                self._moves[(t0 + k - 1, path[k - 1], cell)] = robot
+        end = t0 + len(path) - 1
+        for t in range(end + 1, end + dwell + 1):
+            self._cells[(t, path[-1])] = robot
+
+    def prune(self, before):
+        """
+        Forgets reservations that ended before step `before`.
+        """
+        for key in [key for key in self._cells if key[0] < before]:
+            del self._cells[key]
+        for key in [key for key in self._moves if key[0] < before]:
+            del self._moves[key]
+
+    def __len__(self):
+        return len(self._cells)
+
+
+class FleetPlanner(object):
+    """
+    Prioritized cooperative A* for several robots on one maze.
+
+    Requests are planned one after another in space-time (cell, step)
+    against a shared ReservationTable, each robot avoiding the ones planned
+    before it. Every step a robot either moves to a neighbouring cell or
+    waits. Robots are assumed to wait off the corridor (in a department
+    room) until they enter at their start cell, and to hold their goal for
+    `dwell` steps after arriving before leaving it again.
+
+    Costs of the maze only decide what is open; one move is one step.
+    """
+
+    def __init__(self, maze, dwell=2, max_delay=50):
+        self.grid = GridPlanner(maze)
+        self.table = ReservationTable()
+        self.dwell = dwell
+        self.max_delay = max_delay
+        self._heuristics = {}
+        self.expanded = 0
+
+    def plan(self, requests, t0=0):
+        """
+        Plans [(robot, start, goal), ...] in order of priority from step t0.
+        Returns {robot: (depart step, path)}; path[k] is the robot's cell at
+        depart + k. Robots without a route within max_delay are left out.
+        """
+        routes = {}
+        for robot, start, goal in requests:
+            route = self.submit(robot, start, goal, t0)
+            if route is not None:
+                routes[robot] = route
+        return routes
+
+    def submit(self, robot, start, goal, t0):
+        """
+        Plans one robot against the current reservations and reserves the
+        result. Returns (depart step, path) or None.
+        """
+        s, g = self.grid.index(start), self.grid.index(goal)
+        h = self._heuristic(g)
+        if h[s] == INF:
+            return None
+        table = self.table
+        for depart in range(t0, t0 + self.max_delay + 1):
+            if not table.cell_free(s, depart, robot):
+                continue
+            flat_path = self._search(robot, s, g, depart, h)
+            if flat_path is not None:
+                table.reserve(robot, flat_path, depart, self.dwell)
+                return depart, [self.grid.cell(i) for i in flat_path]
+        return None
+
+    def steps_between(self, start, goal):
+        """
+        Number of moves from start to goal ignoring other robots (inf if
+        there is no route).
+        """
+        return self._heuristic(self.grid.index(goal))[self.grid.index(start)]
+
+    def _heuristic(self, goal):
+        """
+        Exact step counts to goal (breadth-first, ignoring other robots).
+        """
+        h = self._heuristics.get(goal)
+        if h is not None:
+            return h
+        flat, offsets = self.grid._flat, self.grid._offsets
+        h = [INF] * len(flat)
+        h[goal] = 0
+        queue = deque([goal])
+        while queue:
+            i = queue.popleft()
+            for off in offsets:
+                j = i + off
+                if flat[j] and h[j] == INF:
+                    h[j] = h[i] + 1
+                    queue.append(j)
+        self._heuristics[goal] = h
+        return h
+
+    def _search(self, robot, s, g, t0, h):
+        table = self.table
+        flat, offsets = self.grid._flat, self.grid._offsets
+        # Allow some waiting on top of the free-space route length
+        limit = t0 + 2 * h[s] + 20
+        heap = [(h[s], t0, s)]
+        parent = {(s, t0): None}
+        expanded = 0
+        while heap:
+            f, t, i = heapq.heappop(heap)
+            expanded += 1
+            if i == g and self._can_rest(robot, g, t):
+                self.expanded += expanded
+                path = []
+                state = (i, t)
+                while state is not None:
+                    path.append(state[0])
+                    state = parent[state]
+                path.reverse()
+                return path
+            if t >= limit:
+                continue
+            for j in (i, i + offsets[0], i + offsets[1], i + offsets[2], i + offsets[3]):
+                if not flat[j] or h[j] == INF or (j, t + 1) in parent:
+                    continue
+                if not table.cell_free(j, t + 1, robot):
+                    continue
+                if j != i and not table.move_free(i, j, t, robot):
+                    continue
+                parent[(j, t + 1)] = (i, t)
+                heapq.heappush(heap, (t + 1 - t0 + h[j], t + 1, j))
+        self.expanded += expanded
+        return None
+
+    def _can_rest(self, robot, cell, t):
+        for k in range(t, t + self.dwell + 1):
+            if not self.table.cell_free(cell, k, robot):
+                return False
+        return True
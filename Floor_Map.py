@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import json
+import os
+import threading
+import numpy as np
+
+# Built-in floor plan (0 = wall, 1 = path) and its departments,
+# used when no map file is configured
+DEFAULT_MAZE = np.array([
+    [0, 0, 1, 1, 1, 1, 1, 1],
+    [0, 0, 1, 0, 0, 0, 0, 0],
+    [1, 1, 1, 1, 1, 1, 1, 0],
+    [0, 0, 1, 0, 0, 0, 1, 0],
+    [0, 0, 1, 1, 1, 1, 1, 0],
+    [0, 0, 1, 0, 0, 0, 1, 0],
+    [0, 0, 1, 1, 1, 1, 1, 0],
+    [0, 0, 0, 0, 0, 0, 1, 0]
+])
+
+DEFAULT_DEPARTMENTS = {
+    1: ("internal", (0, 6)),
+    2: ("gastro", (2, 1)),
+    3: ("restroom", (2, 4)),
+    4: ("surgery", (4, 4)),
+    5: ("ent", (6, 4)),
+    6: ("emergency", (7, 6)),
+    7: ("lab", (5, 6))
+}
+
+# Environment variable naming the map file get_floor_map() loads
+MAP_ENV = "NAO_FLOOR_MAP"
+
+
+class FloorMap(object):
+    """
+    A floor plan in the maze format (0 = wall, otherwise the cost of
+    entering the cell) plus its department table {number: (name, (row, col))}.
+
+    grid may be a read-only memory map of the file it was loaded from;
+    planners copy what they need, and maze() gives a writable copy for
+    editing weights.
+    """
+
+    def __init__(self, grid, departments, cell_size=0.15, source=None):
+        self.grid = grid
+        self.departments = dict(departments)
+        self.cell_size = cell_size
+        self.source = source
+
+    @property
+    def shape(self):
+        return self.grid.shape
+
+    def maze(self):
+        """
+        Writable in-memory copy of the grid.
+        """
+        return np.array(self.grid)
+
+    def coord(self, number):
+        if number not in self.departments:
+            raise ValueError("Invalid department number. Please enter a number from %d to %d."
+                             % (min(self.departments), max(self.departments)))
+        return self.departments[number][1]
+
+    def number(self, name):
+        """
+        Department number by name, None if there is no such department.
+        """
+        for num, (dept, coord) in self.departments.items():
+            if dept == name:
+                return num
+        return None
+
+    def labels(self):
+        """
+        (name, (row, col)) of every department, by number.
+        """
+        return [self.departments[num] for num in sorted(self.departments)]
+
+    def save(self, path):
+        """
+        Writes the grid as .npy and the department table next to it as
+        <path>.json, ready for load().
+        """
+        np.save(path, np.asarray(self.grid))
+        if not path.endswith(".npy"):
+            path += ".npy"
+        _write_table(path, {"cell_size": self.cell_size}, self.departments)
+
+
+def load(path, departments=None, shape=None, dtype=None, free_threshold=None):
+    """
+    Loads a floor plan without reading the grid into memory:
+
+    - .npy: memory-mapped with np.load(mmap_mode="r").
+    - .pgm (binary P5): memory-mapped past the header. Pixel values are
+      the cell costs (0 = wall); with free_threshold the image is read as
+      an occupancy map instead (brighter than the threshold = open, cost
+      1), which costs one pass over the pixels.
+    - anything else: a raw C-order grid, memory-mapped with shape and
+      dtype from the arguments or the table.
+
+    The department table comes from departments or <path>.json:
+    {"cell_size": 0.15, "shape": [rows, cols], "dtype": "uint8",
+     "departments": {"1": ["internal", [0, 6]], ...}}.
+    """
+    table = _read_table(path)
+    if departments is None:
+        departments = dict((int(num), (name, tuple(cell)))
+                           for num, (name, cell) in table.get("departments", {}).items())
+    cell_size = table.get("cell_size", 0.15)
+
+    if path.endswith(".npy"):
+        grid = np.load(path, mmap_mode="r")
+    elif path.lower().endswith(".pgm"):
+        grid = _map_pgm(path)
+        if free_threshold is not None:
+            grid = (grid > free_threshold).astype(np.uint8)
+    else:
+        shape = shape or table.get("shape")
+        if shape is None:
+            raise ValueError("Raw map %s needs a shape" % path)
+        dtype = np.dtype(dtype or table.get("dtype", "uint8"))
+        grid = np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+    return FloorMap(grid, departments, cell_size, source=path)
+
+
+def default_map():
+    return FloorMap(DEFAULT_MAZE, DEFAULT_DEPARTMENTS)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def get_floor_map():
+    """
+    The floor plan every module works on: the file named by $NAO_FLOOR_MAP
+    if set, the built-in map otherwise. Loaded once per process.
+    """
+    global _current
+    with _current_lock:
+        if _current is None:
+            path = os.environ.get(MAP_ENV)
+            _current = load(path) if path else default_map()
+        return _current
+
+
+def set_floor_map(floor_map):
+    """
+    Replaces the shared floor plan (a FloorMap or a path to load).
+    Modules that already copied it keep their copy.
+    """
+    global _current
+    if not isinstance(floor_map, FloorMap):
+        floor_map = load(floor_map)
+    with _current_lock:
+        _current = floor_map
+    return floor_map
+
+
+# ---------------- Internals ----------------
+
+def _read_table(path):
+    table_path = path + ".json"
+    if not os.path.exists(table_path):
+        return {}
+    with open(table_path) as f:
+        return json.load(f)
+
+
+def _write_table(path, table, departments):
+    table = dict(table)
+    table["departments"] = dict((str(num), [name, list(cell)])
+                                for num, (name, cell) in departments.items())
+    with open(path + ".json", "w") as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+
+
+def _map_pgm(path):
+    """
+    Memory-maps the pixels of a binary (P5) PGM.
+    """
+    with open(path, "rb") as f:
+        header = f.read(512)
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while pos < len(header) and header[pos:pos + 1].isspace():
+            pos += 1
+        if header[pos:pos + 1] == b"#":
+            pos = header.index(b"\n", pos) + 1
+            continue
+        end = pos
+        while end < len(header) and not header[end:end + 1].isspace():
+            end += 1
+        if end == pos:
+            raise ValueError("Truncated PGM header in %s" % path)
+        fields.append(header[pos:end])
+        pos = end
+    if fields[0] != b"P5":
+        raise ValueError("%s is not a binary PGM (P5)" % path)
+    cols, rows, maxval = int(fields[1]), int(fields[2]), int(fields[3])
+    dtype = np.uint8 if maxval < 256 else np.dtype(">u2")
+    # A single whitespace byte separates the header from the pixels
+    return np.memmap(path, dtype=dtype, mode="r", offset=pos + 1, shape=(rows, cols))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import threading
+import time
+import numpy as np
+
+
+class Subscription(object):
+    """
+    One consumer's view of a FrameBus: a single latest-value-wins slot.
+
+    A new frame replaces one the consumer has not taken yet (counted in
+    dropped), so a slow consumer only ever sees the newest frame and never
+    holds up the publisher or the other consumers. The age of each frame
+    (now minus its capture timestamp) is measured when the consumer is
+    done with it, or when it takes it for consumers without a callback.
+    """
+
+    def __init__(self, name, callback=None, history=256):
+        self.name = name
+        self.callback = callback
+        self.delivered = 0
+        self.dropped = 0
+        self._item = None
+        self._ages = np.zeros(history)
+        self._aged = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = None
+        if callback is not None:
+            self._thread = threading.Thread(target=self._deliver_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def put(self, item):
+        """
+        item is (seq, timestamp, frame); replaces any frame not taken yet.
+        """
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Takes the newest (seq, timestamp, frame), waiting up to timeout
+        seconds; None on timeout or once closed.
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while self._item is None and self._running:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                left = deadline - time.time()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+            item, self._item = self._item, None
+        if item is not None:
+            self.delivered += 1
+            if self.callback is None:
+                self.record_age(item[1])
+        return item
+
+    def record_age(self, timestamp, now=None):
+        now = time.time() if now is None else now
+        self._ages[self._aged % len(self._ages)] = now - timestamp
+        self._aged += 1
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def stats(self):
+        """
+        Delivered and dropped counts and the frame age (ms) over the last
+        frames: median, 95th percentile, worst and the newest one.
+        """
+        ages = self._ages[:min(self._aged, len(self._ages))] * 1000
+        last = self._ages[(self._aged - 1) % len(self._ages)] * 1000 if self._aged else None
+        return {
+            "name": self.name,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "age_ms": float(np.median(ages)) if len(ages) else None,
+            "age_p95_ms": float(np.percentile(ages, 95)) if len(ages) else None,
+            "age_max_ms": float(ages.max()) if len(ages) else None,
+            "last_age_ms": last,
+        }
+
+    def _deliver_loop(self):
+        while self._running:
+            item = self.get()
+            if item is None:
+                continue
+            try:
+                self.callback(item[2])
+            except Exception as e:
+                print("[FrameBus] %s failed:" % self.name, str(e))
+            self.record_age(item[1])
+
+
+class FrameBus(object):
+    """
+    Fans frames out to independent consumers, each through its own
+    Subscription slot. publish() never waits on a consumer: it swaps a
+    reference into every slot and returns, so the thread reading the
+    socket does nothing else. Consumers subscribed with a callback get
+    their own thread; the others call get() from wherever they run.
+    """
+
+    def __init__(self):
+        self.published = 0
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, name, callback=None):
+        subscription = Subscription(name, callback)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        subscription.close()
+
+    def publish(self, frame, timestamp=None, seq=None):
+        """
+        Hands frame, captured at timestamp (time.time() by default), to
+        every subscriber. Publishers must not reuse frame's memory.
+        """
+        self.published += 1
+        item = (self.published if seq is None else seq,
+                time.time() if timestamp is None else timestamp, frame)
+        for subscription in self._subscriptions:
+            subscription.put(item)
+
+    def stats(self):
+        return [subscription.stats() for subscription in self._subscriptions]
+
+    def close(self):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import socket
+import struct
+import time
+from collections import namedtuple
+import numpy as np
+
+try:
+    import cv2
+except ImportError:   # raw frames still work without OpenCV
+    cv2 = None
+
+MAGIC = b"NAOF"
+VERSION = 1
+
+# Payload encodings
+CODEC_JPEG = 1
+CODEC_PNG = 2
+CODEC_RAW = 3   # uint8 pixels, height x width x channels, C order
+
+# magic, version, codec, channels, reserved, width, height, payload size,
+# sequence number, capture time (s since the epoch); network byte order
+HEADER = struct.Struct("!4sBBBBHHIQd")
+
+FrameHeader = namedtuple("FrameHeader", "version codec channels width height size seq timestamp")
+
+
+def pack_header(size, seq, timestamp, codec=CODEC_JPEG, width=0, height=0, channels=0):
+    return HEADER.pack(MAGIC, VERSION, codec, channels, 0, width, height, size, seq, timestamp)
+
+
+def unpack_header(data):
+    """
+    FrameHeader from the first HEADER.size bytes of data; ValueError if
+    they are not a frame header of a version this code understands.
+    """
+    magic, version, codec, channels, _, width, height, size, seq, timestamp = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a frame header (magic %r)" % magic)
+    if version != VERSION:
+        raise ValueError("Unsupported frame protocol version %d" % version)
+    return FrameHeader(version, codec, channels, width, height, size, seq, timestamp)
+
+
+class FrameSender(object):
+    """
+    Writes frames to a connected stream socket: a HEADER, then the encoded
+    bytes as they are. Nothing is pickled, so the receiver never runs
+    code from the wire.
+    """
+
+    def __init__(self, sock, quality=95):
+        self.sock = sock
+        self.quality = quality
+        self.seq = 0
+        # Header and payload go out in two writes; don't let Nagle hold
+        # back the tail of the payload waiting for the header's ACK
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, payload, codec=CODEC_JPEG, width=0, height=0, channels=0, timestamp=None):
+        """
+        Sends one encoded frame (bytes, bytearray or a uint8 array).
+        Returns its sequence number.
+        """
+        if isinstance(payload, np.ndarray):
+            payload = np.ascontiguousarray(payload).reshape(-1)
+        view = memoryview(payload)
+        size = len(view) * view.itemsize
+        timestamp = time.time() if timestamp is None else timestamp
+        self.seq += 1
+        self.sock.sendall(pack_header(size, self.seq, timestamp, codec, width, height, channels))
+        self.sock.sendall(view)
+        return self.seq
+
+    def send_image(self, frame, timestamp=None):
+        """
+        JPEG-encodes a BGR/gray image and sends it.
+        """
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        return self.send(encoded, CODEC_JPEG, width, height, channels, timestamp)
+
+
+class FrameReceiver(object):
+    """
+    Reads frames from a connected stream socket into one preallocated
+    buffer with recv_into; nothing is concatenated or copied on the way.
+
+    receive() returns (header, payload) where payload is a uint8 array
+    viewing the buffer: it is only valid until the next receive(). The
+    buffer grows (doubling) for larger frames up to max_size.
+    """
+
+    def __init__(self, sock, size=1 << 20, max_size=64 << 20):
+        self.sock = sock
+        self.max_size = max_size
+        self._buffer = bytearray(max(size, HEADER.size))
+        self.frames = 0
+        self.bytes = 0
+
+    def receive(self):
+        """
+        The next (header, payload); None when the peer closed the
+        connection between frames.
+        """
+        if not self._read(HEADER.size, eof_ok=True):
+            return None
+        header = unpack_header(self._buffer)
+        if header.size > len(self._buffer):
+            if header.size > self.max_size:
+                raise ValueError("Frame of %d bytes exceeds max_size" % header.size)
+            size = len(self._buffer)
+            while size < header.size:
+                size *= 2
+            self._buffer = bytearray(min(size, self.max_size))
+        self._read(header.size)
+        self.frames += 1
+        self.bytes += HEADER.size + header.size
+        return header, np.frombuffer(self._buffer, dtype=np.uint8, count=header.size)
+
+    def _read(self, n, eof_ok=False):
+        view = memoryview(self._buffer)
+        got = 0
+        while got < n:
+            count = self.sock.recv_into(view[got:n], n - got)
+            if count == 0:
+                if eof_ok and got == 0:
+                    return False
+                raise EOFError("Connection closed mid-frame")
+            got += count
+        return True
+
+
+def decode(header, payload, flags=None, out=None):
+    """
+    Image from a received payload, decoded straight from the receive
+    buffer. Raw frames come back as a view of payload. out is used for
+    the result when this OpenCV can decode into a given array (see
+    DECODE_INTO) and is ignored otherwise.
+    """
+    if header.codec == CODEC_RAW:
+        channels = header.channels or 1
+        shape = (header.height, header.width, channels) if channels > 1 else (header.height, header.width)
+        return payload[:header.height * header.width * channels].reshape(shape)
+    flags = cv2.IMREAD_COLOR if flags is None else flags
+    if out is not None and DECODE_INTO:
+        return cv2.imdecode(payload, flags, out)
+    return cv2.imdecode(payload, flags)
+
+
+def decode_flags(header, size=None, gray=False):
+    """
+    (imdecode flags, scale factor) for the cheapest decode that still
+    gives at least size = (width, height): JPEGs can be decoded at 1/2,
+    1/4 or 1/8 scale (IMREAD_REDUCED_*), which skips most of the work.
+    """
+    factor = 1
+    if size is not None and header.codec == CODEC_JPEG and header.width and header.height:
+        for candidate in (8, 4, 2):
+            if header.width // candidate >= size[0] and header.height // candidate >= size[1]:
+                factor = candidate
+                break
+    return _READ_FLAGS[(factor, gray)], factor
+
+
+def decoded_shape(header, factor=1, gray=False):
+    """
+    Shape imdecode gives a frame at 1/factor scale, None if the header
+    has no dimensions.
+    """
+    if not (header.width and header.height):
+        return None
+    height, width = -(-header.height // factor), -(-header.width // factor)
+    return (height, width) if gray else (height, width, 3)
+
+
+def _check_decode_into():
+    # The C++ imdecode takes an output Mat, not every Python binding does
+    if cv2 is None:
+        return False
+    encoded = cv2.imencode(".png", np.zeros((2, 2), dtype=np.uint8))[1]
+    out = np.ones((2, 2), dtype=np.uint8)
+    try:
+        result = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE, out)
+    except (TypeError, cv2.error):
+        return False
+    return result is not None and np.shares_memory(result, out)
+
+
+DECODE_INTO = _check_decode_into()
+
+_READ_FLAGS = {}
+if cv2 is not None:
+    _READ_FLAGS = {
+        (1, False): cv2.IMREAD_COLOR, (1, True): cv2.IMREAD_GRAYSCALE,
+        (2, False): cv2.IMREAD_REDUCED_COLOR_2, (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        (4, False): cv2.IMREAD_REDUCED_COLOR_4, (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        (8, False): cv2.IMREAD_REDUCED_COLOR_8, (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
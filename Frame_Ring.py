@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import os
+import time
+import numpy as np
+
+# Environment variable naming the ring file; unset means frames go over TCP
+RING_ENV = "NAO_FRAME_RING"
+
+MAGIC = 0x474E4952464F414E   # "NAOFRING" little-endian
+VERSION = 1
+
+_CONTROL = 64   # magic, version, slots, slot_size, frames written
+_META = 64      # per slot: seq, width, height, channels, size, timestamp
+
+
+def ring_path():
+    """
+    Path of the shared frame ring if same-host transport is configured.
+    """
+    return os.environ.get(RING_ENV) or None
+
+
+class FrameRing(object):
+    """
+    Fixed-slot ring of raw frames in a memory-mapped file, for a camera
+    producer and consumers on the same host: no JPEG, no socket.
+
+    Each slot carries a sequence counter used as a seqlock: the writer
+    makes it odd while it copies a frame in and sets it to 2 * n for
+    frame n when done, after which the frame counter points readers at
+    the slot. latest() returns a NumPy view straight into the mapping;
+    it stays intact until the writer comes round to the slot again,
+    slots - 1 frames later, which intact(seq) confirms. read() copies
+    and retries, for a frame that is guaranteed consistent.
+
+    Use create() in the producer and attach() in consumers.
+    """
+
+    def __init__(self, path, mode="r+"):
+        self._identity = _identity(path)
+        control = np.memmap(path, dtype=np.uint64, mode=mode, shape=(_CONTROL // 8,))
+        if int(control[0]) != MAGIC or int(control[1]) != VERSION:
+            raise ValueError("%s is not a version %d frame ring" % (path, VERSION))
+        self.path = path
+        self.slots = int(control[2])
+        self.slot_size = int(control[3])
+        data_offset = _data_offset(self.slots)
+        self._mm = np.memmap(path, dtype=np.uint8, mode=mode,
+                             shape=(data_offset + self.slots * self.slot_size,))
+        self._control = self._mm[:_CONTROL].view(np.uint64)
+        self._meta = self._mm[_CONTROL:_CONTROL + self.slots * _META].view(np.uint64).reshape(self.slots, -1)
+        self._stamps = self._meta.view(np.float64)
+        self._data = self._mm[data_offset:].reshape(self.slots, self.slot_size)
+
+    @classmethod
+    def create(cls, path, slot_size, slots=8):
+        """
+        Creates a ring whose slots hold up to slot_size bytes. A ring of the
+        same geometry already at path is reused in place, counting frames
+        from 0 again, so attached consumers carry on. Any other file is
+        never truncated under a consumer's mapping: the new ring is built
+        next to it and renamed over it (see replaced()).
+        """
+        try:
+            ring = cls(path)
+        except (IOError, OSError, ValueError):
+            ring = None
+        if ring is not None:
+            if ring.slots == slots and ring.slot_size == slot_size:
+                ring._meta[:, 0] = 0
+                ring._control[4] = 0
+                return ring
+            ring.close()
+
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        data_offset = _data_offset(slots)
+        mm = np.memmap(tmp, dtype=np.uint8, mode="w+", shape=(data_offset + slots * slot_size,))
+        control = mm[:_CONTROL].view(np.uint64)
+        control[1:4] = (VERSION, slots, slot_size)
+        # The magic goes in last: attach() refuses a half-initialised file
+        mm.flush()
+        control[0] = MAGIC
+        mm.flush()
+        del control, mm
+        _replace(tmp, path)
+        return cls(path)
+
+    @classmethod
+    def attach(cls, path, timeout=None, poll=0.1):
+        """
+        Opens an existing ring, waiting up to timeout seconds (forever
+        with None) for the producer to create it.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            try:
+                return cls(path)
+            except (IOError, OSError, ValueError):
+                if deadline is not None and time.time() >= deadline:
+                    raise
+            time.sleep(poll)
+
+    @property
+    def frames(self):
+        """
+        Number of frames written so far, the seq of the newest one.
+        """
+        return int(self._control[4])
+
+    # ---------------- Producer ----------------
+
+    def write(self, frame, timestamp=None):
+        """
+        Copies a uint8 image into the next slot. Returns its seq.
+        """
+        frame = np.asarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.slot_size:
+            raise ValueError("Frame of %d bytes does not fit a %d byte slot" % (frame.nbytes, self.slot_size))
+        seq = self.frames + 1
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta[0] = 2 * seq - 1   # odd: being written
+        self._data[slot, :frame.nbytes] = frame.reshape(-1)
+        height, width = frame.shape[:2]
+        meta[1:5] = (width, height, frame.shape[2] if frame.ndim == 3 else 1, frame.nbytes)
+        self._stamps[slot, 5] = time.time() if timestamp is None else timestamp
+        meta[0] = 2 * seq
+        self._control[4] = seq
+        return seq
+
+    # ---------------- Consumers ----------------
+
+    def latest(self):
+        """
+        (seq, timestamp, frame) of the newest complete frame, frame being a
+        view into the ring; None before the first frame.
+        """
+        while True:
+            seq = self.frames
+            if seq == 0:
+                return None
+            slot = seq % self.slots
+            meta = self._meta[slot]
+            if int(meta[0]) != 2 * seq:
+                continue   # lapped by the writer between the two reads
+            width, height, channels, size = [int(v) for v in meta[1:5]]
+            timestamp = float(self._stamps[slot, 5])
+            shape = (height, width, channels) if channels > 1 else (height, width)
+            frame = self._data[slot, :size].reshape(shape)
+            if int(meta[0]) == 2 * seq:
+                return seq, timestamp, frame
+
+    def intact(self, seq):
+        """
+        Whether the frame with this seq has not been overwritten yet.
+        """
+        return int(self._meta[seq % self.slots][0]) == 2 * seq
+
+    def read(self, out=None):
+        """
+        Like latest() but copies the frame (into out if it fits), retrying
+        until the copy is known to be consistent.
+        """
+        while True:
+            got = self.latest()
+            if got is None:
+                return None
+            seq, timestamp, frame = got
+            if out is None or out.shape != frame.shape:
+                out = np.empty_like(frame)
+            out[...] = frame
+            if self.intact(seq):
+                return seq, timestamp, out
+
+    def wait(self, after, timeout=None, poll=0.001):
+        """
+        latest() once there is a newest frame other than seq after; None
+        on timeout. A restarted producer counts from 1 again, which also
+        ends the wait. Polls every poll seconds, there is nothing to block
+        on across processes.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.frames in (after, 0):
+            if deadline is not None and time.time() >= deadline:
+                return None
+            time.sleep(poll)
+        return self.latest()
+
+    def receive(self, after, timeout=None, alloc=None):
+        """
+        Copy of the newest frame once it is not seq after, as read() makes
+        it; alloc(shape) gives the array to copy into (e.g. a
+        Camera_Service.BufferPool's get). None on timeout. Unlike a view
+        from wait(), the copy can be handed to consumers that keep it
+        longer than the producer leaves the slot alone.
+        """
+        got = self.wait(after, timeout)
+        if got is None:
+            return None
+        return self.read(out=alloc(got[2].shape) if alloc is not None else None)
+
+    def replaced(self):
+        """
+        Whether a producer has put a new ring file in place of this one
+        (or removed it); attach() again to follow it.
+        """
+        try:
+            return _identity(self.path) != self._identity
+        except OSError:
+            return True
+
+    def close(self):
+        self._mm.flush()
+        del self._control, self._meta, self._stamps, self._data, self._mm
+
+
+def _identity(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+
+# Atomic rename over an existing file; Python 2 only has it as os.rename
+_replace = getattr(os, "replace", os.rename)
+
+
+def _data_offset(slots):
+    # Frames start on a page boundary after the control block and slot table
+    end = _CONTROL + slots * _META
+    return (end + 4095) // 4096 * 4096
@@ -2,29 +2,13 @@
 from __future__ import print_function
 import Tkinter as tk
 import numpy as np
+from Floor_Map import get_floor_map
 
-# Department names and coordinates
-departments = {
-    1: ("internal", (0, 6)),
-    2: ("gastro", (2, 1)),
-    3: ("restroom", (2, 4)),
-    4: ("surgery", (4, 4)),
-    5: ("ent", (6, 4)),
-    6: ("emergency", (7, 6)),
-    7: ("lab", (5, 6))
-}
-
-# Default map (0 = wall, 1 = path)
-default_maze = np.array([
-    [0, 0, 1, 1, 1, 1, 1, 1],
-    [0, 0, 1, 0, 0, 0, 0, 0],
-    [1, 1, 1, 1, 1, 1, 1, 0],
-    [0, 0, 1, 0, 0, 0, 1, 0],
-    [0, 0, 1, 1, 1, 1, 1, 0],
-    [0, 0, 1, 0, 0, 0, 1, 0],
-    [0, 0, 1, 1, 1, 1, 1, 0],
-    [0, 0, 0, 0, 0, 0, 1, 0]
-])
+# Department names and coordinates, and the map (0 = wall, 1 = path),
+# from the configured floor plan
+floor_map = get_floor_map()
+departments = floor_map.departments
+default_maze = floor_map.grid
 
 def get_updated_maze():
     root = tk.Tk()
@@ -34,19 +18,23 @@ def get_updated_maze():
     result = {'maze': None, 'start': None, 'end': None}
 
     # Department info
-    info = tk.Label(root, text="Department Numbers:\n1. internal\n2. gastro\n3. restroom\n4. surgery\n5. ent\n6. emergency\n7. lab", justify='left')
-    info.grid(row=0, column=2, rowspan=8, padx=20, pady=5, sticky='w')
+    numbers = sorted(departments)
+    info = tk.Label(root, text="Department Numbers:\n" + "\n".join(
+        "%d. %s" % (num, departments[num][0]) for num in numbers), justify='left')
+    info.grid(row=0, column=2, rowspan=len(numbers) + 1, padx=20, pady=5, sticky='w')
+    last = len(numbers)
 
     # Start and end input
-    tk.Label(root, text="Start Department (1-7):").grid(row=7, column=0, padx=10, pady=5, sticky='e')
+    span = "(%d-%d)" % (numbers[0], numbers[-1])
+    tk.Label(root, text="Start Department %s:" % span).grid(row=last, column=0, padx=10, pady=5, sticky='e')
     start_entry = tk.Entry(root)
     start_entry.insert(0, "6")
-    start_entry.grid(row=7, column=1, padx=10, pady=5)
+    start_entry.grid(row=last, column=1, padx=10, pady=5)
 
-    tk.Label(root, text="End Department (1-7):").grid(row=8, column=0, padx=10, pady=5, sticky='e')
+    tk.Label(root, text="End Department %s:" % span).grid(row=last + 1, column=0, padx=10, pady=5, sticky='e')
     end_entry = tk.Entry(root)
     end_entry.insert(0, "1")
-    end_entry.grid(row=8, column=1, padx=10, pady=5)
+    end_entry.grid(row=last + 1, column=1, padx=10, pady=5)
 
     def apply_weights_and_close():
         updated_maze = np.copy(default_maze)
@@ -72,7 +60,8 @@ def get_updated_maze():
 
     # Weight entry for each department
     row = 0
-    for num, (dept, coord) in departments.items():
+    for num in numbers:
+        dept, coord = departments[num]
         label = tk.Label(root, text=dept)
         label.grid(row=row, column=0, padx=10, pady=5, sticky='e')
 
@@ -84,7 +73,7 @@ def get_updated_maze():
 
     # Apply button
     submit_btn = tk.Button(root, text="Apply Settings", command=apply_weights_and_close)
-    submit_btn.grid(row=9, columnspan=2, pady=10)
+    submit_btn.grid(row=last + 2, columnspan=2, pady=10)
 
     root.mainloop()
 
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import heapq
+import math
+import numpy as np
+
+INF = float('inf')
+
+# Moves in the order all planners use, and headings index: up, down, left, right
+directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+# Index of the reverse of each move
+OPPOSITE = [1, 0, 3, 2]
+
+
+def wrap_angle(angle):
+    """
+    angle (radians) folded into [-pi, pi).
+    """
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class GridPlanner(object):
+    """
+    Shortest-path engine for grid maps of any size.
+
+    The maze uses the same convention as GUI.default_maze: 0 is a wall and
+    any other value is the cost of entering that cell. Costs are kept in a
+    NumPy array; the search itself runs over a flat, wall-padded copy so the
+    inner loop needs no bounds checks. Distance and parent data live in
+    flat arrays that are reused between queries and only the entries touched
+    by the previous search are reset.
+
+    A planner instance is not thread-safe; give each thread its own.
+    """
+
+    def __init__(self, maze):
+        costs = np.array(maze, dtype=np.float64)
+        if costs.ndim != 2:
+            raise ValueError("maze must be a 2-D array")
+        self.costs = costs
+        self.rows, self.cols = costs.shape
+        self.width = self.cols + 2
+
+        padded = np.zeros((self.rows + 2, self.width), dtype=np.float64)
+        padded[1:-1, 1:-1] = costs
+        self._flat = padded.ravel().tolist()
+        # Same neighbour order as directions
+        self._offsets = (-self.width, self.width, -1, 1)
+
+        size = len(self._flat)
+        self._dist = [INF] * size
+        self._prev = [-1] * size
+        self._closed = bytearray(size)
+        self._touched = []
+
+        self.h_scale = self._heuristic_scale()
+        self.expanded = 0
+        # Jump point search tables, built on first use
+        self._uniform = None
+        self._special = None
+
+    # ---------------- Cell helpers ----------------
+
+    def index(self, cell):
+        x, y = cell
+        if not (0 <= x < self.rows and 0 <= y < self.cols):
+            raise ValueError("Cell %s is outside the %dx%d map" % (cell, self.rows, self.cols))
+        return (x + 1) * self.width + (y + 1)
+
+    def cell(self, index):
+        x, y = divmod(index, self.width)
+        return (x - 1, y - 1)
+
+    def set_cost(self, cell, weight):
+        """
+        Changes the cost of a single cell (0 makes it a wall).
+        """
+        self.costs[cell] = weight
+        i = self.index(cell)
+        self._flat[i] = float(weight)
+        if 0 < weight < self.h_scale:
+            self.h_scale = float(weight)
+        elif weight < 0:
+            self.h_scale = 0.0
+        if self._special is not None:
+            for j in (i,) + tuple(i + off for off in self._offsets):
+                self._mark_special(j)
+
+    def _heuristic_scale(self):
+        if (self.costs < 0).any():
+            return 0.0
+        open_costs = self.costs[self.costs > 0]
+        if open_costs.size == 0:
+            return 0.0
+        return float(open_costs.min())
+
+    # ---------------- Queries ----------------
+
+    def dijkstra(self, start, end):
+        """
+        Returns (distance, path) from start to end, or (-1, []) if the end
+        cannot be reached.
+        """
+        return self._result(start, end, 0.0)
+
+    def astar(self, start, end):
+        """
+        Same as dijkstra() but guided by a Manhattan heuristic scaled by the
+        cheapest cell cost, which never overestimates the remaining cost.
+        """
+        return self._result(start, end, self.h_scale)
+
+    def jps(self, start, end):
+        """
+        Jump point search: A* that crosses runs of uniform-cost cells in one
+        jump and only expands the cells where a route can change direction.
+        Cells whose cost differs from the common corridor cost, and their
+        neighbours, are expanded like plain A*, so weighted departments are
+        still priced exactly. Returns the same (distance, path) as astar().
+        """
+        if self._special is None:
+            self._build_jump_tables()
+        return self._jump_search(start, end)
+
+    def find_path(self, start, end):
+        """
+        Cheapest route using the fastest exact search for this map: jump
+        point search when most open cells share one cost, A* otherwise.
+        """
+        if self._special is None:
+            self._build_jump_tables()
+        if self._uniform_share >= 0.5:
+            return self._jump_search(start, end)
+        return self.astar(start, end)
+
+    def search_targets(self, start, targets):
+        """
+        One Dijkstra run from start that stops once every target is settled.
+        Returns {target: (distance, path)}, with (-1, []) for unreachable ones.
+        """
+        if not targets:
+            return {}
+        self._search(start, [self.index(t) for t in targets], 0.0)
+        results = {}
+        for target in targets:
+            distance = self._dist[self.index(target)]
+            if distance == INF:
+                results[target] = (-1, [])
+            else:
+                results[target] = (distance, self.path_to(target))
+        return results
+
+    def settled_distances(self):
+        """
+        Distances settled by the last search as a (rows, cols) array.
+        Cells the search did not settle are inf.
+        """
+        field = np.array(self._dist)
+        field[np.frombuffer(self._closed, dtype=np.uint8) == 0] = INF
+        return field.reshape(self.rows + 2, self.width)[1:-1, 1:-1]
+
+    def path_to(self, end):
+        """
+        Rebuilds the path to end from the parent array of the last search.
+        """
+        node = self.index(end)
+        if self._dist[node] == INF:
+            return []
+        prev = self._prev
+        nodes = []
+        while node != -1:
+            nodes.append(node)
+            node = prev[node]
+        nodes.reverse()
+        return [self.cell(i) for i in nodes]
+
+    # ---------------- Jump point search ----------------
+
+    def _build_jump_tables(self):
+        open_costs = self.costs[self.costs != 0]
+        if open_costs.size:
+            values, counts = np.unique(open_costs, return_counts=True)
+            self._uniform = float(values[counts.argmax()])
+            self._uniform_share = counts.max() / open_costs.size
+        else:
+            self._uniform = 1.0
+            self._uniform_share = 0.0
+        padded = np.array(self._flat).reshape(self.rows + 2, self.width)
+        weighted = (padded != 0) & (padded != self._uniform)
+        near = weighted.copy()
+        near[1:, :] |= weighted[:-1, :]
+        near[:-1, :] |= weighted[1:, :]
+        near[:, 1:] |= weighted[:, :-1]
+        near[:, :-1] |= weighted[:, 1:]
+        special = near & (padded != 0)
+        self._special = bytearray(special.astype(np.uint8).ravel().tobytes())
+
+    def _mark_special(self, i):
+        flat, u = self._flat, self._uniform
+        if not 0 <= i < len(flat):
+            return
+        special = 0
+        if flat[i]:
+            for j in (i,) + tuple(i + off for off in self._offsets):
+                if 0 <= j < len(flat) and flat[j] and flat[j] != u:
+                    special = 1
+                    break
+        self._special[i] = special
+
+    def _jump(self, i, off, goal):
+        """
+        Walks from i in direction off until a jump point. Returns
+        (node, cost) or (-1, 0) if the walk runs into a wall.
+        """
+        flat, special, u = self._flat, self._special, self._uniform
+        width = self.width
+        vertical = off == width or off == -width
+        side = 1 if vertical else width
+        j = i
+        steps = 0
+        while True:
+            j += off
+            steps += 1
+            c = flat[j]
+            if not c:
+                return -1, 0
+            if c != u:
+                return j, (steps - 1) * u + c
+            if j == goal or special[j]:
+                return j, steps * u
+            # Forced neighbour: a side opens up where it was blocked behind
+            if ((flat[j - side] == u and flat[j - off - side] != u) or
+                    (flat[j + side] == u and flat[j - off + side] != u)):
+                return j, steps * u
+            if vertical and (self._jump(j, 1, goal)[0] != -1 or self._jump(j, -1, goal)[0] != -1):
+                return j, steps * u
+
+    def _jump_search(self, start, end):
+        self._reset()
+        s = self.index(start)
+        e = self.index(end)
+        width = self.width
+        ex, ey = divmod(e, width)
+        scale = self.h_scale
+
+        flat, offsets, special = self._flat, self._offsets, self._special
+        dist, prev, closed = self._dist, self._prev, self._closed
+        touched = self._touched
+        arrived = {s: 0}   # node -> offset it was entered with (0 = any)
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        dist[s] = 0.0
+        touched.append(s)
+        heap = [(0.0, s)]
+        expanded = 0
+
+        while heap:
+            _, i = heappop(heap)
+            if closed[i]:
+                continue
+            closed[i] = 1
+            expanded += 1
+            if i == e:
+                break
+
+            g = dist[i]
+            came = arrived[i]
+            if not came or special[i] or flat[i] != self._uniform:
+                moves = offsets
+            else:
+                # Never turn back; the rest is decided by the jumps
+                moves = [off for off in offsets if off != -came]
+            for off in moves:
+                if not flat[i + off]:
+                    continue
+                j, cost = self._jump(i, off, e)
+                if j == -1 or closed[j]:
+                    continue
+                nd = g + cost
+                if nd < dist[j]:
+                    if dist[j] == INF:
+                        touched.append(j)
+                    dist[j] = nd
+                    prev[j] = i
+                    arrived[j] = off
+                    jx, jy = divmod(j, width)
+                    heappush(heap, (nd + scale * (abs(jx - ex) + abs(jy - ey)), j))
+
+        self.expanded = expanded
+        if dist[e] == INF:
+            return -1, []
+        # Fill in the straight runs between jump points
+        nodes = [e]
+        node = e
+        while prev[node] != -1:
+            parent = prev[node]
+            off = arrived[node]
+            while node != parent:
+                node -= off
+                nodes.append(node)
+        nodes.reverse()
+        return dist[e], [self.cell(i) for i in nodes]
+
+    # ---------------- Search core ----------------
+
+    def _reset(self):
+        dist, prev, closed = self._dist, self._prev, self._closed
+        for i in self._touched:
+            dist[i] = INF
+            prev[i] = -1
+            closed[i] = 0
+        self._touched = []
+
+    def _result(self, start, end, scale):
+        e = self.index(end)
+        self._search(start, [e], scale)
+        if self._dist[e] == INF:
+            return -1, []
+        return self._dist[e], self.path_to(end)
+
+    def _search(self, start, targets, scale):
+        """
+        Settles nodes from start until every flat index in targets is
+        settled. The heuristic (scale > 0) is only used with one target.
+        """
+        self._reset()
+        if not targets:
+            self.expanded = 0
+            return
+        s = self.index(start)
+        width = self.width
+        ex, ey = divmod(targets[0], width)
+        goals = set(targets)
+        remaining = len(goals)
+
+        flat, offsets = self._flat, self._offsets
+        dist, prev, closed = self._dist, self._prev, self._closed
+        touched = self._touched
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        dist[s] = 0.0
+        touched.append(s)
+        heap = [(0.0, s)]
+        expanded = 0
+
+        while heap:
+            _, i = heappop(heap)
+            if closed[i]:
+                continue
+            closed[i] = 1
+            expanded += 1
+            if i in goals:
+                remaining -= 1
+                if not remaining:
+                    break
+
+            g = dist[i]
+            for off in offsets:
+                j = i + off
+                c = flat[j]
+                if c and not closed[j]:
+                    nd = g + c
+                    if nd < dist[j]:
+                        if dist[j] == INF:
+                            touched.append(j)
+                        dist[j] = nd
+                        prev[j] = i
+                        if scale:
+                            jx, jy = divmod(j, width)
+                            heappush(heap, (nd + scale * (abs(jx - ex) + abs(jy - ey)), j))
+                        else:
+                            heappush(heap, (nd, j))
+
+        self.expanded = expanded
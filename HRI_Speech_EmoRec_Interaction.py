@@ -16,12 +16,21 @@ import speech_recognition as sr
 import cv2
 import numpy as np
 import pyaudio
-import pickle
-import struct
 from Navigation import run_navigation
-from Path_Calculation import dijkstra
+from Path_Calculation import find_path
+from Route_Table import RouteTable
+from Distance_Field import DistanceFields
+from Route_Cache import RouteCache
+from Camera_Service import CameraService
+from Costmap import Costmap
+from Floor_Map import get_floor_map
+from Frame_Protocol import FrameReceiver
+from Frame_Ring import FrameRing, ring_path
 from GUI import get_updated_maze
-from Motion import move_robot_along_path
+import Motion
+from Motion_Executor import MotionExecutor
+from Sonar_Filter import SonarFilter
+from Sonar_Monitor import SonarMonitor
 
 # Configuration
 PC_IP = "192.168.1.156"  # IP address of your PC
@@ -29,21 +38,11 @@ PC_PORT = 51599         # Port for communication between PC and NAO
 
 start = (7, 6)
 
-departments = {
-    1: ("internal", (0, 6)),
-    2: ("gastro", (2, 1)),
-    3: ("restroom", (2, 4)),
-    4: ("surgery", (4, 4)),
-    5: ("ent", (6, 4)),
-    6: ("emergency", (7, 6)),
-    7: ("lab", (5, 6))
-}
+floor_map = get_floor_map()
+departments = floor_map.departments
 
 def get_department_coord(dept_number):
-    if dept_number in departments:
-        return departments[dept_number][1]
-    else:
-        raise ValueError("Invalid department number. Please enter a number from 1 to 7.")
+    return floor_map.coord(dept_number)
 
 # ---------------------------------------------------------------------------
 # --- PC Sound Localization  ---
@@ -129,9 +128,12 @@ class HybridSession:
         self.real_session = real_session
         # Create a PC-side ALMemory
         self.pc_memory = PCMemory()
+        # Frames from camera_client, shared by every PC consumer and decoded
+        # only as far as the consumers that take them need
+        self.camera = CameraService()
         # Create PC services and pass in the memory object
         self.pc_asr = PCSpeechRecognition(self.pc_memory)
-        self.pc_face = PCFaceDetection(self.pc_memory)
+        self.pc_face = PCFaceDetection(self.pc_memory, camera=self.camera)
         self.pc_sound = PCSoundLocalization(self.pc_memory, PC_IP, PC_PORT)  # Pass PC IP and Port
         self.nao_sound_proxy = NAOSoundProxy(PC_IP, PC_PORT)  # Create the proxy
 
@@ -222,9 +224,18 @@ class NAOSoundProxy:
 # ---------------------------------------------------------------------------
 # --- PCCameraReceiver ---
 class PCCameraReceiver(object):
-    def __init__(self, memory, port=8000):
+    def __init__(self, memory, port=8000, ring=None, display=True, camera=None):
         self.memory = memory
         self.port = port
+        # Same-host camera: read raw frames from the shared ring ($NAO_FRAME_RING)
+        # instead of listening for the TCP stream
+        self.ring = ring if ring is not None else ring_path()
+        self.display = display
+        # The receive thread only reads and puts the still encoded frames on
+        # frames (the shared camera service); display and analysis each take
+        # the newest one on their own thread and decode only what they take
+        self.frames = camera if camera is not None else CameraService()
+        self._consumers = []
         self.running = False
         self.thread = None
         self.socket = None
@@ -232,6 +243,9 @@ class PCCameraReceiver(object):
     def start(self):
         if not self.running:
             self.running = True
+            self._consumers = [self.frames.subscribe("analysis", self._analyse)]
+            if self.display:
+                self._consumers.append(self.frames.subscribe("display", self._show))
             self.thread = threading.Thread(target=self._receive_loop)
             self.thread.setDaemon(True)
             self.thread.start()
@@ -240,53 +254,86 @@ class PCCameraReceiver(object):
         self.running = False
         if self.socket:
             self.socket.close()
+        # The camera service may be shared: only drop our own consumers
+        for consumer in self._consumers:
+            self.frames.unsubscribe(consumer)
+        self._consumers = []
+
+    def stats(self):
+        """
+        Per consumer delivered/dropped counts and frame age, see Frame_Bus.
+        """
+        return self.frames.stats()
 
     def _receive_loop(self):
+        if self.ring:
+            return self._ring_loop()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.bind(('', self.port))
         self.socket.listen(1)
         print("PCCameraReceiver: Listening on port {}".format(self.port))
         conn, addr = self.socket.accept()
         print("PCCameraReceiver: Connected by", addr)
-        data = ""
-        payload_size = struct.calcsize("L")
+        receiver = FrameReceiver(conn)
+        header = None
         while self.running:
             try:
-                while len(data) < payload_size:
-                    packet = conn.recv(4096)
-                    if not packet:
-                        break
-                    data += packet
-                if not data:
-                    break
-                packed_msg_size = data[:payload_size]
-                data = data[payload_size:]
-                msg_size = struct.unpack("L", packed_msg_size)[0]
-                while len(data) < msg_size:
-                    data += conn.recv(4096)
-                frame_data = data[:msg_size]
-                data = data[msg_size:]
-                buffer = pickle.loads(frame_data)
-                frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
-                if frame is None:
-                    continue
-                # 通过 ALMemory 发送图像数据
-                self.memory.emit("CameraFrameReceived", frame)
-                # 显示画面
-                print("<<<<，，，，，《《《>>>>")
-                cv2.imshow("PCCameraReceiver - Received Frame", frame)
-                # 调用 cv2.waitKey 定期刷新窗口
-                cv2.waitKey(1)
-                # 如检测到 'q' 键，则退出
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                received = receiver.receive()
+                if received is None:
                     break
+                header, payload = received
+                # The receive buffer is reused for the next frame
+                self.frames.publish_encoded(header, payload.copy())
             except Exception as e:
                 print("PCCameraReceiver error:", e)
                 break
         conn.close()
         self.socket.close()
         cv2.destroyAllWindows()
-        print("Frame received with shape:", frame.shape)
+        if header is not None:
+            print("Frame received with shape:", (header.height, header.width, header.channels))
+
+    def _ring_loop(self):
+        print("PCCameraReceiver: Waiting for frame ring {}".format(self.ring))
+        ring = FrameRing.attach(self.ring)
+        print("PCCameraReceiver: Attached to frame ring {}".format(self.ring))
+        seq = ring.frames
+        frame = None
+        while self.running:
+            try:
+                # A copy in a pooled buffer: consumers may hold a frame
+                # longer than the producer leaves its slot alone
+                got = ring.receive(seq, timeout=0.5, alloc=self.frames.pool.get)
+                if got is None:
+                    if ring.replaced():
+                        # The producer restarted with a new ring file
+                        ring.close()
+                        ring = FrameRing.attach(self.ring)
+                        seq = 0
+                    continue
+                seq, timestamp, frame = got
+                self.frames.publish(frame, timestamp, seq)
+            except Exception as e:
+                print("PCCameraReceiver error:", e)
+                break
+        ring.close()
+        cv2.destroyAllWindows()
+        if frame is not None:
+            print("Frame received with shape:", frame.shape)
+
+    def _analyse(self, frame):
+        # 通过 ALMemory 发送图像数据
+        self.memory.emit("CameraFrameReceived", frame)
+
+    def _show(self, frame):
+        # 显示画面
+        print("<<<<，，，，，《《《>>>>")
+        cv2.imshow("PCCameraReceiver - Received Frame", frame)
+        # 调用 cv2.waitKey 定期刷新窗口
+        cv2.waitKey(1)
+        # 如检测到 'q' 键，则退出
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.stop()
 
 # ---------------------------------------------------------------------------
 # --- Implementation of event mechanism ---
@@ -375,8 +422,11 @@ class PCSpeechRecognition:
 # --- PC Face Detection  ---
 # Use OpenCV to capture video frames from the PC camera and detect faces
 class PCFaceDetection:
-    def __init__(self, memory, expr_port=8001):
+    def __init__(self, memory, expr_port=8001, camera=None):
         self.memory = memory
+        # Frames come from the shared camera service instead of a capture of
+        # our own; without one, this service owns the PC camera
+        self.camera = camera if camera is not None else CameraService(0)
         self.running = False
         self.thread = None
         # 新增表情监听相关
@@ -416,22 +466,24 @@ class PCFaceDetection:
                 pass
 
     def _detection_loop(self):
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        try:
+            self.camera.start()
+        except IOError:
             print("Cannot open PC camera")
-            return 
+            return
+        # Gray frames at up to 10 per second; the conversion is shared
+        consumer = self.camera.subscribe("face detection", rate=10, gray=True)
         while self.running:
-            ret, frame = cap.read()
-            if not ret:
+            got = consumer.get(timeout=0.5)
+            if got is None:
                 continue
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            seq, timestamp, gray = got
             faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
             if len(faces) > 0:
                 # 原有回调：检测到人脸就发出事件
                 self.memory.emit("FaceDetected", [None, [faces[0].tolist()]])
                 time.sleep(1)
-            time.sleep(0.1)
-        cap.release()
+        self.camera.unsubscribe(consumer)
 
     def _expr_loop(self):
         """
@@ -758,6 +810,17 @@ class RobotAssistant(object):
                 pass
 
 
+def plan_route(maze, start, end):
+    if route_table is not None and (start, end) in route_table:
+        route_table.sync(maze)
+        return route_table.route(start, end)
+    if distance_fields is not None and end in distance_fields:
+        # Off-department start (drift, obstacle stop): follow the field
+        distance_fields.sync(maze)
+        return distance_fields.path_to(start, end)
+    return find_path(maze, start, end)
+
+
 def Navi(destination, maze):
     global start
     print("Navigating to {}...".format(destination))
@@ -776,22 +839,32 @@ def Navi(destination, maze):
 
     print(type(start), type(end))
 
-    import threading
-    import time
+    if costmap is not None:
+        # Plan on the GUI weights plus what the sonar has seen lately
+        costmap.set_static(maze)
+        costmap.decay()
+        maze = costmap.costs
+
+    if motion_executor.busy and motion_executor.cell is not None:
+        # Redirected mid-route: plan from the last cell reached, the
+        # executor reroutes from wherever the robot actually stops
+        start = motion_executor.cell
 
-    distance, path = dijkstra(maze, start, end)
+    if route_cache is not None:
+        # The costmap has already pushed every changed cell into the cache
+        distance, path = route_cache.route(start, end)
+    else:
+        distance, path = plan_route(maze, start, end)
     #path, distance = ([(7, 6), (6, 6)], 15)
 
-    t1 = threading.Thread(target = run_navigation(maze, start, end))
+    t1 = threading.Thread(target=run_navigation, args=(maze, start, end), kwargs={"cache": route_cache})
+    t1.daemon = True
     t1.start()
 
-    print("Navigation complete. Distance:", distance, path)
-
-    t2 = threading.Thread(target = move_robot_along_path(path))
-    t2.start()
+    print("Navigation started. Distance:", distance, path)
 
-    t1.join()
-    t2.join()
+    # Walks in the background so the speech callback returns immediately
+    motion_executor.preempt(path)
 
     start = end
 
@@ -801,6 +874,19 @@ def Navi(destination, maze):
 # ---------------------------------------------------------------------------
 # --- Main function ---
 maze = get_updated_maze()
+route_table = RouteTable(maze, departments) if maze is not None else None
+distance_fields = DistanceFields(maze, departments) if maze is not None else None
+# Shared by Navi and run_navigation so one utterance plans its route once
+route_cache = RouteCache(maze, solver=plan_route) if maze is not None else None
+costmap = Costmap(maze) if maze is not None else None
+if costmap is not None:
+    costmap.listeners.append(route_cache)
+# Sonar readings taken while walking feed the costmap, so the next route
+# avoids what the robot ran into; started in main(). Decisions are made on
+# the filtered stream, so a lone echo neither stops the robot nor marks a cell
+sonar_monitor = SonarMonitor(Motion.memory, sonar_filter=SonarFilter()) if Motion.memory is not None else None
+motion_executor = MotionExecutor(router=route_cache.route if route_cache is not None else None,
+                                 monitor=sonar_monitor, costmap=costmap)
 def main(robot_ip="192.168.1.35", robot_port=9559):
 
     real_session = None
@@ -810,11 +896,13 @@ def main(robot_ip="192.168.1.35", robot_port=9559):
     except Exception as e:
         print("Cannot connect to Naoqi at {}:{}.\nError: {}".format(robot_ip, robot_port, e))
         sys.exit(1)
+    if sonar_monitor is not None:
+        sonar_monitor.start()
     # Create a hybrid session
     hybrid_session = HybridSession(real_session)
 
     # 启动摄像头接收服务（后台线程）
-    camera_receiver = PCCameraReceiver(hybrid_session.pc_memory, port=8000)
+    camera_receiver = PCCameraReceiver(hybrid_session.pc_memory, port=8000, camera=hybrid_session.camera)
     camera_receiver.start()
 
     assistant = RobotAssistant(hybrid_session)
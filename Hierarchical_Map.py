@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import heapq
+import numpy as np
+from Grid_Planner import GridPlanner, INF
+
+
+class Cluster(object):
+    """
+    One square block of a floor with its own local planner.
+    """
+
+    def __init__(self, floor, r0, c0, maze):
+        self.floor = floor
+        self.r0 = r0
+        self.c0 = c0
+        self.planner = GridPlanner(maze)
+        self.nodes = []   # abstract node ids inside the block
+
+    def local(self, cell):
+        return (cell[1] - self.r0, cell[2] - self.c0)
+
+    def glob(self, cell):
+        return (self.floor, cell[0] + self.r0, cell[1] + self.c0)
+
+
+class HierarchicalMap(object):
+    """
+    HPA*-style hierarchical planner for large and multi-floor hospital maps.
+
+    Each floor is a maze in the GUI.default_maze format, cut into square
+    clusters. Where two clusters touch, every open stretch of their border
+    gets one or two entrance cells; the cheapest routes between entrances
+    of the same cluster are precomputed. Connectors (elevators, stairs,
+    corridors between buildings) join cells on any floor with a fixed cost.
+    A query searches this small abstract graph first and then refines only
+    the clusters the route passes through.
+
+    Cells are (floor, row, col). A map built from a single maze also takes
+    and returns plain (row, col) cells, so departments coordinates work as
+    they are. Routes are near-optimal: they cross cluster borders only at
+    entrance cells.
+    """
+
+    def __init__(self, floors, connectors=(), departments=None, cluster_size=16):
+        self.single_floor = np.asarray(floors[0]).ndim == 1
+        if self.single_floor:
+            floors = [floors]
+        self.floors = [np.asarray(maze) for maze in floors]
+        self.size = cluster_size
+        self.departments = departments or {}
+        self._integral = all(maze.dtype.kind in 'iub' for maze in self.floors)
+
+        self._clusters = {}   # (floor, row block, col block) -> Cluster
+        self._nodes = []      # node id -> (floor, row, col)
+        self._ids = {}
+        self._edges = []      # node id -> [(node id, cost, kind)]
+
+        for f, maze in enumerate(self.floors):
+            rows, cols = maze.shape
+            for r0 in range(0, rows, cluster_size):
+                for c0 in range(0, cols, cluster_size):
+                    block = maze[r0:r0 + cluster_size, c0:c0 + cluster_size]
+                    key = (f, r0 // cluster_size, c0 // cluster_size)
+                    self._clusters[key] = Cluster(f, r0, c0, block)
+            self._add_entrances(f, maze)
+
+        self._links = []
+        for a, b, cost in connectors:
+            a, b = self._normalize(a), self._normalize(b)
+            self._connect(a, b, cost, "link")
+            self._connect(b, a, cost, "link")
+            self._links.append((a, b, cost))
+        self._min_link = min([cost for a, b, cost in self._links] or [0])
+
+        open_costs = [maze[maze > 0].min() for maze in self.floors if (maze > 0).any()]
+        self.h_scale = float(min(open_costs)) if open_costs else 0.0
+
+        for cluster in self._clusters.values():
+            self._add_intra_edges(cluster)
+
+    # ---------------- Build ----------------
+
+    def _normalize(self, cell):
+        if len(cell) == 2:
+            return (0, cell[0], cell[1])
+        return tuple(cell)
+
+    def _cluster_of(self, cell):
+        return self._clusters[(cell[0], cell[1] // self.size, cell[2] // self.size)]
+
+    def _node(self, cell):
+        nid = self._ids.get(cell)
+        if nid is None:
+            nid = len(self._nodes)
+            self._ids[cell] = nid
+            self._nodes.append(cell)
+            self._edges.append([])
+            self._cluster_of(cell).nodes.append(nid)
+        return nid
+
+    def _connect(self, a, b, cost, kind):
+        self._edges[self._node(a)].append((self._node(b), float(cost), kind))
+
+    def _add_entrances(self, f, maze):
+        rows, cols = maze.shape
+        size = self.size
+        is_open = maze != 0
+        # Borders between horizontally adjacent clusters
+        for c in range(size, cols, size):
+            both = is_open[:, c - 1] & is_open[:, c]
+            for r0 in range(0, rows, size):
+                for a, b in _runs(both[r0:r0 + size]):
+                    for r in _entrance_rows(a, b):
+                        self._add_transition(f, (r0 + r, c - 1), (r0 + r, c))
+        # Borders between vertically adjacent clusters
+        for r in range(size, rows, size):
+            both = is_open[r - 1, :] & is_open[r, :]
+            for c0 in range(0, cols, size):
+                for a, b in _runs(both[c0:c0 + size]):
+                    for c in _entrance_rows(a, b):
+                        self._add_transition(f, (r - 1, c0 + c), (r, c0 + c))
+
+    def _add_transition(self, f, a, b):
+        maze = self.floors[f]
+        a, b = (f,) + a, (f,) + b
+        self._connect(a, b, maze[b[1:]], "step")
+        self._connect(b, a, maze[a[1:]], "step")
+
+    def _add_intra_edges(self, cluster):
+        cells = [self._nodes[nid] for nid in cluster.nodes]
+        targets = [cluster.local(cell) for cell in cells]
+        for nid, cell in zip(cluster.nodes, cells):
+            results = cluster.planner.search_targets(cluster.local(cell), targets)
+            for other, target in zip(cluster.nodes, targets):
+                distance = results[target][0]
+                if other != nid and distance != -1:
+                    self._edges[nid].append((other, distance, "intra"))
+
+    # ---------------- Queries ----------------
+
+    def department_route(self, a, b):
+        """
+        Route between two department numbers of the departments table.
+        """
+        return self.dijkstra(self.departments[a][1], self.departments[b][1])
+
+    def dijkstra(self, start, end):
+        """
+        Returns (distance, path) like Path_Calculation.dijkstra; distance is
+        -1 and path [end] if end cannot be reached.
+        """
+        s, e = self._normalize(start), self._normalize(end)
+        found, parent = self._abstract_search(s, e)
+        if found == -1:
+            return -1, [end]
+
+        chain = []
+        node = -2
+        while node != -1:
+            prev, kind = parent[node]
+            chain.append((prev, node, kind))
+            node = prev
+        chain.reverse()
+
+        path = [s]
+        for u, v, kind in chain:
+            a = s if u == -1 else self._nodes[u]
+            b = e if v == -2 else self._nodes[v]
+            if kind in ("step", "link"):
+                path.append(b)
+            else:
+                cluster = self._cluster_of(a)
+                distance, local = cluster.planner.astar(cluster.local(a), cluster.local(b))
+                path.extend(cluster.glob(cell) for cell in local[1:])
+
+        if self._integral and float(found).is_integer():
+            found = int(found)
+        if self.single_floor:
+            path = [cell[1:] for cell in path]
+        return found, path
+
+    def _local_costs(self, cell):
+        cluster = self._cluster_of(cell)
+        if not cluster.nodes:
+            # No entrances (e.g. the whole map is one cluster): only the
+            # direct route inside the cluster can answer
+            return cluster, []
+        targets = [cluster.local(self._nodes[nid]) for nid in cluster.nodes]
+        results = cluster.planner.search_targets(cluster.local(cell), targets)
+        return cluster, [(nid, results[t][0]) for nid, t in zip(cluster.nodes, targets)
+                         if results[t][0] != -1]
+
+    def _heuristic(self, e):
+        """
+        Admissible estimate of the cost to e: Manhattan distance on e's
+        floor unless a connector on that floor offers a cheaper way round,
+        zero on other floors. Connectors run both ways, so either end on
+        e's floor is a way out.
+        """
+        scale = self.h_scale
+        exits = [end for link in self._links for end in link[:2] if end[0] == e[0]]
+        min_link = self._min_link
+
+        def h(cell):
+            if cell[0] != e[0]:
+                return 0.0
+            best = abs(cell[1] - e[1]) + abs(cell[2] - e[2])
+            for a in exits:
+                best = min(best, abs(cell[1] - a[1]) + abs(cell[2] - a[2]) + min_link / scale)
+            return scale * best
+        if not scale:
+            return lambda cell: 0.0
+        return h
+
+    def _abstract_search(self, s, e):
+        """
+        Dijkstra/A* over entrance nodes with s (id -1) and e (id -2) wired
+        into their clusters. Returns (cost, parent) or (-1, None).
+        """
+        START, GOAL = -1, -2
+        start_cluster, leave = self._local_costs(s)
+        goal_cluster, arrive = self._local_costs(e)
+        # Local search from e gives e->node costs; turn them into node->e
+        w_goal = self.floors[e[0]][e[1:]]
+        into_goal = dict((nid, d - self.floors[self._nodes[nid][0]][self._nodes[nid][1:]] + w_goal)
+                         for nid, d in arrive)
+        start_edges = [(nid, d, "enter") for nid, d in leave]
+        if start_cluster is goal_cluster:
+            direct = start_cluster.planner.dijkstra(start_cluster.local(s), start_cluster.local(e))[0]
+            if direct != -1:
+                start_edges.append((GOAL, direct, "direct"))
+
+        h = self._heuristic(e)
+        nodes = self._nodes
+        best = {START: 0.0}
+        parent = {START: None}
+        heap = [(h(s), 0.0, START)]
+        while heap:
+            f, g, u = heapq.heappop(heap)
+            if g > best.get(u, INF):
+                continue
+            if u == GOAL:
+                return g, parent
+            edges = start_edges if u == START else self._edges[u]
+            if u in into_goal:
+                edges = edges + [(GOAL, into_goal[u], "leave")]
+            for v, cost, kind in edges:
+                nd = g + cost
+                if nd < best.get(v, INF):
+                    best[v] = nd
+                    parent[v] = (u, kind)
+                    heapq.heappush(heap, (nd + h(e if v == GOAL else nodes[v]), nd, v))
+        return -1, None
+
+
+def _runs(mask):
+    """
+    (start, end) of every run of True values in a 1-D boolean array.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0])
+
+
+def _entrance_rows(a, b):
+    """
+    Entrance positions along an open border stretch [a, b): the middle of
+    a short stretch, both ends of a long one.
+    """
+    if b - a < 6:
+        return [(a + b - 1) // 2]
+    return [a, b - 1]
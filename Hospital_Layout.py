@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+
+
+def generate_hospital(rows, cols, block=12, weighted_rate=0.01, max_weight=5, seed=0):
+    """
+    Builds a synthetic hospital floor plan in the GUI.default_maze format.
+
+    Corridors run every `block` cells in both directions. The space between
+    them is a walled room with a single door onto one of the corridors.
+    A fraction of corridor cells gets a department-style weight between
+    2 and max_weight; everything else that is open costs 1.
+    """
+    rng = np.random.RandomState(seed)
+    maze = np.zeros((rows, cols), dtype=np.int32)
+    maze[::block, :] = 1
+    maze[:, ::block] = 1
+
+    for r0 in range(0, rows, block):
+        for c0 in range(0, cols, block):
+            r1 = min(r0 + block, rows)
+            c1 = min(c0 + block, cols)
+            if r1 - r0 < 5 or c1 - c0 < 5:
+                continue
+            maze[r0 + 2:r1 - 1, c0 + 2:c1 - 1] = 1
+            # Punch a door through the wall ring towards a corridor
+            doors = [(r0 + 1, rng.randint(c0 + 2, c1 - 1)),
+                     (rng.randint(r0 + 2, r1 - 1), c0 + 1)]
+            if r1 < rows:
+                doors.append((r1 - 1, rng.randint(c0 + 2, c1 - 1)))
+            if c1 < cols:
+                doors.append((rng.randint(r0 + 2, r1 - 1), c1 - 1))
+            maze[doors[rng.randint(len(doors))]] = 1
+
+    corridor = np.zeros_like(maze, dtype=bool)
+    corridor[::block, :] = True
+    corridor[:, ::block] = True
+    weighted = corridor & (rng.random_sample(maze.shape) < weighted_rate)
+    maze[weighted] = rng.randint(2, max_weight + 1, size=int(weighted.sum()))
+    return maze
+
+
+def random_open_cells(maze, count, seed=0):
+    """
+    Picks `count` random open cells of the maze as (row, col) tuples.
+    """
+    rng = np.random.RandomState(seed)
+    xs, ys = np.nonzero(np.asarray(maze))
+    picks = rng.randint(len(xs), size=count)
+    return [(int(xs[i]), int(ys[i])) for i in picks]
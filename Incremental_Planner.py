@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import heapq
+from Grid_Planner import GridPlanner, INF
+
+
+class IncrementalPlanner(object):
+    """
+    D* Lite planner that keeps its search state between calls.
+
+    The search runs backwards from the goal, so when the robot moves and a
+    few cells change cost (an obstacle blocks a corridor, a weight is
+    raised) only the part of the search those cells influence is redone.
+    Costs follow the GUI.default_maze convention: 0 is a wall, any other
+    value is the cost of entering the cell.
+
+    Typical use from the motion loop:
+
+        planner = IncrementalPlanner(maze, start, end)
+        distance, path = planner.replan(start)
+        ...
+        planner.block((4, 3))
+        distance, path = planner.replan(current_cell)
+    """
+
+    def __init__(self, maze, start, goal):
+        # Reuse the grid layout (padding, offsets, indices) of GridPlanner
+        self.grid = GridPlanner(maze)
+        self._flat = self.grid._flat
+        self._offsets = self.grid._offsets
+        self.goal = goal
+        self.pending = False
+        self.expanded = 0
+        self._reset(start)
+
+    def _reset(self, start):
+        size = len(self._flat)
+        self.start = start
+        self.h_scale = self.grid.h_scale
+        self._g = [INF] * size
+        self._rhs = [INF] * size
+        self._queued = {}   # index -> key currently in the heap
+        self._heap = []
+        self._km = 0.0
+        self._s = self.grid.index(start)
+        self._goal = self.grid.index(self.goal)
+        self._rhs[self._goal] = 0.0
+        self._push(self._goal)
+
+    # ---------------- Public interface ----------------
+
+    def set_cost(self, cell, weight):
+        """
+        Changes the cost of entering cell (0 = wall). The next replan()
+        repairs the path instead of searching from scratch.
+        """
+        i = self.grid.index(cell)
+        if self._flat[i] == weight:
+            return
+        self.grid.set_cost(cell, weight)
+        self.pending = True
+        if self.grid.h_scale < self.h_scale:
+            # A cheaper cell would make the current heuristic overestimate
+            self._reset(self.start)
+            return
+        self._update(i)
+        for off in self._offsets:
+            self._update(i + off)
+
+    def block(self, cell):
+        self.set_cost(cell, 0)
+
+    def replan(self, current):
+        """
+        Moves the search start to current and returns (distance, path) to
+        the goal, or (-1, []) if the goal cannot be reached.
+        """
+        s = self.grid.index(current)
+        if s != self._s:
+            self._km += self._h(self._s, s)
+            self._s = s
+            self.start = current
+        self._compute()
+        self.pending = False
+
+        g, flat = self._g, self._flat
+        if g[s] == INF:
+            return -1, []
+        path = [s]
+        node = s
+        while node != self._goal:
+            best, best_cost = -1, INF
+            for off in self._offsets:
+                j = node + off
+                c = flat[j]
+                if c and g[j] + c < best_cost:
+                    best, best_cost = j, g[j] + c
+            if best == -1:
+                return -1, []
+            path.append(best)
+            node = best
+        return g[s], [self.grid.cell(i) for i in path]
+
+    # ---------------- D* Lite core ----------------
+
+    def _h(self, a, b):
+        ax, ay = divmod(a, self.grid.width)
+        bx, by = divmod(b, self.grid.width)
+        return self.h_scale * (abs(ax - bx) + abs(ay - by))
+
+    def _key(self, i):
+        m = min(self._g[i], self._rhs[i])
+        return (m + self._h(self._s, i) + self._km, m)
+
+    def _push(self, i):
+        key = self._key(i)
+        self._queued[i] = key
+        heapq.heappush(self._heap, (key, i))
+
+    def _top(self):
+        heap, queued = self._heap, self._queued
+        while heap:
+            key, i = heap[0]
+            if queued.get(i) == key:
+                return key, i
+            heapq.heappop(heap)
+        return (INF, INF), -1
+
+    def _update(self, i):
+        flat = self._flat
+        if not flat[i] and i != self._goal and self._rhs[i] == INF and self._g[i] == INF:
+            # Walls and padding the search never reached stay out of the queue
+            return
+        if i != self._goal:
+            best = INF
+            if flat[i]:
+                g = self._g
+                for off in self._offsets:
+                    j = i + off
+                    c = flat[j]
+                    if c and g[j] + c < best:
+                        best = g[j] + c
+            self._rhs[i] = best
+        if self._g[i] != self._rhs[i]:
+            self._push(i)
+        else:
+            self._queued.pop(i, None)
+
+    def _compute(self):
+        g, rhs, flat, offsets = self._g, self._rhs, self._flat, self._offsets
+        s = self._s
+        expanded = 0
+        while True:
+            key, u = self._top()
+            if u == -1 or (key >= self._key(s) and rhs[s] == g[s]):
+                break
+            new_key = self._key(u)
+            if key < new_key:
+                self._push(u)
+                continue
+            heapq.heappop(self._heap)
+            del self._queued[u]
+            expanded += 1
+            if g[u] > rhs[u]:
+                g[u] = rhs[u]
+                c = flat[u]
+                for off in offsets:
+                    p = u + off
+                    # Entering u from p costs c; relax p directly
+                    if c and flat[p] and p != self._goal and g[u] + c < rhs[p]:
+                        rhs[p] = g[u] + c
+                        if g[p] != rhs[p]:
+                            self._push(p)
+                        else:
+                            self._queued.pop(p, None)
+            else:
+                g[u] = INF
+                self._update(u)
+                for off in offsets:
+                    self._update(u + off)
+        self.expanded = expanded
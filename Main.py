@@ -43,7 +43,7 @@ def main(robot_ip="192.168.1.35", robot_port=9559):
 
     hybrid_session = HybridSession(real_session)
 
-    camera_receiver = PCCameraReceiver(hybrid_session.pc_memory, port=8000)
+    camera_receiver = PCCameraReceiver(hybrid_session.pc_memory, port=8000, camera=hybrid_session.camera)
     camera_receiver.start()
 
     assistant = RobotAssistant(hybrid_session)
@@ -1,21 +1,110 @@
-from naoqi import ALProxy
+try:
+    from naoqi import ALProxy
+except ImportError:
+    # Off the robot: install proxies with use_proxies(), e.g. Nao_Simulator
+    ALProxy = None
 import math
+import time
 from Obstacle import avoid_obstacles_after_step
+from Motion_Plan import PlanCache, directions
+from Path_Follower import PurePursuit
 
 IP = "192.168.1.35"  # IP address of your PC
 PORT = 9559  # Port for communication between PC and NAO
 
-motion = ALProxy("ALMotion", IP, PORT)
-posture = ALProxy("ALRobotPosture", IP, PORT)
-memory = ALProxy("ALMemory", IP, PORT)
-
-
-import math
-
-def move_robot_along_path(path):
+motion = posture = memory = None
+clock = time
+if ALProxy is not None:
+    motion = ALProxy("ALMotion", IP, PORT)
+    posture = ALProxy("ALRobotPosture", IP, PORT)
+    memory = ALProxy("ALMemory", IP, PORT)
+
+# Compiled motion plans of recent routes
+plans = PlanCache()
+
+
+def use_proxies(motion_proxy, posture_proxy, memory_proxy=None, clock_source=time):
+    """
+    Replaces the NAOqi proxies (and the clock the follower sleeps on),
+    e.g. with the ones of a Nao_Simulator.SimRobot.
+    """
+    global motion, posture, memory, clock
+    motion, posture, memory, clock = motion_proxy, posture_proxy, memory_proxy, clock_source
+
+
+def _correct_drift(tracker, cell, heading):
+    """
+    Checks the tracked pose after a move and walks back onto cell if it
+    drifted. Returns the cell the robot is really on if it ended up in
+    another one, None otherwise.
+    """
+    result = tracker.check(cell, heading, since=clock.time())
+    if result is None:
+        return None
+    kind, value = result
+    if kind == "replan":
+        print("Off route: at", value, "instead of", cell)
+        return value
+    print("Correcting drift: %.2fm, %d degrees" % (math.hypot(value[0], value[1]),
+                                                   round(math.degrees(value[2]))))
+    motion.moveTo(*value)
+    return None
+
+
+def move_robot_along_path(path, planner=None, follow=False, pose_list=False, tracker=None, monitor=None,
+                          costmap=None, sonar_filter=None):
+    """
+    Walks the robot along a grid path, 0.15 m per cell.
+    Without a planner the path is compiled into straight runs
+    (Motion_Plan) and each run is one moveTo, or the whole route one
+    moveTo with a pose list if pose_list is set.
+    With a planner (Incremental_Planner.IncrementalPlanner for the same
+    destination), the sonar is checked before every step and, when a cell
+    gets blocked, the rest of the route is replaced by the repaired path.
+    With follow=True the whole path is walked in one continuous motion by
+    Path_Follower.PurePursuit instead of stopping at every cell.
+    With a started Pose_Tracker.PoseTracker, odometry drift is corrected
+    after every move; with a planner as well, a robot that ended up in
+    another cell replans from there. A started Sonar_Monitor.SonarMonitor
+    replaces the sonar reads of the obstacle check, and obstacles seen
+    are recorded in costmap (Costmap.Costmap) if one is given. Without a
+    monitor, a Sonar_Filter.SonarFilter filters the per-step reads.
+    """
 
     posture.goToPosture("StandInit", 1)
 
+    if follow:
+        print("Following path of %d cells" % len(path))
+        PurePursuit().follow(motion, path, clock)
+        print("Finished. 180")
+        motion.moveTo(0, 0, math.pi)
+        return
+
+    if tracker is not None and len(path) > 1:
+        tracker.begin(path)
+
+    if planner is None:
+        plan = plans.get(path)
+        if pose_list and tracker is None:
+            print("Walking %d segments in one move" % len(plan))
+            motion.moveTo(plan.poses())
+        else:
+            cell = path[0]
+            for segment in plan.segments:
+                if segment.turn:
+                    print("Turn %d degrees" % round(math.degrees(segment.turn)))
+                    motion.moveTo(0, 0, segment.turn)
+                length = segment.cells * plan.cell_size
+                print("Move forward %.2fm" % length)
+                motion.moveTo(length, 0, 0)
+                dx, dy = directions[segment.heading]
+                cell = (cell[0] + dx * segment.cells, cell[1] + dy * segment.cells)
+                if tracker is not None and _correct_drift(tracker, cell, segment.heading):
+                    motion.moveTo(*tracker.move_to(cell, segment.heading))
+        print("Finished. 180")
+        motion.moveTo(0, 0, math.pi)
+        return
+
     print("Move forward 0.15m")
     motion.setWalkTargetVelocity(0.5, 0, 0, 0.3)
     motion.moveTo(0.15, 0, 0)
@@ -23,7 +112,23 @@ def move_robot_along_path(path):
 
     turn_flag = 0
 
-    for i in range(2, len(path)):
+    i = 2
+    while i < len(path):
+        facing = (path[i - 1][0] - path[i - 2][0], path[i - 1][1] - path[i - 2][1])
+        step = (path[i][0] - path[i - 1][0], path[i][1] - path[i - 1][1])
+        # The sonar only looks at path[i] when the route goes straight on
+        if planner is not None and step == facing:
+            avoid_obstacles_after_step(motion, memory, planner=planner, ahead=path[i], clock=clock,
+                                       monitor=monitor, costmap=costmap, sonar_filter=sonar_filter)
+            if planner.pending:
+                distance, remaining = planner.replan(path[i - 1])
+                if not remaining:
+                    print("No route left to the destination.")
+                    break
+                print("Replanned, remaining distance:", distance)
+                path = path[:i - 1] + remaining
+                continue
+
         x2, y2 = path[i]
         x1, y1 = path[i - 1]
         x0, y0 = path[i - 2]
@@ -65,6 +170,11 @@ def move_robot_along_path(path):
 
                 turn_flag = 1
 
+        elif dx == -dx_prev and dy == -dy_prev:
+            # Only happens when a replanned route doubles back
+            print("Turn around")
+            motion.moveTo(0, 0, math.pi)
+
         print("Move forward 0.15m")
         motion.setWalkTargetVelocity(0.5, 0, 0, 0.3)
         motion.moveTo(0.15, 0, 0)
@@ -72,6 +182,27 @@ def move_robot_along_path(path):
 
         turn_flag = 0
 
+        if tracker is not None:
+            heading = directions.index((dx, dy))
+            actual = _correct_drift(tracker, path[i], heading)
+            if actual is not None:
+                remaining = []
+                if planner is not None and hasattr(planner, "replan"):
+                    try:
+                        distance, remaining = planner.replan(actual)
+                    except ValueError:
+                        pass   # drifted off the map
+                if remaining:
+                    print("Replanned from", actual)
+                    motion.moveTo(*tracker.move_to(actual, heading))
+                    # The cell behind only tells the turn logic which way the robot faces
+                    behind = (actual[0] - dx, actual[1] - dy)
+                    path = path[:i - 1] + [behind] + remaining
+                else:
+                    # Nowhere to go from there (a wall): walk back onto the route
+                    motion.moveTo(*tracker.move_to(path[i], heading))
+        i += 1
+
 
     print("Finished. 180")
     motion.moveTo(0, 0, math.pi)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+from collections import deque
+import math
+import threading
+import Motion
+from Grid_Planner import OPPOSITE
+from Motion_Plan import compile_path
+from Path_Follower import CELL_SIZE
+from Pose_Tracker import GridFrame
+
+
+class MotionTask(object):
+    """
+    One route handed to a MotionExecutor. state goes from "queued" to
+    "running" and ends as "done", "cancelled" or "failed".
+    """
+
+    def __init__(self, path):
+        self.path = list(path)
+        self.state = "queued"
+        self.cells_done = 0
+        self._finished = threading.Event()
+
+    @property
+    def progress(self):
+        """
+        Fraction of the route's cells walked so far.
+        """
+        return self.cells_done / max(1, len(self.path) - 1)
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        self._finished.wait(timeout)
+        return self._finished.is_set()
+
+    def _finish(self, state):
+        self.state = state
+        self._finished.set()
+
+
+class MotionExecutor(object):
+    """
+    Walks routes on a background thread so speech and event callbacks
+    return right away.
+
+    Routes are compiled with Motion_Plan and walked one straight run per
+    moveTo through the proxies installed in Motion. cancel() and preempt()
+    interrupt the current run with stopMove() and let the robot finish the
+    cell it is in, so it always stops on a grid cell; preempt() then walks
+    the new route. If that route does not start where the robot stopped,
+    router(start, end) -> (distance, path) plans the way from there (e.g.
+    Route_Cache.RouteCache.route).
+
+    With a started Sonar_Monitor.SonarMonitor and a Costmap.Costmap, the
+    newest filtered sonar reading is projected into the costmap
+    (Costmap.observe) before every straight run, once the robot faces
+    along it: obstacles seen ahead raise the cost of their cells and the
+    next route planned on the costmap goes round them.
+    """
+
+    def __init__(self, router=None, cell_size=CELL_SIZE, about_face=True, monitor=None, costmap=None):
+        self.router = router
+        self.cell_size = cell_size
+        self.about_face = about_face
+        self.monitor = monitor
+        self.costmap = costmap
+        self.cell = None       # last grid cell the robot stood on
+        self.heading = None    # index into Grid_Planner.directions
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._current = None
+        self._cancel = False
+        self._walking = False
+        self._thread = None
+
+    # ---------------- Control ----------------
+
+    def run(self, path):
+        """
+        Queues path behind the routes already queued. Returns its MotionTask.
+        """
+        task = MotionTask(path)
+        with self._cond:
+            self._queue.append(task)
+            self._start()
+            self._cond.notify()
+        return task
+
+    def preempt(self, path):
+        """
+        Drops everything queued, stops the current route at the next cell
+        and walks path instead.
+        """
+        task = MotionTask(path)
+        with self._cond:
+            self._stop()
+            self._queue.append(task)
+            self._start()
+            self._cond.notify()
+        return task
+
+    def cancel(self):
+        with self._cond:
+            self._stop()
+
+    def shutdown(self):
+        with self._cond:
+            self._stop()
+            self._queue.append(None)
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ---------------- State ----------------
+
+    @property
+    def busy(self):
+        with self._cond:
+            return self._current is not None or bool(self._queue)
+
+    @property
+    def current(self):
+        return self._current
+
+    def progress(self):
+        """
+        Progress of the route being walked, None when idle.
+        """
+        task = self._current
+        return None if task is None else task.progress
+
+    def wait(self, timeout=None):
+        """
+        Waits until every queued route has finished.
+        """
+        with self._cond:
+            while self._current is not None or self._queue:
+                self._cond.wait(timeout)
+                if timeout is not None:
+                    break
+            return self._current is None and not self._queue
+
+    # ---------------- Worker ----------------
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _stop(self):
+        while self._queue:
+            task = self._queue.popleft()
+            if task is not None:
+                task._finish("cancelled")
+        self._cancel = True
+        if self._walking:
+            Motion.motion.stopMove()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                task = self._queue.popleft()
+                if task is None:
+                    return
+                self._current = task
+                self._cancel = False
+                task.state = "running"
+            state = "failed"
+            try:
+                state = self._execute(task)
+            except Exception as e:
+                print("[Motion] Route failed:", str(e))
+            with self._cond:
+                self._current = None
+                task._finish(state)
+                self._cond.notify_all()
+
+    def _execute(self, task):
+        path = task.path
+        if self.cell is not None and tuple(path[0]) != self.cell:
+            if self.router is None:
+                return "failed"
+            distance, path = self.router(self.cell, tuple(path[-1]))
+            if distance == -1:
+                return "failed"
+            task.path = path
+        self.cell = tuple(path[0])
+        if len(path) < 2:
+            return "done"
+
+        motion = Motion.motion
+        Motion.posture.goToPosture("StandInit", 1)
+        plan = compile_path(path, self.cell_size, self.heading)
+        frame = None
+        for segment in plan.segments:
+            if self._cancel:
+                return "cancelled"
+            if segment.turn:
+                # Turns are short and always finished
+                motion.moveTo(0, 0, segment.turn)
+            self.heading = segment.heading
+            with self._cond:
+                if self._cancel:
+                    return "cancelled"
+                self._walking = True
+            pose = motion.getRobotPosition(True)
+            x0, y0, _ = pose
+            if frame is None:
+                # Facing path[1] from path[0] now, which anchors the frame
+                frame = GridFrame(path, pose, self.cell_size)
+            self._observe(frame, pose)
+            motion.moveTo(segment.cells * self.cell_size, 0, 0)
+            with self._cond:
+                self._walking = False
+                cancelled = self._cancel
+            cells = segment.cells
+            if cancelled:
+                cells = self._finish_cell(motion, x0, y0, segment.cells)
+            task.cells_done += cells
+            self.cell = tuple(path[task.cells_done])
+            if cancelled:
+                return "cancelled"
+
+        if self.about_face:
+            motion.moveTo(0, 0, math.pi)
+            self.heading = OPPOSITE[self.heading]
+        return "done"
+
+    def _observe(self, frame, pose):
+        if self.monitor is None or self.costmap is None:
+            return
+        # A reading from after the turn, so it looks where the run goes;
+        # filtered, so a lone echo does not raise the cost of a cell
+        reading = self.monitor.latest(since=Motion.clock.time(), filtered=True)
+        if reading is not None:
+            t, left, right = reading
+            self.costmap.observe(frame, pose, left, right)
+
+    def _finish_cell(self, motion, x0, y0, cells):
+        """
+        After an interrupted run, walks on to the next cell centre.
+        Returns the number of cells the run covered.
+        """
+        x1, y1, _ = motion.getRobotPosition(True)
+        travelled = math.hypot(x1 - x0, y1 - y0)
+        done = min(cells, int(math.ceil(travelled / self.cell_size - 1e-3)))
+        rest = done * self.cell_size - travelled
+        if rest > 1e-3:
+            motion.moveTo(rest, 0, 0)
+        return done
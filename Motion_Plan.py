@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+from collections import OrderedDict, namedtuple
+import math
+from Grid_Planner import directions
+from Path_Follower import CELL_SIZE
+
+# One straight run: turn (radians, left positive) before walking cells cells
+# along heading (an index into Grid_Planner.directions)
+Segment = namedtuple("Segment", "heading cells turn")
+
+
+class MotionPlan(object):
+    """
+    A grid path compiled into straight segments, so each corridor run is
+    walked as one motion command instead of one moveTo per cell.
+    """
+
+    def __init__(self, segments, cell_size=CELL_SIZE):
+        self.segments = segments
+        self.cell_size = cell_size
+
+    def __len__(self):
+        return len(self.segments)
+
+    def moves(self):
+        """
+        (x, y, theta) moveTo arguments: a turn on the spot where needed,
+        then one move per straight run.
+        """
+        moves = []
+        for segment in self.segments:
+            if segment.turn:
+                moves.append((0.0, 0.0, segment.turn))
+            moves.append((segment.cells * self.cell_size, 0.0, 0.0))
+        return moves
+
+    def poses(self):
+        """
+        The route as one ALMotion control point list for a single moveTo
+        call: the (x, y, theta) pose at the end of every straight run, in
+        FRAME_ROBOT where the move starts, i.e. relative to the start pose,
+        not to the previous point. Turns on the spot get no point of their
+        own; they are the change of theta to the end of the next run.
+        """
+        poses = []
+        x = y = theta = 0.0
+        for segment in self.segments:
+            theta += segment.turn
+            length = segment.cells * self.cell_size
+            x += length * math.cos(theta)
+            y += length * math.sin(theta)
+            poses.append([x, y, theta])
+        return poses
+
+
+def compile_path(path, cell_size=CELL_SIZE, start_heading=None):
+    """
+    Turns a dijkstra path into a MotionPlan. Without start_heading (an
+    index into directions) the robot is assumed to face the first step,
+    as in Motion.move_robot_along_path.
+    """
+    segments = []
+    heading = start_heading
+    for (x0, y0), (x1, y1) in zip(path, path[1:]):
+        d = directions.index((x1 - x0, y1 - y0))
+        if d == heading and segments:
+            last = segments[-1]
+            segments[-1] = last._replace(cells=last.cells + 1)
+            continue
+        turn = 0.0 if heading is None else _turn_angle(heading, d)
+        segments.append(Segment(d, 1, turn))
+        heading = d
+    return MotionPlan(segments, cell_size)
+
+
+def _turn_angle(heading, new_heading):
+    # Map rows grow downwards, so a step (dx, dy) points to (dy, -dx)
+    ax, ay = directions[heading][1], -directions[heading][0]
+    bx, by = directions[new_heading][1], -directions[new_heading][0]
+    return math.atan2(ax * by - ay * bx, ax * bx + ay * by)
+
+
+class PlanCache(object):
+    """
+    Bounded LRU of compiled plans keyed by the route's cells.
+    """
+
+    def __init__(self, capacity=128, cell_size=CELL_SIZE):
+        self.capacity = capacity
+        self.cell_size = cell_size
+        self._plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        key = tuple((int(x), int(y)) for x, y in path)
+        plan = self._plans.pop(key, None)
+        if plan is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            plan = compile_path(key, self.cell_size)
+            if len(self._plans) >= self.capacity:
+                self._plans.popitem(last=False)
+        self._plans[key] = plan
+        return plan
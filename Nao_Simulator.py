@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-ins for the NAOqi proxies Motion.py and Obstacle.py use (ALMotion,
+ALRobotPosture, ALMemory sonar), so routes can be walked and timed
+without a robot.
+
+    sim = SimRobot(speed=None)
+    Motion.use_proxies(sim.motion, sim.posture, sim.memory, sim.clock)
+    Motion.move_robot_along_path(path)
+    print(sim.clock.time())
+"""
+from __future__ import division, print_function
+import math
+import random
+import threading
+import time
+from Grid_Planner import wrap_angle
+from Sonar_Monitor import SONAR_LEFT, SONAR_RIGHT
+
+
+class SimClock(object):
+    """
+    Simulated time in seconds.
+
+    With speed=None the clock is virtual and only moves when threads
+    sleep on it: once the thread that made the clock and every thread that
+    has slept on it (that are still alive) are asleep, time jumps to the
+    earliest wake-up.
+    Simulated time then depends only on the simulated motion and the
+    sleeps, not on how long the code in between takes, and threads such
+    as a SonarMonitor run in lockstep with the walk. A thread that blocks
+    on something else (a join, a lock) holds time up for at most grace
+    wall seconds; waits on a condition go through wait().
+
+    With a speed the clock follows the wall clock scaled by that factor
+    (speed=100 runs a 10 minute walk in 6 s). That is handy to watch a
+    walk, but every millisecond of computation then counts as speed
+    milliseconds of robot time, so use the virtual clock to measure.
+    """
+
+    def __init__(self, speed=100.0, grace=0.02, poll=0.01):
+        self.speed = speed
+        self.grace = grace
+        self.poll = poll
+        self._real0 = time.time()
+        self._virtual = 0.0
+        self._cond = threading.Condition()
+        # Threads taking part in the lockstep: the creator, e.g. the one
+        # that walks the route, and every thread that sleeps on the clock
+        self._threads = set([threading.current_thread()])
+        self._asleep = {}       # thread -> virtual time it wakes up
+
+    def time(self):
+        if self.speed is None:
+            return self._virtual
+        return (time.time() - self._real0) * self.speed
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed is not None:
+            time.sleep(seconds / self.speed)
+            return
+        with self._cond:
+            wake = self._virtual + seconds
+            self._doze(wake)
+            while self._virtual < wake:
+                moved = self._virtual
+                self._cond.wait(self.grace)
+                if self._virtual == moved and self._virtual < wake:
+                    # Whoever is awake is blocked elsewhere, not walking
+                    self._advance(force=True)
+            del self._asleep[threading.current_thread()]
+
+    def wait(self, cond, seconds):
+        """
+        cond.wait() for at most seconds of clock time; the caller holds
+        cond. Nothing can wake a virtual sleep early, so the virtual clock
+        releases cond, sleeps at most poll seconds and returns: like
+        cond.wait(), this may return before anything changed, and callers
+        check their condition in a loop.
+        """
+        if self.speed is not None:
+            cond.wait(seconds / self.speed)
+            return
+        cond.release()
+        try:
+            self.sleep(min(seconds, self.poll))
+        finally:
+            cond.acquire()
+
+    def _doze(self, wake):
+        thread = threading.current_thread()
+        self._threads.add(thread)
+        self._asleep[thread] = wake
+        self._advance()
+
+    def _advance(self, force=False):
+        self._threads = set(t for t in self._threads if t.is_alive())
+        if not self._asleep or (not force and len(self._asleep) < len(self._threads)):
+            return
+        wake = min(self._asleep.values())
+        if wake > self._virtual:
+            self._virtual = wake
+            self._cond.notify_all()
+
+
+class SimMotion(object):
+    """
+    Kinematic ALMotion: the robot is a point with a heading that moves at
+    the commanded fraction of walk_speed (m/s) and turn_speed (rad/s).
+
+    Walking from standstill first costs start_time seconds (the walk
+    engine shifting weight before the first step), and every blocking
+    moveTo also pays stop_time at the end, like a real stop-and-go walk.
+    walk_error and turn_error add odometry drift: every moveTo walks and
+    turns that relative amount off (Gaussian), as NAO's feet slip. The
+    pose is integrated lazily whenever it is read or a command changes
+    the velocity. commands counts the calls made, i.e. the NAOqi
+    round trips the same code would cost on the robot.
+    """
+
+    def __init__(self, clock=None, walk_speed=0.1, turn_speed=0.6, start_time=0.6, stop_time=0.4,
+                 walk_error=0.0, turn_error=0.0, seed=0):
+        self.clock = clock or SimClock()
+        self.walk_speed = walk_speed
+        self.turn_speed = turn_speed
+        self.start_time = start_time
+        self.stop_time = stop_time
+        self.walk_error = walk_error
+        self.turn_error = turn_error
+        self._random = random.Random(seed)
+        self.commands = 0
+        self.travelled = 0.0
+        self._pose = [0.0, 0.0, 0.0]
+        self._velocity = (0.0, 0.0, 0.0)   # fractions of the maximum speeds
+        self._walking_from = None          # sim time the current walk starts moving
+        self._t = self.clock.time()
+        self._move_id = 0
+        self._moving = False
+        self._lock = threading.RLock()
+
+    # ---------------- Kinematics ----------------
+
+    def _advance(self):
+        now = self.clock.time()
+        dt = now - self._t
+        self._t = now
+        if self._walking_from is None or dt <= 0:
+            return
+        # Time spent before the walk engine actually starts moving
+        idle = max(0.0, min(dt, self._walking_from - (now - dt)))
+        self._integrate(dt - idle)
+
+    def _integrate(self, dt):
+        vx, vy, vt = self._velocity
+        vx *= self.walk_speed
+        vy *= self.walk_speed
+        vt *= self.turn_speed
+        steps = max(1, int(dt / 0.02))
+        h = dt / steps
+        x, y, theta = self._pose
+        for _ in range(steps):
+            mid = theta + vt * h / 2
+            x += (vx * math.cos(mid) - vy * math.sin(mid)) * h
+            y += (vx * math.sin(mid) + vy * math.cos(mid)) * h
+            theta += vt * h
+        self.travelled += math.hypot(vx, vy) * dt
+        self._pose = [x, y, wrap_angle(theta)]
+
+    def _set_velocity(self, x, y, theta):
+        x, y, theta = [max(-1.0, min(1.0, float(v))) for v in (x, y, theta)]
+        with self._lock:
+            self._advance()
+            moving = x or y or theta
+            if moving and self._walking_from is None:
+                self._walking_from = self._t + self.start_time
+            elif not moving:
+                self._walking_from = None
+            self._velocity = (x, y, theta)
+
+    # ---------------- ALMotion interface ----------------
+
+    def moveInit(self):
+        self.commands += 1
+
+    def moveToward(self, x, y, theta, config=None):
+        self.commands += 1
+        self._set_velocity(x, y, theta)
+
+    def setWalkTargetVelocity(self, x, y, theta, frequency, config=None):
+        self.commands += 1
+        self._set_velocity(x, y, theta)
+
+    def stopMove(self):
+        self.commands += 1
+        with self._lock:
+            # Interrupts a moveTo running in another thread
+            self._move_id += 1
+            self._moving = False
+        self._set_velocity(0, 0, 0)
+
+    def moveTo(self, x, y=None, theta=None, config=None):
+        """
+        Blocking move to a pose relative to the robot, or through a list of
+        such poses [[x, y, theta], ...] in one walk, all of them relative to
+        where the move starts, as ALMotion's control points are. Each leg
+        walks straight to the next pose while turning to its theta.
+        stopMove() from another thread ends it early where the robot is.
+        """
+        self.commands += 1
+        poses = x if y is None else [[x, y, theta]]
+        with self._lock:
+            self._advance()
+            self._velocity = (0.0, 0.0, 0.0)
+            self._walking_from = None
+            self._move_id += 1
+            move_id = self._move_id
+            self._moving = True
+        try:
+            self.clock.sleep(self.start_time)
+            x0, y0, t0 = self._pose
+            c, s = math.cos(t0), math.sin(t0)
+            for px, py, pt in poses:
+                px0, py0, pt0 = self._pose
+                # Leg to the pose, in the world frame
+                dx, dy = x0 + c * px - s * py - px0, y0 + s * px + c * py - py0
+                turn = pt - wrap_angle(pt0 - t0)
+                if self.walk_error or self.turn_error:
+                    slip = 1 + self._random.gauss(0.0, self.walk_error)
+                    dx, dy = dx * slip, dy * slip
+                    turn *= 1 + self._random.gauss(0.0, self.turn_error)
+                length = math.hypot(dx, dy)
+                duration = length / self.walk_speed + abs(turn) / self.turn_speed
+                elapsed = 0.0
+                while elapsed < duration:
+                    dt = min(0.05, duration - elapsed)
+                    self.clock.sleep(dt)
+                    with self._lock:
+                        if self._move_id != move_id:
+                            return
+                        elapsed += dt
+                        f = elapsed / duration
+                        self.travelled += length * dt / duration
+                        self._pose = [px0 + f * dx, py0 + f * dy, wrap_angle(pt0 + f * turn)]
+            self.clock.sleep(self.stop_time)
+        finally:
+            with self._lock:
+                if self._move_id == move_id:
+                    self._moving = False
+                self._t = self.clock.time()
+
+    def moveIsActive(self):
+        return self._moving or self._walking_from is not None
+
+    def getRobotPosition(self, use_sensors=True):
+        self.commands += 1
+        with self._lock:
+            self._advance()
+            return list(self._pose)
+
+    def getRobotVelocity(self):
+        vx, vy, vt = self._velocity
+        return [vx * self.walk_speed, vy * self.walk_speed, vt * self.turn_speed]
+
+
+class SimPosture(object):
+    """
+    ALRobotPosture stand-in; changing posture takes posture_time seconds.
+    """
+
+    def __init__(self, clock=None, posture_time=1.5):
+        self.clock = clock or SimClock()
+        self.posture_time = posture_time
+        self.posture = "Crouch"
+
+    def goToPosture(self, name, speed):
+        if name != self.posture:
+            self.clock.sleep(self.posture_time)
+            self.posture = name
+        return True
+
+    def getPosture(self):
+        return self.posture
+
+
+class SimMemory(object):
+    """
+    ALMemory stand-in. The two sonar keys read the distance from the
+    robot's pose to the nearest obstacle inside each sensor's cone (left
+    and right of the walking direction), max_range when there is none.
+    Any other key reads what insertData stored.
+
+    Obstacles are circles (x, y, radius) in the simulated world frame,
+    the same frame SimMotion.getRobotPosition reports. An obstacle with a
+    linger time is a person who steps aside linger seconds after the
+    sonar first sees them within notice metres. reads counts the
+    getData/getListData round trips.
+    """
+
+    def __init__(self, motion, max_range=2.55, cone=math.radians(60), offset=math.radians(25),
+                 noise=0.0, seed=0):
+        self.motion = motion
+        self.max_range = max_range
+        self.cone = cone
+        self.offset = offset
+        self.noise = noise
+        self.obstacles = []
+        self.reads = 0
+        self._data = {}
+        self._random = random.Random(seed)
+
+    def add_obstacle(self, x, y, radius=0.05, linger=None, notice=0.5):
+        obstacle = [x, y, radius, linger, notice, None]
+        self.obstacles.append(obstacle)
+        return obstacle
+
+    def remove_obstacle(self, obstacle):
+        self.obstacles.remove(obstacle)
+
+    def insertData(self, key, value):
+        self._data[key] = value
+
+    def getData(self, key):
+        self.reads += 1
+        return self._read(key)
+
+    def getListData(self, keys):
+        self.reads += 1
+        return [self._read(key) for key in keys]
+
+    def _read(self, key):
+        if key == SONAR_LEFT:
+            return self._sonar(self.offset)
+        if key == SONAR_RIGHT:
+            return self._sonar(-self.offset)
+        return self._data[key]
+
+    def _sonar(self, direction):
+        x, y, theta = self.motion.getRobotPosition(True)
+        now = self.motion.clock.time()
+        best = self.max_range
+        for obstacle in self.obstacles:
+            ox, oy, radius, linger, notice, seen = obstacle
+            if seen is not None and now - seen > linger:
+                continue
+            dx, dy = ox - x, oy - y
+            distance = math.hypot(dx, dy)
+            bearing = wrap_angle(math.atan2(dy, dx) - theta - direction)
+            if abs(bearing) <= self.cone / 2:
+                best = min(best, max(0.0, distance - radius))
+                if linger is not None and seen is None and distance - radius < notice:
+                    obstacle[5] = now
+        if self.noise:
+            best += self._random.gauss(0.0, self.noise)
+        return max(0.0, min(self.max_range, best))
+
+
+class SimRobot(object):
+    """
+    Clock, motion, posture and memory proxies sharing one simulated time.
+    speed is the clock speed-up (None for a virtual clock, see SimClock);
+    walk_speed, turn_speed, start_time and stop_time go to SimMotion.
+    """
+
+    def __init__(self, speed=100.0, **motion_options):
+        self.clock = SimClock(speed)
+        self.motion = SimMotion(self.clock, **motion_options)
+        self.posture = SimPosture(self.clock)
+        self.memory = SimMemory(self.motion)
+
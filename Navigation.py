@@ -1,49 +1,43 @@
-import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from Path_Calculation import dijkstra
+import threading
+from Floor_Map import get_floor_map
+from Path_Calculation import find_path
 
+_renderer = None
+_renderer_lock = threading.Lock()
 
-def run_navigation(maze1, start, end, show=True):
+
+def get_renderer():
+    """
+    The shared Route_Renderer.RouteRenderer, started on first use. It draws
+    on its own thread into route.png with the Agg backend, so no window is
+    needed and navigation never waits on matplotlib.
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            from Route_Renderer import RouteRenderer
+            _renderer = RouteRenderer(labels=get_floor_map().labels()).start()
+        return _renderer
+
+
+def run_navigation(maze1, start, end, show=True, cache=None, renderer=None):
     """
-    Runs pathfinding from start to end and optionally displays the result.
+    Runs pathfinding from start to end and optionally hands the result to
+    a route renderer (the shared one by default); drawing happens on the
+    renderer's thread, this only queues the route. A
+    Route_Cache.RouteCache shared with the caller avoids planning the
+    same route twice; it plans on its own copy of the maze, which the
+    caller keeps up to date, and maze1 is only drawn.
     Returns (distance, path)
     """
-    distance, path = dijkstra(maze1, start, end)
-
-    maze = np.array([
-        [0, 0, 1, 1, 1, 1, 1, 1],
-        [0, 0, 1, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 1, 1, 1, 0],
-        [0, 0, 1, 0, 0, 0, 1, 0],
-        [0, 0, 1, 1, 1, 1, 1, 0],
-        [0, 0, 1, 0, 0, 0, 1, 0],
-        [0, 0, 1, 1, 1, 1, 1, 0],
-        [0, 0, 0, 0, 0, 0, 1, 0]
-    ])
+    if cache is not None:
+        # The cache's owner keeps it current through set_cost
+        distance, path = cache.route(start, end)
+    else:
+        distance, path = find_path(maze1, start, end)
 
     if show:
-        visual = np.copy(maze)
-        for x, y in path:
-            visual[x][y] = 2  # mark path
-
-        plt.figure(figsize=(6, 6))
-        plt.imshow(visual, cmap='gray_r')
-        plt.title("Shortest Path (Distance: %d)" % distance)
-        plt.xticks(np.arange(8))
-        plt.yticks(np.arange(8))
-        plt.grid(True, color='lightgray')
-        plt.text(start[1], start[0]+0.2, 'Start', va='top', ha='center', color='yellow', fontsize=12)
-        plt.text(end[1], end[0]+0.2, 'End', va='top', ha='center', color='red', fontsize=12)
-        plt.text(6, 0, 'internal:'+str(maze1[0,6]), va='center', ha='center', color='white', fontsize=12)
-        plt.text(1, 2, 'gastro:'+str(maze1[2,1]), va='center', ha='center', color='white', fontsize=12)
-        plt.text(4, 2, 'restroom:'+str(maze1[2,4]), va='center', ha='center', color='white', fontsize=12)
-        plt.text(4, 4, 'surgery:'+str(maze1[4,4]), va='center', ha='center', color='white', fontsize=12)
-        plt.text(4, 6, 'ent:'+str(maze1[6,4]), va='center', ha='center', color='white', fontsize=12)
-        plt.text(6, 7, 'emergency:'+str(maze1[7,6]), va='center', ha='center', color='grey', fontsize=12)
-        plt.text(6, 5, 'lab:' + str(maze1[5, 6]), va='center', ha='center', color='white', fontsize=12)
-        plt.show()
+        (renderer or get_renderer()).submit(maze1, path, start, end, distance)
 
     print "Shortest Path Distance: %d" % distance
     print "Path:"
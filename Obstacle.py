@@ -1,27 +1,62 @@
-from naoqi import ALProxy
-from GUI import get_updated_maze
-from Navigation import run_navigation
+from collections import deque
 import math
 import time
 
+# Recent (time, left, right) readings of the per-step check, for a sonar filter
+_readings = deque(maxlen=16)
+
 # ---------------- Obstacle Avoidance Function ----------------
 
-def avoid_obstacles_after_step(motionProxy, memoryProxy, threshold=0.5):
+def avoid_obstacles_after_step(motionProxy, memoryProxy, threshold=0.5, planner=None, ahead=None, clock=time,
+                               monitor=None, patience=3, costmap=None, sonar_filter=None):
     """
     Simple obstacle avoidance function called after each step forward.
     It checks the sonar sensors and turns if an obstacle is detected.
+    If a planner (Incremental_Planner.IncrementalPlanner) and the cell
+    ahead are given, an obstacle that is still there after waiting marks
+    that cell as blocked so the planner can repair the route.
+    clock provides sleep(), e.g. a Nao_Simulator.SimClock.
+    With a running Sonar_Monitor.SonarMonitor the sonar is not read here:
+    the robot waits until the monitor sees the path clear, at most
+    patience seconds, instead of a fixed 3 s.
+    With a Costmap.Costmap, the cell ahead gets a decaying extra cost for
+    every obstacle seen there, so busy corridors are avoided later on.
+    With a Sonar_Filter.SonarFilter the per-step reads are decided on the
+    filtered stream of the last reads instead of the raw one, so a lone
+    echo does not stop the robot; the monitor takes its own filter.
+    Returns True if an obstacle was detected.
     """
+    if monitor is not None:
+        if not monitor.blocked:
+            return False
+        motionProxy.stopMove()
+        if costmap is not None and ahead is not None:
+            costmap.add(ahead)
+        print("[Obstacle] Detected, waiting for the path to clear")
+        if monitor.wait_clear(patience) is None and planner is not None and ahead is not None:
+            print("[Obstacle] Still there, blocking cell", ahead)
+            planner.block(ahead)
+        return True
+
     try:
         left = memoryProxy.getData("Device/SubDeviceList/US/Left/Sensor/Value")
         right = memoryProxy.getData("Device/SubDeviceList/US/Right/Sensor/Value")
         print("[Sonar] Left: %.2f m, Right: %.2f m" % (left, right))
 
-        if left < threshold or right < threshold:
+        if _blocked(left, right, threshold, clock, sonar_filter):
             #print("[Obstacle] Detected! Initiating avoidance...")
 
             motionProxy.stopMove()
-            time.sleep(3)
+            if costmap is not None and ahead is not None:
+                costmap.add(ahead)
+            clock.sleep(3)
 
+            if planner is not None and ahead is not None:
+                left = memoryProxy.getData("Device/SubDeviceList/US/Left/Sensor/Value")
+                right = memoryProxy.getData("Device/SubDeviceList/US/Right/Sensor/Value")
+                if _blocked(left, right, threshold, clock, sonar_filter):
+                    print("[Obstacle] Still there, blocking cell", ahead)
+                    planner.block(ahead)
 
             #if left < right:
                 #print("-> Turning right to avoid obstacle")
@@ -29,6 +64,15 @@ def avoid_obstacles_after_step(motionProxy, memoryProxy, threshold=0.5):
             #else:
                 #print("<- Turning left to avoid obstacle")
                 ##motionProxy.moveTo(0.0, 0.0, 0.5)
+            return True
 
     except Exception as e:
         print("[Error] Obstacle detection failed:", str(e))
+    return False
+
+
+def _blocked(left, right, threshold, clock, sonar_filter):
+    if sonar_filter is None:
+        return left < threshold or right < threshold
+    _readings.append((clock.time(), left, right))
+    return sonar_filter.blocked(list(_readings))
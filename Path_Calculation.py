@@ -1,38 +1,173 @@
-import heapq
+import multiprocessing
+import numpy as np
+from Floor_Map import get_floor_map
+from Grid_Planner import GridPlanner, directions
+from Time_Planner import TurnAwarePlanner
 
-directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-rows = 8
-cols = 8
+rows, cols = get_floor_map().shape
 
 def dijkstra(maze, start, end):
-    heap = [(0, start)]
-    distances = {start: 0}
-    prev = {start: None}
-    visited = set()
-
-    while heap:
-        dist, current = heapq.heappop(heap)
-        if current in visited:
-            continue
-        visited.add(current)
-
-        if current == end:
-            break
-
-        for dx, dy in directions:
-            nx, ny = current[0] + dx, current[1] + dy
-            neighbor = (nx, ny)
-            if rows > nx >= 0 and 0 <= ny < cols and maze[nx][ny] != 0:
-                new_dist = dist + maze[nx][ny]
-                if neighbor not in distances or new_dist < distances[neighbor]:
-                    distances[neighbor] = new_dist
-                    prev[neighbor] = current
-                    heapq.heappush(heap, (new_dist, neighbor))
-
-    path = []
-    node = end
-    while node:
-        path.append(node)
-        node = prev.get(node)
-    path.reverse()
-    return distances.get(end, -1), path
\ No newline at end of file
+    """
+    Shortest path from start to end on a maze of any size.
+    Returns (distance, path); distance is -1 if end is unreachable.
+    """
+    maze = np.asarray(maze)
+    planner = GridPlanner(maze)
+    distance, path = planner.dijkstra(start, end)
+    if distance == -1:
+        return -1, [end]
+    if maze.dtype.kind in 'iub':
+        distance = int(distance)
+    return distance, path
+
+
+def astar(maze, start, end):
+    """
+    A* variant of dijkstra() with the same arguments and return value.
+    """
+    maze = np.asarray(maze)
+    planner = GridPlanner(maze)
+    distance, path = planner.astar(start, end)
+    if distance == -1:
+        return -1, [end]
+    if maze.dtype.kind in 'iub':
+        distance = int(distance)
+    return distance, path
+
+
+def find_path(maze, start, end):
+    """
+    Cheapest route from start to end by the fastest exact search for this
+    maze (GridPlanner.find_path); same arguments and return value as
+    dijkstra(), though equally cheap routes may be chosen differently.
+    """
+    maze = np.asarray(maze)
+    planner = GridPlanner(maze)
+    distance, path = planner.find_path(start, end)
+    if distance == -1:
+        return -1, [end]
+    if maze.dtype.kind in 'iub':
+        distance = int(distance)
+    return distance, path
+
+
+def fastest_route(maze, start, end, model=None, start_heading=None):
+    """
+    Route with the shortest predicted walking time, counting turns.
+    model is a Time_Planner.TimeModel (defaults if None). Returns (time, path)
+    like dijkstra(); time is -1 if end is unreachable.
+    """
+    planner = TurnAwarePlanner(maze, model)
+    seconds, path = planner.fastest(start, end, start_heading)
+    if seconds == -1:
+        return -1, [end]
+    return seconds, path
+
+
+class PathBatch(object):
+    """
+    Paths of a batch query, stored as one move code per step.
+
+    moves holds indices into directions for every path back to back and
+    offsets[k]:offsets[k + 1] is the slice of path k, where k is
+    i * len(targets) + j for sources[i] and targets[j].
+    """
+
+    def __init__(self, sources, targets, moves, offsets):
+        self.sources = sources
+        self.targets = targets
+        self.moves = moves
+        self.offsets = offsets
+
+    def path(self, i, j):
+        """
+        Decodes the path from sources[i] to targets[j] ([] if unreachable).
+        """
+        k = i * len(self.targets) + j
+        codes = self.moves[self.offsets[k]:self.offsets[k + 1]]
+        start = tuple(self.sources[i])
+        if not len(codes) and start != tuple(self.targets[j]):
+            return []
+        steps = np.array(directions)[codes]
+        cells = np.vstack(([start], start + np.cumsum(steps, axis=0)))
+        return [tuple(cell) for cell in cells.tolist()]
+
+
+def batch_dijkstra(maze, sources, targets, processes=None):
+    """
+    Distances and paths from every source to every target.
+
+    Sources are grouped so each distinct source is one multi-target search.
+    With processes > 1 the sources are split over a process pool. Returns
+    (distances, paths): a (len(sources), len(targets)) array with -1 for
+    unreachable pairs, and a PathBatch. Empty sources or targets give an
+    empty array.
+    """
+    maze = np.asarray(maze)
+    sources = [tuple(int(v) for v in cell) for cell in sources]
+    targets = [tuple(int(v) for v in cell) for cell in targets]
+    unique = sorted(set(sources))
+
+    # Without targets there is nothing to search, let alone split up
+    if processes and processes > 1 and len(unique) > 1 and targets:
+        chunks = [unique[k::processes] for k in range(processes)]
+        pool = multiprocessing.Pool(processes, _init_batch_worker, (maze, targets))
+        try:
+            solved = {}
+            for part in pool.map(_solve_sources, chunks):
+                solved.update(part)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_batch_worker(maze, targets)
+        solved = _solve_sources(unique)
+
+    distances = np.empty((len(sources), len(targets)))
+    moves = []
+    lengths = []
+    for i, source in enumerate(sources):
+        row, row_moves = solved[source]
+        distances[i] = row
+        moves.extend(row_moves)
+        lengths.extend(len(m) for m in row_moves)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    if moves:
+        moves = np.concatenate(moves)
+    else:
+        moves = np.zeros(0, dtype=np.uint8)
+    return distances, PathBatch(np.array(sources), np.array(targets), moves, offsets)
+
+
+# Per-process state for batch_dijkstra workers
+_batch = {}
+
+# Move code of (dx + 1) * 3 + (dy + 1), matching the order of directions
+_move_codes = np.zeros(9, dtype=np.uint8)
+for _code, (_dx, _dy) in enumerate(directions):
+    _move_codes[(_dx + 1) * 3 + (_dy + 1)] = _code
+
+
+def _init_batch_worker(maze, targets):
+    _batch['planner'] = GridPlanner(maze)
+    _batch['targets'] = targets
+
+
+def _solve_sources(sources):
+    planner, targets = _batch['planner'], _batch['targets']
+    solved = {}
+    for source in sources:
+        results = planner.search_targets(source, targets)
+        row = np.empty(len(targets))
+        row_moves = []
+        for j, target in enumerate(targets):
+            distance, path = results[target]
+            row[j] = distance
+            if len(path) > 1:
+                steps = np.diff(np.array(path), axis=0)
+                row_moves.append(_move_codes[(steps[:, 0] + 1) * 3 + steps[:, 1] + 1])
+            else:
+                row_moves.append(np.zeros(0, dtype=np.uint8))
+        solved[source] = (row, row_moves)
+    return solved
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import math
+import time
+
+CELL_SIZE = 0.15   # metres per maze cell, the step Motion.py walks
+
+
+def path_points(path, cell_size=CELL_SIZE):
+    """
+    Grid path -> [(x, y), ...] in metres, in the frame the robot starts
+    in: origin at path[0], x axis along the first step, y to the left.
+    Rows grow downwards and columns to the right, as in GUI.default_maze.
+    """
+    (r0, c0), (r1, c1) = path[0], path[1]
+    ux, uy = c1 - c0, -(r1 - r0)
+    points = []
+    for r, c in path:
+        dx, dy = c - c0, -(r - r0)
+        points.append(((dx * ux + dy * uy) * cell_size, (ux * dy - uy * dx) * cell_size))
+    return points
+
+
+class PurePursuit(object):
+    """
+    Pure pursuit controller streaming moveToward velocities along a path.
+
+    Every period it reads the robot pose, finds the point lookahead metres
+    further along the path and steers on the arc through it. The forward
+    speed is capped so the turn rate on that arc stays within what NAO can
+    do, which slows the robot down only around corners, and ramps down over
+    the last slowdown metres before the goal. walk_speed and turn_speed are
+    the robot's speeds at moveToward fractions of 1.
+    """
+
+    def __init__(self, lookahead=0.15, max_speed=1.0, min_speed=0.25, slowdown=0.2,
+                 tolerance=0.03, period=0.1, walk_speed=0.1, turn_speed=0.6, timeout=None):
+        self.lookahead = lookahead
+        self.max_speed = max_speed
+        self.min_speed = min_speed
+        self.slowdown = slowdown
+        self.tolerance = tolerance
+        self.period = period
+        self.walk_speed = walk_speed
+        self.turn_speed = turn_speed
+        self.timeout = timeout
+        self.commands = 0
+
+    def follow(self, motion, path, clock=time, should_stop=None):
+        """
+        Walks path (grid cells) assuming the robot stands on path[0] facing
+        path[1]. Returns True once the goal is reached, False if
+        should_stop() asked to stop or the timeout ran out.
+        """
+        if len(path) < 2:
+            return True
+        points = path_points(path)
+        lengths = [0.0]
+        for (ax, ay), (bx, by) in zip(points, points[1:]):
+            lengths.append(lengths[-1] + math.hypot(bx - ax, by - ay))
+        total = lengths[-1]
+        timeout = self.timeout or 10 * (total / (self.min_speed * self.walk_speed) + 10)
+
+        x0, y0, t0 = motion.getRobotPosition(True)
+        c0, s0 = math.cos(t0), math.sin(t0)
+        started = clock.time()
+        segment = 0
+        sent = None
+        reached = False
+        self.commands = 0
+        while True:
+            if should_stop is not None and should_stop():
+                break
+            if clock.time() - started > timeout:
+                break
+            wx, wy, wt = motion.getRobotPosition(True)
+            # Pose in the start frame
+            dx, dy = wx - x0, wy - y0
+            x, y, theta = c0 * dx + s0 * dy, -s0 * dx + c0 * dy, wt - t0
+
+            segment, along = self._project(points, lengths, segment, x, y)
+            gx, gy = points[-1]
+            if total - along < self.tolerance and math.hypot(gx - x, gy - y) < self.tolerance:
+                reached = True
+                break
+
+            lx, ly = self._point_at(points, lengths, along + self.lookahead)
+            # Lookahead point in the robot frame
+            px, py = lx - x, ly - y
+            c, s = math.cos(theta), math.sin(theta)
+            fx, fy = c * px + s * py, -s * px + c * py
+            distance = math.hypot(fx, fy)
+            alpha = math.atan2(fy, fx)
+
+            if abs(alpha) > math.pi / 3 or distance < 1e-6:
+                # Too far off to steer on an arc: turn on the spot first
+                command = (0.0, 0.0, math.copysign(self.max_speed, alpha))
+            else:
+                curvature = 2 * math.sin(alpha) / distance
+                speed = self.max_speed * self.walk_speed
+                if curvature:
+                    speed = min(speed, self.turn_speed / abs(curvature))
+                remaining = total - along
+                if remaining < self.slowdown:
+                    speed *= max(remaining / self.slowdown, self.min_speed)
+                speed = max(speed, self.min_speed * self.walk_speed)
+                command = (speed / self.walk_speed, 0.0,
+                           max(-1.0, min(1.0, speed * curvature / self.turn_speed)))
+
+            if sent is None or max(abs(a - b) for a, b in zip(command, sent)) > 0.05:
+                motion.moveToward(*command)
+                self.commands += 1
+                sent = command
+            clock.sleep(self.period)
+
+        motion.stopMove()
+        self.commands += 1
+        return reached
+
+    def _project(self, points, lengths, segment, x, y):
+        """
+        Closest point to (x, y) on the next few segments from segment on.
+        Returns (segment, arc length of that point); never moves backwards.
+        """
+        best, best_segment, best_along = None, segment, lengths[segment]
+        for k in range(segment, min(segment + 4, len(points) - 1)):
+            (ax, ay), (bx, by) = points[k], points[k + 1]
+            vx, vy = bx - ax, by - ay
+            size = vx * vx + vy * vy
+            u = max(0.0, min(1.0, ((x - ax) * vx + (y - ay) * vy) / size)) if size else 0.0
+            cx, cy = ax + u * vx, ay + u * vy
+            d = (x - cx) ** 2 + (y - cy) ** 2
+            if best is None or d < best:
+                best, best_segment, best_along = d, k, lengths[k] + u * math.sqrt(size)
+        return best_segment, best_along
+
+    def _point_at(self, points, lengths, along):
+        if along >= lengths[-1]:
+            return points[-1]
+        k = 0
+        while lengths[k + 1] < along:
+            k += 1
+        (ax, ay), (bx, by) = points[k], points[k + 1]
+        u = (along - lengths[k]) / (lengths[k + 1] - lengths[k])
+        return ax + u * (bx - ax), ay + u * (by - ay)
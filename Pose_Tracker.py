@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import math
+import threading
+import time
+from Grid_Planner import directions, wrap_angle
+from Path_Follower import CELL_SIZE
+
+
+class GridFrame(object):
+    """
+    Maps grid cells to odometry poses and back for one route: the robot
+    stood on path[0] at origin (x, y, theta) facing path[1].
+    """
+
+    def __init__(self, path, origin, cell_size=CELL_SIZE):
+        (r0, c0), (r1, c1) = path[0], path[1]
+        self.cell0 = (r0, c0)
+        self.origin = origin
+        self.cell_size = cell_size
+        # Grid columns point along x and rows along -y of the map frame;
+        # the map frame is rotated so the first step is the robot's heading
+        self._rotation = origin[2] - math.atan2(-(r1 - r0), c1 - c0)
+
+    def pose_of(self, cell, heading=None):
+        """
+        Odometry (x, y, theta) of a cell centre; theta is the direction of
+        heading (an index into directions), None to leave it out.
+        """
+        mx = (cell[1] - self.cell0[1]) * self.cell_size
+        my = -(cell[0] - self.cell0[0]) * self.cell_size
+        c, s = math.cos(self._rotation), math.sin(self._rotation)
+        x = self.origin[0] + c * mx - s * my
+        y = self.origin[1] + s * mx + c * my
+        theta = None
+        if heading is not None:
+            dx, dy = directions[heading]
+            theta = wrap_angle(math.atan2(-dx, dy) + self._rotation)
+        return x, y, theta
+
+    def cell_of(self, x, y):
+        """
+        Grid cell whose centre is nearest to an odometry position.
+        """
+        c, s = math.cos(self._rotation), math.sin(self._rotation)
+        dx, dy = x - self.origin[0], y - self.origin[1]
+        mx, my = c * dx + s * dy, -s * dx + c * dy
+        return (self.cell0[0] - int(round(my / self.cell_size)),
+                self.cell0[1] + int(round(mx / self.cell_size)))
+
+
+class PoseTracker(object):
+    """
+    Samples ALMotion.getRobotPosition at a fixed rate on its own thread and
+    compares the robot's pose with where the grid route says it should be.
+
+    The motion loop never waits on NAOqi for this: after a move it asks
+    check(cell, heading) and gets back nothing, a small (x, y, theta)
+    correction in the robot frame, or "replan" with the cell the robot is
+    actually nearest to, from the samples already taken. Errors seen at
+    each check are kept for stats().
+    """
+
+    def __init__(self, motion, clock=time, rate=5.0, cell_size=CELL_SIZE,
+                 tolerance=0.03, angle_tolerance=math.radians(5), replan_distance=None):
+        self.motion = motion
+        self.clock = clock
+        self.period = 1.0 / rate
+        self.cell_size = cell_size
+        self.tolerance = tolerance
+        self.angle_tolerance = angle_tolerance
+        self.replan_distance = replan_distance or 0.75 * cell_size
+        self.frame = None
+        self.samples = 0
+        self.corrections = 0
+        self.replans = 0
+        self._errors = []     # (position error, heading error) per check
+        self._latest = None   # (time, pose)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # ---------------- Sampling ----------------
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._sample_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample_loop(self):
+        while self._running:
+            pose = self.motion.getRobotPosition(True)
+            with self._cond:
+                self._latest = (self.clock.time(), pose)
+                self.samples += 1
+                self._cond.notify_all()
+            self.clock.sleep(self.period)
+
+    def latest(self, since=None):
+        """
+        Most recent sampled pose, waiting at most two sampling periods for
+        one taken at or after since (clock time). None if there is none.
+        """
+        with self._cond:
+            deadline = self.clock.time() + 2 * self.period
+            while since is not None and (self._latest is None or self._latest[0] < since):
+                left = deadline - self.clock.time()
+                if left <= 0:
+                    break
+                clock_wait(self.clock, self._cond, left)
+            return None if self._latest is None else self._latest[1]
+
+    # ---------------- Route ----------------
+
+    def begin(self, path, origin=None):
+        """
+        Starts tracking a route; the robot stands on path[0] facing path[1].
+        """
+        if origin is None:
+            origin = self.latest() or self.motion.getRobotPosition(True)
+        self.frame = GridFrame(path, origin, self.cell_size)
+
+    def check(self, cell, heading, since=None):
+        """
+        Compares the latest pose with cell/heading. Returns None if within
+        tolerance, ("correct", (x, y, theta)) with a robot-frame moveTo that
+        puts the robot back, or ("replan", cell) when it is closer to
+        another cell than the expected one.
+        """
+        pose = self.latest(since)
+        if pose is None or self.frame is None:
+            return None
+        x, y, theta = pose
+        ex, ey, etheta = self.frame.pose_of(cell, heading)
+        error = math.hypot(ex - x, ey - y)
+        angle = wrap_angle(etheta - theta)
+        self._errors.append((error, abs(angle)))
+        if error > self.replan_distance:
+            actual = self.frame.cell_of(x, y)
+            if actual != tuple(cell):
+                self.replans += 1
+                return "replan", actual
+        if error <= self.tolerance and abs(angle) <= self.angle_tolerance:
+            return None
+        self.corrections += 1
+        return "correct", self.move_to(cell, heading, pose)
+
+    def move_to(self, cell, heading, pose=None):
+        """
+        Robot-frame (x, y, theta) for moveTo from pose (the latest sample by
+        default) to the centre of cell facing heading.
+        """
+        x, y, theta = pose or self.latest()
+        ex, ey, etheta = self.frame.pose_of(cell, heading)
+        dx, dy = ex - x, ey - y
+        c, s = math.cos(theta), math.sin(theta)
+        return c * dx + s * dy, -s * dx + c * dy, wrap_angle(etheta - theta)
+
+    def stats(self):
+        """
+        Position (m) and heading (rad) error statistics over all checks.
+        """
+        n = len(self._errors)
+        if not n:
+            return {"checks": 0}
+        position = [e for e, a in self._errors]
+        heading = [a for e, a in self._errors]
+        return {
+            "checks": n,
+            "samples": self.samples,
+            "corrections": self.corrections,
+            "replans": self.replans,
+            "mean_error": sum(position) / n,
+            "rms_error": math.sqrt(sum(e * e for e in position) / n),
+            "max_error": max(position),
+            "mean_heading_error": sum(heading) / n,
+            "max_heading_error": max(heading),
+        }
+
+
+def clock_wait(clock, cond, seconds):
+    """
+    cond.wait() for seconds of clock time. Simulated clocks provide their
+    own wait(); any other clock (the time module) runs at wall speed.
+    """
+    wait = getattr(clock, "wait", None)
+    if wait is not None:
+        wait(cond, seconds)
+    else:
+        cond.wait(seconds)
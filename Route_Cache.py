@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+from collections import OrderedDict
+import threading
+import numpy as np
+from Path_Calculation import find_path
+
+_SALT = 0x9E3779B97F4A7C15
+_MASK = 2 ** 64 - 1
+
+
+class MazeFingerprint(object):
+    """
+    Zobrist-style 64-bit fingerprint of a maze.
+
+    Every cell has a fixed random key; the fingerprint is the XOR of one
+    term per cell mixing that key with the cell weight. Changing a cell
+    XORs its old term out and the new one in, so single-cell updates cost
+    O(1) instead of rehashing the whole array.
+    """
+
+    def __init__(self, maze, seed=0):
+        self.maze = np.array(maze)
+        rng = np.random.RandomState(seed)
+        self._keys = rng.randint(0, 2 ** 32, size=self.maze.shape).astype(np.uint64) << np.uint64(32)
+        self._keys |= rng.randint(0, 2 ** 32, size=self.maze.shape).astype(np.uint64)
+        terms = self._terms(self._keys, self.maze)
+        self.value = int(np.bitwise_xor.reduce(terms.ravel())) if terms.size else 0
+
+    @staticmethod
+    def _terms(keys, weights):
+        # uint64 arrays wrap around silently, which is the arithmetic we want
+        bits = np.asarray(weights, dtype=np.float64).view(np.uint64)
+        return keys * ((bits ^ np.uint64(_SALT)) | np.uint64(1))
+
+    @staticmethod
+    def _term(key, weight):
+        bits = int(np.array(weight, dtype=np.float64).view(np.uint64))
+        return (int(key) * ((bits ^ _SALT) | 1)) & _MASK
+
+    def set_cost(self, cell, weight):
+        old = self.maze[cell]
+        if old == weight:
+            return
+        key = self._keys[cell]
+        self.value ^= self._term(key, old) ^ self._term(key, weight)
+        self.maze[cell] = weight
+
+    def sync(self, maze):
+        """
+        Applies every cell that differs between maze and the stored copy.
+        Returns the number of cells changed.
+        """
+        maze = np.asarray(maze)
+        if maze.shape != self.maze.shape:
+            self.__init__(maze)
+            return maze.size
+        changed = np.argwhere(maze != self.maze)
+        for x, y in changed:
+            self.set_cost((int(x), int(y)), maze[x, y])
+        return len(changed)
+
+
+class RouteCache(object):
+    """
+    Bounded LRU cache of (distance, path) keyed by maze fingerprint and
+    (start, end).
+
+    A route is only reused while the maze has exactly the weights it was
+    planned on; after a change the fingerprint moves on and old entries
+    simply age out (or hit again if the weights change back). solver is
+    called as solver(maze, start, end) on a miss and defaults to
+    Path_Calculation.find_path.
+
+    One cache may be shared between threads (the speech callback, the
+    navigation thread and the motion executor): lookups, updates and the
+    solver calls on a miss are serialized by a lock, so the solver never
+    runs concurrently with itself or with a weight change.
+    """
+
+    def __init__(self, maze, capacity=256, solver=None):
+        self.fingerprint = MazeFingerprint(maze)
+        self.capacity = capacity
+        self.solver = solver or find_path
+        self._routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._routes)
+
+    @property
+    def maze(self):
+        return self.fingerprint.maze
+
+    def set_cost(self, cell, weight):
+        with self._lock:
+            self.fingerprint.set_cost(cell, weight)
+
+    def sync(self, maze):
+        """
+        Catches up with a maze that was changed without set_cost. This
+        compares every cell, so it costs a full pass over the map.
+        """
+        with self._lock:
+            self.fingerprint.sync(maze)
+
+    def route(self, start, end, maze=None):
+        """
+        Returns (distance, path) from start to end, syncing with maze first
+        if one is given. Owners that pass every change through set_cost
+        (e.g. as a Costmap listener) should leave maze out: a hit then
+        costs a dictionary lookup instead of a scan of the whole map.
+        """
+        start = (int(start[0]), int(start[1]))
+        end = (int(end[0]), int(end[1]))
+        with self._lock:
+            if maze is not None:
+                self.fingerprint.sync(maze)
+            key = (self.fingerprint.value, start, end)
+            routes = self._routes
+            entry = routes.pop(key, None)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry = self.solver(self.fingerprint.maze, start, end)
+                if len(routes) >= self.capacity:
+                    routes.popitem(last=False)
+            routes[key] = entry
+        distance, path = entry
+        return distance, list(path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._routes),
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
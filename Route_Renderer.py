@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import threading
+import time
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+class RouteRenderer(object):
+    """
+    Draws routes off the navigation thread.
+
+    submit() only stores the latest route and returns; a background thread
+    draws at most rate frames per second, always the newest route, into one
+    reused Agg figure (no window, works headless) and writes it to output
+    as PNG. The last frame is kept as an RGB array in frame. labels are
+    (text, (row, col)) pairs drawn with the cell weight, as the old
+    Navigation window did.
+    """
+
+    def __init__(self, output="route.png", rate=2.0, labels=(), size=6, dpi=80):
+        self.output = output
+        self.period = 1.0 / rate
+        self.labels = list(labels)
+        self.frame = None
+        self.rendered = 0
+        self.dropped = 0
+        self._figure = Figure(figsize=(size, size), dpi=dpi)
+        self._canvas = FigureCanvasAgg(self._figure)
+        self._axes = self._figure.add_subplot(111)
+        self._image = None
+        self._line = None
+        self._texts = []
+        self._pending = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # ---------------- Background drawing ----------------
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._draw_loop)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, maze, path, start, end, distance):
+        """
+        Queues a route for drawing; a route not drawn yet is replaced.
+        """
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (maze, list(path), start, end, distance)
+            self._cond.notify()
+
+    def _draw_loop(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job, self._pending = self._pending, None
+            t0 = time.time()
+            try:
+                self.render(*job)
+                if self.output:
+                    self._canvas.print_png(self.output)
+            except Exception as e:
+                print("[Render] Failed:", str(e))
+            time.sleep(max(0.0, self.period - (time.time() - t0)))
+
+    # ---------------- Drawing ----------------
+
+    def render(self, maze, path, start, end, distance):
+        """
+        Draws one route into the figure and returns it as an RGB array.
+        """
+        maze = np.asarray(maze)
+        visual = np.where(maze == 0, -1, maze)
+        ax = self._axes
+        if self._image is None or self._image.get_array().shape != visual.shape:
+            ax.clear()
+            self._image = ax.imshow(visual, cmap="gray_r", interpolation="nearest")
+            self._line, = ax.plot([], [], color="red", linewidth=2)
+            ax.grid(True, color="lightgray")
+        else:
+            self._image.set_data(visual)
+        self._image.set_clim(visual.min(), visual.max())
+        self._line.set_data([y for x, y in path], [x for x, y in path])
+
+        for text in self._texts:
+            text.remove()
+        self._texts = [
+            ax.text(start[1], start[0] + 0.2, "Start", va="top", ha="center", color="yellow", fontsize=12),
+            ax.text(end[1], end[0] + 0.2, "End", va="top", ha="center", color="red", fontsize=12),
+        ]
+        for name, (x, y) in self.labels:
+            if 0 <= x < maze.shape[0] and 0 <= y < maze.shape[1]:
+                self._texts.append(ax.text(y, x, "%s:%s" % (name, maze[x, y]), va="center",
+                                           ha="center", color="grey", fontsize=10))
+        ax.set_title("Shortest Path (Distance: %s)" % distance)
+
+        self._canvas.draw()
+        width, height = self._canvas.get_width_height()
+        rgba = np.frombuffer(self._canvas.buffer_rgba(), dtype=np.uint8).reshape(height, width, 4)
+        if self.frame is None or self.frame.shape != (height, width, 3):
+            self.frame = np.empty((height, width, 3), dtype=np.uint8)
+        self.frame[...] = rgba[:, :, :3]
+        self.rendered += 1
+        return self.frame
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+from Grid_Planner import GridPlanner, INF
+
+
+class RouteTable(object):
+    """
+    Precomputed (distance, path) for every pair of departments.
+
+    Each department is the source of one multi-target Dijkstra run that
+    fills its whole row of the table. When a cell weight changes, a row is
+    only marked stale if one of its routes can actually be affected:
+
+    - a cell got more expensive (or became a wall): rows with a stored
+      path through that cell;
+    - a cell got cheaper (or was opened): rows where the cell can now be
+      reached more cheaply and a route through it could beat the stored
+      distance, using the Manhattan lower bound for the rest of the way.
+
+    Stale rows are recomputed lazily on the next lookup.
+    """
+
+    def __init__(self, maze, departments):
+        self.maze = np.array(maze)
+        self.planner = GridPlanner(self.maze)
+        self.coords = [coord for num, (name, coord) in sorted(departments.items())]
+        self._integral = self.maze.dtype.kind in 'iub'
+        self._routes = {}   # (start, end) -> (distance, path)
+        self._fields = {}   # start -> settled distances of the last row search
+        self._stale = set(self.coords)
+        # Rows whose field may overestimate distances after a cheaper cell
+        self._loose = set()
+        self.recomputed = 0
+
+    def __contains__(self, pair):
+        start, end = pair
+        return start in self.coords and end in self.coords
+
+    def route(self, start, end):
+        """
+        Returns (distance, path) like Path_Calculation.dijkstra.
+        """
+        if start in self._stale:
+            self._refresh(start)
+        return self._routes[(start, end)]
+
+    def _refresh(self, start):
+        results = self.planner.search_targets(start, self.coords)
+        for end, (distance, path) in results.items():
+            if distance == -1:
+                self._routes[(start, end)] = (-1, [end])
+            else:
+                if self._integral:
+                    distance = int(distance)
+                self._routes[(start, end)] = (distance, path)
+        self._fields[start] = self.planner.settled_distances()
+        self._stale.discard(start)
+        self._loose.discard(start)
+        self.recomputed += 1
+
+    # ---------------- Updates ----------------
+
+    def sync(self, maze):
+        """
+        Applies every cell that differs between maze and the table's copy,
+        e.g. a new map returned by GUI.get_updated_maze().
+        """
+        maze = np.asarray(maze)
+        if maze.shape != self.maze.shape:
+            raise ValueError("maze shape changed from %s to %s" % (self.maze.shape, maze.shape))
+        for x, y in np.argwhere(maze != self.maze):
+            self.set_cost((int(x), int(y)), maze[x, y])
+
+    def set_cost(self, cell, weight):
+        """
+        Changes one cell weight (0 = wall) and marks the affected rows stale.
+        """
+        old = self.maze[cell]
+        if old == weight:
+            return
+        self.maze[cell] = weight
+        self.planner.set_cost(cell, weight)
+
+        worse = weight == 0 or (old != 0 and weight > old)
+        for start in self.coords:
+            if start in self._stale:
+                continue
+            if worse:
+                affected = self._uses_cell(start, cell)
+            else:
+                affected = self._may_improve(start, cell, weight)
+            if affected:
+                self._stale.add(start)
+
+    def _uses_cell(self, start, cell):
+        for end in self.coords:
+            distance, path = self._routes[(start, end)]
+            if distance != -1 and cell in path[1:]:
+                return True
+        return False
+
+    def _may_improve(self, start, cell, weight):
+        if start in self._loose:
+            return True
+        field = self._fields[start]
+        x, y = cell
+        reach = INF
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < field.shape[0] and 0 <= ny < field.shape[1]:
+                reach = min(reach, field[nx, ny])
+        reach += weight
+
+        h_scale = self.planner.h_scale
+        for end in self.coords:
+            distance = self._routes[(start, end)][0]
+            bound = reach + h_scale * (abs(x - end[0]) + abs(y - end[1]))
+            if distance == -1 or bound < distance:
+                return True
+        if reach < field[x, y]:
+            # No route improves, but the field beyond the cell is now too high
+            self._loose.add(start)
+        return False
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+class SonarFilter(object):
+    """
+    Obstacle decision over a stream of (time, left, right) sonar rows.
+
+    Each sensor goes through a trailing Hampel filter: a reading further
+    than n_sigmas robust standard deviations (at least min_deviation
+    metres) from the median of the last window readings is an echo
+    artefact and is replaced by that median. The approach velocity is the
+    least-squares slope of the closer filtered sensor over the same
+    window. The path counts as blocked when the filtered distance is
+    under threshold, or will be within lookahead seconds at the current
+    approach speed.
+
+    Everything is computed for whole arrays at once, so a recorded trace
+    is filtered in one call and the live check reuses the same code on the
+    last few rows.
+    """
+
+    def __init__(self, window=5, n_sigmas=3.0, min_deviation=0.05, threshold=0.5, lookahead=0.3):
+        self.window = window
+        self.n_sigmas = n_sigmas
+        self.min_deviation = min_deviation
+        self.threshold = threshold
+        self.lookahead = lookahead
+
+    def hampel(self, values):
+        """
+        Filtered copy of a 1-D array of readings.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        windows = _trailing(values, self.window)
+        median = np.median(windows, axis=1)
+        mad = 1.4826 * np.median(np.abs(windows - median[:, None]), axis=1)
+        limit = np.maximum(self.n_sigmas * mad, self.min_deviation)
+        return np.where(np.abs(values - median) > limit, median, values)
+
+    def distance(self, rows):
+        """
+        Filtered distance to the closer obstacle for every row.
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        return np.minimum(self.hampel(rows[:, 1]), self.hampel(rows[:, 2]))
+
+    def velocity(self, times, distances):
+        """
+        Approach velocity (m/s, negative when closing in) at every sample,
+        from a least-squares line through the trailing window.
+        """
+        t = _trailing(np.asarray(times, dtype=np.float64), self.window)
+        d = _trailing(np.asarray(distances, dtype=np.float64), self.window)
+        t = t - t.mean(axis=1)[:, None]
+        d = d - d.mean(axis=1)[:, None]
+        spread = (t * t).sum(axis=1)
+        slope = (t * d).sum(axis=1)
+        return np.where(spread > 0, slope / np.where(spread > 0, spread, 1), 0.0)
+
+    def detect(self, rows):
+        """
+        Blocked flag for every row of an (n, 3) array of time, left, right.
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if not len(rows):
+            return np.zeros(0, dtype=bool)
+        distance = self.distance(rows)
+        velocity = self.velocity(rows[:, 0], distance)
+        ahead = distance + np.minimum(velocity, 0.0) * self.lookahead
+        return (distance < self.threshold) | (ahead < self.threshold)
+
+    def blocked(self, rows):
+        """
+        Decision for the newest of the rows; only the last 2 * window rows
+        are looked at.
+        """
+        rows = np.asarray(rows)[-2 * self.window:]
+        return bool(len(rows)) and bool(self.detect(rows)[-1])
+
+
+def _trailing(values, size):
+    """
+    (n, size) view of the trailing window ending at every sample; the
+    first samples repeat the first value.
+    """
+    padded = np.concatenate((np.repeat(values[:1], size - 1), values))
+    stride = padded.strides[0]
+    return as_strided(padded, shape=(len(values), size), strides=(stride, stride))
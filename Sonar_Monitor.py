@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import threading
+import time
+import numpy as np
+from Pose_Tracker import clock_wait
+from Sonar_Filter import SonarFilter
+
+SONAR_LEFT = "Device/SubDeviceList/US/Left/Sensor/Value"
+SONAR_RIGHT = "Device/SubDeviceList/US/Right/Sensor/Value"
+
+
+class SonarMonitor(object):
+    """
+    Samples both sonars at a fixed rate on its own thread, one getListData
+    round trip per sample, into a fixed-size ring buffer of
+    (time, left, right) rows.
+
+    The motion layer reads blocked / status() without touching NAOqi and
+    can wait_clear() for an obstacle to leave: the robot resumes as soon
+    as the path is clear again instead of after a fixed pause. With a
+    Sonar_Filter.SonarFilter the decision is made on the filtered stream
+    instead of the raw newest reading.
+    """
+
+    def __init__(self, memory, clock=time, rate=10.0, size=256, threshold=0.5, sonar_filter=None):
+        self.memory = memory
+        self.clock = clock
+        self.period = 1.0 / rate
+        self.threshold = threshold
+        self.sonar_filter = sonar_filter
+        self._buffer = np.zeros((size, 3))
+        self._count = 0   # readings taken so far
+        self._blocked = False
+        self._changed_at = None   # clock time of the last clear/blocked change
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # ---------------- Sampling ----------------
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._sample_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample_loop(self):
+        while self._running:
+            try:
+                left, right = self.memory.getListData([SONAR_LEFT, SONAR_RIGHT])
+            except Exception as e:
+                print("[Sonar] Read failed:", str(e))
+            else:
+                self.add(self.clock.time(), left, right)
+            self.clock.sleep(self.period)
+
+    def add(self, t, left, right):
+        """
+        Stores one reading and updates the clear/blocked state.
+        """
+        with self._cond:
+            self._buffer[self._count % len(self._buffer)] = (t, left, right)
+            self._count += 1
+            blocked = self._is_blocked()
+            if blocked != self._blocked or self._changed_at is None:
+                self._blocked = blocked
+                self._changed_at = t
+            self._cond.notify_all()
+
+    def _is_blocked(self):
+        if self.sonar_filter is not None:
+            return self.sonar_filter.blocked(self.window(2 * self.sonar_filter.window))
+        t, left, right = self._newest()
+        return min(left, right) < self.threshold
+
+    def _newest(self):
+        return self._buffer[(self._count - 1) % len(self._buffer)]
+
+    # ---------------- State ----------------
+
+    def __len__(self):
+        return min(self._count, len(self._buffer))
+
+    @property
+    def samples(self):
+        return self._count
+
+    def window(self, n=None):
+        """
+        The last n readings (all buffered ones by default) as an
+        (n, 3) array of time, left, right, oldest first.
+        """
+        with self._cond:
+            size = len(self._buffer)
+            n = min(n or size, self._count, size)
+            end = self._count % size
+            if n <= end:
+                return self._buffer[end - n:end].copy()
+            return np.concatenate((self._buffer[size - (n - end):], self._buffer[:end]))
+
+    def latest(self, since=None, filtered=False):
+        """
+        Newest (time, left, right) reading, waiting at most two sampling
+        periods for one taken at or after since (clock time). None if
+        there is none. With filtered, left and right are what the
+        sonar_filter's Hampel filter (a default SonarFilter if the monitor
+        has none) makes of the newest readings, so a lone echo reads as
+        the distance around it.
+        """
+        with self._cond:
+            deadline = self.clock.time() + 2 * self.period
+            while since is not None and (not self._count or self._newest()[0] < since):
+                left = deadline - self.clock.time()
+                if left <= 0:
+                    break
+                clock_wait(self.clock, self._cond, left)
+            if not self._count:
+                return None
+            t, left, right = self._newest()
+            if filtered:
+                sonar_filter = self.sonar_filter or SonarFilter()
+                rows = self.window(2 * sonar_filter.window)
+                left = sonar_filter.hampel(rows[:, 1])[-1]
+                right = sonar_filter.hampel(rows[:, 2])[-1]
+            return float(t), float(left), float(right)
+
+    @property
+    def blocked(self):
+        return self._blocked
+
+    def status(self):
+        """
+        ("blocked" or "clear", clock time it became so); ("unknown", None)
+        before the first reading.
+        """
+        with self._cond:
+            if self._changed_at is None:
+                return "unknown", None
+            return ("blocked" if self._blocked else "clear"), self._changed_at
+
+    def wait_clear(self, timeout=None):
+        """
+        Waits until the path is clear, at most timeout seconds of clock
+        time. Returns the time it cleared, or None if it is still blocked.
+        """
+        deadline = None if timeout is None else self.clock.time() + timeout
+        with self._cond:
+            while self._blocked:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                left = deadline - self.clock.time()
+                if left <= 0:
+                    return None
+                clock_wait(self.clock, self._cond, min(left, self.period))
+            if self._changed_at is None:
+                return self.clock.time()
+            return self._changed_at
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import heapq
+from Grid_Planner import GridPlanner, INF, OPPOSITE, directions
+
+
+class TimeModel(object):
+    """
+    Walking-time model for the motion commands in Motion.py.
+
+    step_time is the time of one 0.15 m moveTo including the start and
+    stop of the walk, turn_time the time of one 90 degree moveTo; a U-turn
+    counts as two. Entering a cell takes step_time times its maze weight,
+    so department weights slow the robot down the same way they lengthen
+    a dijkstra route. The defaults are rough figures for NAO at the walk
+    settings Motion.py uses.
+    """
+
+    def __init__(self, step_time=2.5, turn_time=3.5):
+        self.step_time = step_time
+        self.turn_time = turn_time
+
+    def turn_cost(self, heading, new_heading):
+        if heading == new_heading:
+            return 0.0
+        if OPPOSITE[heading] == new_heading:
+            return 2 * self.turn_time
+        return self.turn_time
+
+    def route_time(self, maze, path, start_heading=None):
+        """
+        Predicted time to walk path. Without start_heading the robot is
+        assumed to already face its first step, as Motion.py does.
+        """
+        total = 0.0
+        heading = start_heading
+        for (x0, y0), (x1, y1) in zip(path, path[1:]):
+            new_heading = directions.index((x1 - x0, y1 - y0))
+            if heading is not None:
+                total += self.turn_cost(heading, new_heading)
+            total += self.step_time * maze[x1][y1]
+            heading = new_heading
+        return total
+
+
+class TurnAwarePlanner(GridPlanner):
+    """
+    Planner whose search state is (cell, heading), so turns cost time.
+
+    fastest() minimizes the walking time predicted by a TimeModel instead
+    of the sum of cell weights, which avoids the zig-zag routes dijkstra
+    picks when several paths have the same length.
+    """
+
+    def __init__(self, maze, model=None):
+        GridPlanner.__init__(self, maze)
+        self.model = model or TimeModel()
+
+    def fastest(self, start, end, start_heading=None):
+        """
+        Returns (time, path) from start to end, or (-1, []) if the end
+        cannot be reached. start_heading is an index into directions, or
+        None if the robot can start facing any way.
+        """
+        model = self.model
+        s = self.index(start)
+        e = self.index(end)
+        width = self.width
+        ex, ey = divmod(e, width)
+        flat, offsets = self._flat, self._offsets
+        step_time = model.step_time
+        turn = [[model.turn_cost(h, d) for d in range(4)] for h in range(4)]
+        scale = step_time * self.h_scale
+
+        size = 4 * len(flat)
+        dist = [INF] * size
+        prev = [-1] * size
+        closed = bytearray(size)
+        heap = []
+        headings = range(4) if start_heading is None else [start_heading]
+        for h in headings:
+            dist[4 * s + h] = 0.0
+            heap.append((0.0, 4 * s + h))
+        heapq.heapify(heap)
+
+        heappush, heappop = heapq.heappush, heapq.heappop
+        goal_state = -1
+        expanded = 0
+        while heap:
+            _, state = heappop(heap)
+            if closed[state]:
+                continue
+            closed[state] = 1
+            expanded += 1
+            i, h = divmod(state, 4)
+            if i == e:
+                goal_state = state
+                break
+
+            g = dist[state]
+            turns = turn[h]
+            for d in range(4):
+                j = i + offsets[d]
+                c = flat[j]
+                if not c:
+                    continue
+                nxt = 4 * j + d
+                if closed[nxt]:
+                    continue
+                nd = g + turns[d] + step_time * c
+                if nd < dist[nxt]:
+                    dist[nxt] = nd
+                    prev[nxt] = state
+                    jx, jy = divmod(j, width)
+                    heappush(heap, (nd + scale * (abs(jx - ex) + abs(jy - ey)), nxt))
+
+        self.expanded = expanded
+        if goal_state == -1:
+            return -1, []
+        path = []
+        state = goal_state
+        while state != -1:
+            path.append(self.cell(state // 4))
+            state = prev[state]
+        path.reverse()
+        return dist[goal_state], path
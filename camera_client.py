@@ -1,18 +1,20 @@
 import cv2
 import socket
-import struct
-import pickle
-import threading
-import time
 
 # 如果你用 Keras/TensorFlow
 from tensorflow.keras.models import load_model
 import numpy as np
+from Frame_Protocol import FrameSender
+from Frame_Ring import FrameRing, ring_path
+from Camera_Service import CameraService
 
 # 配置
 SERVER_IP = '127.0.0.1'
 FRAME_PORT = 8000       # 原来的视频帧端口
 EXPR_PORT = 8001        # 新增的表情标签端口
+EXPR_RATE = 2           # 表情识别每秒最多 2 次
+STREAM_RATE = None      # 视频帧按摄像头原生帧率发送
+MAX_FAILED_READS = 100  # 连续读帧失败这么多次（约 1 秒无画面）才退出
 
 # 加载人脸检测 & 表情识别模型
 face_cascade = cv2.CascadeClassifier(
@@ -22,7 +24,7 @@ expr_model = load_model('expression_model.h5')    # 请将模型文件放在同
 expr_labels = ['angry','disgust','fear','happy','sad','surprise','neutral']
 
 def recognize_expression(face_img):
-    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    gray = face_img if face_img.ndim == 2 else cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
     resized = cv2.resize(gray, (48, 48))
     normalized = resized.astype('float32') / 255.0
     input_data = normalized.reshape(1, 48, 48, 1)
@@ -30,57 +32,75 @@ def recognize_expression(face_img):
     return expr_labels[np.argmax(preds)]
 
 def main():
-    # 连接视频帧通道
-    frame_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    frame_sock.connect((SERVER_IP, FRAME_PORT))
+    # 同机运行时（设置了 $NAO_FRAME_RING）走共享内存环形缓冲，否则走 TCP
+    ring_file = ring_path()
+    ring = None
+    frame_sock = sender = None
+    if not ring_file:
+        # 连接视频帧通道
+        frame_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        frame_sock.connect((SERVER_IP, FRAME_PORT))
+        sender = FrameSender(frame_sock)
     # 新增：连接表情标签通道
     expr_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     expr_sock.connect((SERVER_IP, EXPR_PORT))
 
-    # 打开摄像头
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    if not cap.isOpened():
+    # 摄像头只由采集服务打开一次，识别、发送、本地展示各自按自己的帧率取帧
+    camera = CameraService(0, api=cv2.CAP_DSHOW)
+
+    def recognize(gray):
+        # —— 新增：表情识别（灰度图每帧只转换一次）
+        faces = face_cascade.detectMultiScale(gray, 1.1, 5)
+        if len(faces) > 0:
+            x, y, w, h = faces[0]
+            expr_label = recognize_expression(gray[y:y+h, x:x+w])
+            # 发送表情标签
+            expr_sock.sendall(expr_label.encode('utf-8'))
+
+    def stream(frame):
+        nonlocal ring
+        # —— 原有：发送视频帧
+        if ring_file:
+            if ring is None:
+                ring = FrameRing.create(ring_file, frame.nbytes)
+            ring.write(frame)
+        else:
+            try:
+                sender.send_image(frame)
+            except ValueError:
+                pass
+
+    try:
+        camera.start()
+    except IOError:
         print("[Client] Cannot open camera")
         return
+    camera.subscribe("expression", recognize, rate=EXPR_RATE, gray=True)
+    camera.subscribe("stream", stream, rate=STREAM_RATE)
+    preview = camera.subscribe("preview")
 
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # —— 新增：表情识别（节流，每秒最多 2 次）
-            start_ts = time.time()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 5)
-            if len(faces) > 0:
-                x, y, w, h = faces[0]
-                face_roi = frame[y:y+h, x:x+w]
-                expr_label = recognize_expression(face_roi)
-                # 发送表情标签
-                expr_sock.sendall(expr_label.encode('utf-8'))
-
-            # —— 原有：发送视频帧
-            ret2, buffer = cv2.imencode('.jpg', frame)
-            if not ret2:
+            got = preview.get(timeout=1.0)
+            if got is None:
+                # 偶尔读帧失败不退出，只有摄像头持续无画面才退出
+                if camera.failing >= MAX_FAILED_READS:
+                    print("[Client] Camera stopped delivering frames")
+                    break
                 continue
-            data = pickle.dumps(buffer)
-            message_size = struct.pack("!L", len(data))
-            frame_sock.sendall(message_size + data)
+            seq, timestamp, frame = got
 
             # 本地展示
             cv2.imshow("Client - Captured Frame", frame)
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
-            # 控制识别频率
-            elapsed = time.time() - start_ts
-            if elapsed < 0.5:
-                time.sleep(0.5 - elapsed)
-
     finally:
-        cap.release()
-        frame_sock.close()
+        camera.close()
+        if ring is not None:
+            ring.close()
+        if frame_sock is not None:
+            frame_sock.close()
         expr_sock.close()
         cv2.destroyAllWindows()
 
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import time
+import numpy as np
+import pytest
+from Camera_Service import CameraService
+from Frame_Protocol import CODEC_RAW, FrameHeader, VERSION
+
+
+def _raw_frame(image, seq=1):
+    header = FrameHeader(VERSION, CODEC_RAW, image.shape[2], image.shape[1], image.shape[0],
+                         image.nbytes, seq, 0.0)
+    return header, image.reshape(-1).copy()
+
+
+def test_raw_frame_colour_view():
+    image = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    frame = CameraService().publish_encoded(*_raw_frame(image))
+    assert (frame.view() == image).all()
+
+
+def test_raw_frame_gray_view():
+    cv2 = pytest.importorskip("cv2")
+    image = np.random.RandomState(0).randint(0, 256, (4, 6, 3)).astype(np.uint8)
+    frame = CameraService().publish_encoded(*_raw_frame(image))
+    gray = frame.view(gray=True)
+    assert gray.shape == (4, 6)
+    assert (gray == cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)).all()
+    assert frame.view((3, 2), gray=True).shape == (2, 3)
+
+
+class _FlakyCamera(object):
+    # Fails the reads listed in failures, gives a small frame otherwise
+    def __init__(self, failures):
+        self.failures = set(failures)
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        if self.reads in self.failures:
+            return False, None
+        return True, np.zeros((2, 2, 3), dtype=np.uint8)
+
+
+def test_failing_resets_after_a_good_frame():
+    camera = _FlakyCamera([2, 3])
+    service = CameraService(camera).start()
+    try:
+        while camera.reads < 10:
+            time.sleep(0.01)
+    finally:
+        service.close()
+    assert service.failed == 2
+    assert service.failing == 0
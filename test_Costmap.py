@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+import Motion
+from Costmap import Costmap
+from Motion_Executor import MotionExecutor
+from Nao_Simulator import SimRobot
+from Pose_Tracker import GridFrame
+from Route_Cache import RouteCache
+from Sonar_Filter import SonarFilter
+from Sonar_Monitor import SonarMonitor
+
+
+def test_sonar_hit_changes_next_route():
+    maze = np.ones((9, 9), dtype=int)
+    robot = SimRobot(speed=100)
+    Motion.use_proxies(robot.motion, robot.posture, robot.memory, robot.clock)
+    costmap = Costmap(maze, hit_cost=20, clock=robot.clock)
+    cache = RouteCache(maze)
+    costmap.listeners.append(cache)
+    monitor = SonarMonitor(robot.memory, robot.clock)
+    executor = MotionExecutor(router=cache.route, monitor=monitor, costmap=costmap, about_face=False)
+
+    # Someone stands off to the right of a short walk east along row 4
+    path = [(4, 0), (4, 1), (4, 2)]
+    x, y, _ = GridFrame(path, (0.0, 0.0, 0.0)).pose_of((6, 3))
+    robot.memory.add_obstacle(x, y)
+    monitor.start()
+    try:
+        task = executor.run(path)
+        assert task.wait(30)
+        assert task.state == "done"
+    finally:
+        executor.shutdown()
+        monitor.stop()
+
+    hits = [tuple(int(v) for v in cell) for cell in np.argwhere(costmap.costs != maze)]
+    assert hits
+    row, col = hits[0]
+    start, end = (row, 0), (row, 8)
+    # Straight along the row is the only cheapest route on the bare floor
+    assert (row, col) in cache.solver(maze, start, end)[1]
+    distance, route = cache.route(start, end)
+    assert (row, col) not in route
+    assert distance == 10
+
+
+def test_lone_echo_does_not_mark_a_cell():
+    maze = np.ones((9, 9), dtype=int)
+    robot = SimRobot(speed=None)
+    Motion.use_proxies(robot.motion, robot.posture, robot.memory, robot.clock)
+    costmap = Costmap(maze, clock=robot.clock)
+    monitor = SonarMonitor(robot.memory, robot.clock, sonar_filter=SonarFilter())
+    executor = MotionExecutor(monitor=monitor, costmap=costmap)
+    frame = GridFrame([(4, 0), (4, 1), (4, 2)], (0.0, 0.0, 0.0))
+    for k in range(5):
+        monitor.add(0.0, 2.55, 2.55)
+    monitor.add(0.0, 0.4, 2.55)
+    executor._observe(frame, (0.0, 0.0, 0.0))
+    assert (costmap.costs == maze).all()
+
+    # An obstacle that stays is marked
+    monitor.add(0.0, 0.4, 2.55)
+    monitor.add(0.0, 0.4, 2.55)
+    executor._observe(frame, (0.0, 0.0, 0.0))
+    assert (costmap.costs != maze).any()
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+from Distance_Field import DistanceFields
+import Path_Calculation
+
+
+def test_matches_dijkstra_from_any_cell():
+    rng = np.random.RandomState(3)
+    for trial in range(5):
+        maze = rng.randint(1, 5, (12, 12))
+        maze[rng.rand(12, 12) < 0.3] = 0
+        departments = dict((k, ("dept%d" % k, (int(rng.randint(12)), int(rng.randint(12)))))
+                           for k in range(1, 4))
+        fields = DistanceFields(maze, departments)
+        for name, dest in departments.values():
+            for x in range(12):
+                for y in range(12):
+                    distance, path = fields.path_to((x, y), dest)
+                    exact = Path_Calculation.dijkstra(maze, (x, y), dest)[0]
+                    assert distance == exact
+                    if distance != -1:
+                        assert path[0] == (x, y) and path[-1] == dest
+                        assert sum(maze[cell] for cell in path[1:]) == distance
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from Camera_Service import BufferPool, CameraService
+from Frame_Ring import FrameRing
+
+
+def _pump_to_slow_subscriber(service, frames=200, hold=0.02):
+    # A writer lapping the ring, frames pumped into service the way
+    # PCCameraReceiver._ring_loop does, and a subscriber that holds every
+    # frame while many more go through the ring and the pool
+    shape = (48, 64, 3)
+    folder = tempfile.mkdtemp()
+    ring = FrameRing.create(os.path.join(folder, "ring"), slot_size=int(np.prod(shape)), slots=4)
+    bad = []
+    seen = []
+
+    def slow(image):
+        value = int(image.flat[0])
+        if image.min() != value or image.max() != value:
+            bad.append(value)
+        time.sleep(hold)
+        if image.min() != value or image.max() != value:
+            bad.append(value)
+        seen.append(value)
+
+    consumer = service.subscribe("slow", callback=slow)
+    running = [True]
+
+    def produce():
+        n = 0
+        while running[0]:
+            n += 1
+            ring.write(np.full(shape, n % 251, dtype=np.uint8))
+
+    writer = threading.Thread(target=produce)
+    writer.start()
+    try:
+        seq = 0
+        for k in range(frames):
+            got = ring.receive(seq, timeout=1.0, alloc=service.pool.get)
+            assert got is not None
+            seq, timestamp, frame = got
+            assert frame.min() == frame.max() == seq % 251
+            service.publish(frame, timestamp, seq)
+    finally:
+        running[0] = False
+        writer.join()
+        consumer.close()
+        ring.close()
+        shutil.rmtree(folder)
+    return seen, bad
+
+
+def test_slow_subscriber_never_sees_a_mixed_frame():
+    # The default pool, as PCCameraReceiver has it
+    seen, bad = _pump_to_slow_subscriber(CameraService())
+    assert seen
+    assert not bad
+
+
+def test_shallow_pool_does_not_overwrite_held_frames():
+    seen, bad = _pump_to_slow_subscriber(CameraService(pool=BufferPool(depth=2)))
+    assert seen
+    assert not bad
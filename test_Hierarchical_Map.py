@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import numpy as np
+from Floor_Map import DEFAULT_MAZE, DEFAULT_DEPARTMENTS
+from Grid_Planner import GridPlanner
+from Hierarchical_Map import HierarchicalMap
+import Path_Calculation
+
+
+def test_single_cluster_map():
+    # The 8x8 default floor fits one 16-cell cluster: no entrances at all
+    hmap = HierarchicalMap(DEFAULT_MAZE, departments=DEFAULT_DEPARTMENTS)
+    for a in DEFAULT_DEPARTMENTS:
+        for b in DEFAULT_DEPARTMENTS:
+            start, end = DEFAULT_DEPARTMENTS[a][1], DEFAULT_DEPARTMENTS[b][1]
+            distance, path = hmap.dijkstra(start, end)
+            assert distance == Path_Calculation.dijkstra(DEFAULT_MAZE, start, end)[0]
+            assert path[0] == start and path[-1] == end
+
+
+def test_unreachable_in_single_cluster():
+    maze = np.array(DEFAULT_MAZE)
+    maze[1, 2] = 0   # cuts the internal department off
+    assert HierarchicalMap(maze).dijkstra((0, 6), (7, 6)) == (-1, [(7, 6)])
+
+
+def test_multi_cluster_matches_dijkstra():
+    maze = np.ones((32, 32), dtype=int)
+    maze[8, :28] = 0
+    maze[20, 4:] = 0
+    maze[10:20, 16] = 3
+    hmap = HierarchicalMap(maze, cluster_size=8)
+    distance, path = hmap.dijkstra((0, 6), (31, 30))
+    exact = Path_Calculation.dijkstra(maze, (0, 6), (31, 30))[0]
+    assert exact <= distance < 1.5 * exact
+    assert sum(maze[cell] for cell in path[1:]) == distance
+
+
+def test_search_targets_without_targets():
+    assert GridPlanner(DEFAULT_MAZE).search_targets((0, 6), []) == {}
+
+
+def test_connector_used_from_either_end():
+    maze = np.ones((64, 64), dtype=int)
+    for link in [((0, 0), (63, 63), 1), ((63, 63), (0, 0), 1)]:
+        hmap = HierarchicalMap(maze, connectors=[link])
+        a, b, cost = link
+        for start, end in [((62, 63), (1, 0)), ((60, 50), (3, 10)), ((5, 5), (60, 60))]:
+            exact = min(Path_Calculation.dijkstra(maze, start, end)[0],
+                        Path_Calculation.dijkstra(maze, start, a)[0] + cost + Path_Calculation.dijkstra(maze, b, end)[0],
+                        Path_Calculation.dijkstra(maze, start, b)[0] + cost + Path_Calculation.dijkstra(maze, a, end)[0])
+            distance, path = hmap.dijkstra(start, end)
+            assert distance == exact
+            assert path[0] == start and path[-1] == end
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import math
+from Benchmark_Navigation import run_route
+from Motion_Plan import compile_path
+from Path_Follower import path_points
+
+
+def test_poses_are_relative_to_the_start():
+    path = [(4, 0), (4, 1), (4, 2), (3, 2), (2, 2), (2, 3)]
+    poses = compile_path(path, 0.15).poses()
+    # No control point for the turns on the spot
+    assert len(poses) == 3
+    for (x, y, theta), cell in zip(poses, [(4, 2), (2, 2), (2, 3)]):
+        gx, gy = path_points(path, 0.15)[path.index(cell)]
+        assert abs(x - gx) < 1e-9 and abs(y - gy) < 1e-9
+    assert abs(poses[-1][2]) < 1e-9 and abs(poses[1][2] - math.pi / 2) < 1e-9
+
+
+def test_pose_list_walk_ends_on_the_route():
+    path = [(4, 0), (4, 1), (4, 2), (3, 2), (2, 2), (2, 3), (3, 3), (4, 3), (4, 4)]
+    seconds, commands, (x, y, theta) = run_route(path, pose_list=True)
+    gx, gy = path_points(path)[-1]
+    assert commands == 2
+    assert abs(x - gx) < 1e-6 and abs(y - gy) < 1e-6
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function
+import Obstacle
+from Nao_Simulator import SimClock
+from Sonar_Filter import SonarFilter
+
+
+class _Sonar(object):
+    # Reads the same distance on both sensors, one per check
+    def __init__(self, distances):
+        self.distances = list(distances)
+        self.value = None
+
+    def getData(self, key):
+        if key.endswith("Left/Sensor/Value"):
+            self.value = self.distances.pop(0)
+        return self.value
+
+
+class _Motion(object):
+    stops = 0
+
+    def stopMove(self):
+        self.stops += 1
+
+
+def _checks(distances, sonar_filter):
+    Obstacle._readings.clear()
+    clock = SimClock(speed=None)
+    memory, motion = _Sonar(distances), _Motion()
+    found = []
+    while memory.distances:
+        found.append(Obstacle.avoid_obstacles_after_step(motion, memory, clock=clock, sonar_filter=sonar_filter))
+        clock.sleep(1.0)
+    return found
+
+
+def test_filter_ignores_a_lone_echo():
+    distances = [2.0, 2.0, 2.0, 0.2, 2.0, 2.0]
+    assert _checks(distances, None)[3]
+    assert not any(_checks(distances, SonarFilter()))
+
+
+def test_filter_still_stops_for_a_real_obstacle():
+    assert any(_checks([2.0, 2.0, 0.3, 0.3, 0.3, 0.3], SonarFilter()))